@@ -0,0 +1,276 @@
+import asyncio
+import itertools
+import json
+import threading
+import time
+from pathlib import Path
+from hierarchy import group_settings, select_subcategories
+from photo_sorter import (MODEL_TTL, add_groups, build_image_chat_body, build_scoring_request, parse_analysis_content,
+                          parse_scoring_response, uses_logprob_scoring)
+from pipeline import prepare_image_payload
+from response_stream import SSE_DONE, StreamedCompletion, StreamStats, TokenUsage, parse_sse_line
+from warmup import WARMUP_PROMPT, ServerWarmupStats, WarmupStats, make_warmup_payload
+
+class AsyncLMStudioClient:
+    """asyncio counterpart of LMStudioClient for high-concurrency dispatch.
+
+    Requests are spread round-robin over one or more LM Studio servers that
+    serve the same model. Each in-flight request is a coroutine rather than
+    an OS thread, so hundreds of them cost little more than their sockets.
+    Requires aiohttp, which is imported on first use.
+    """
+
+    def __init__(self, base_urls=("http://localhost:1234",), max_connections=256, timeout=600, ttl=MODEL_TTL):
+        if isinstance(base_urls, str):
+            base_urls = [base_urls]
+        self.base_urls = list(base_urls)
+        self.model = None
+        self.available_models = []
+        self.ttl = ttl
+        self.warmup_stats = None
+        self.stream_stats = StreamStats()
+        self.token_usage = TokenUsage()
+        self.max_connections = max_connections
+        self.timeout = timeout
+        self._session = None
+        self._next_url = itertools.cycle(self.base_urls)
+
+    async def _get_session(self):
+        if self._session is None or self._session.closed:
+            try:
+                import aiohttp
+            except ImportError:
+                raise ImportError("Async dispatch requires aiohttp. Install it with 'pip install aiohttp'.")
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=self.max_connections),
+                timeout=aiohttp.ClientTimeout(total=self.timeout)
+            )
+        return self._session
+
+    async def close(self):
+        """Close the underlying HTTP session."""
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    async def get_available_models(self):
+        """Get list of available models from the first LM Studio server."""
+        try:
+            session = await self._get_session()
+            async with session.get(f"{self.base_urls[0]}/v1/models") as response:
+                if response.status == 200:
+                    return (await response.json()).get('data', [])
+                return []
+        except ImportError:
+            raise
+        except Exception as e:
+            print(f"Error getting available models: {str(e)}")
+            return []
+
+    async def load_model(self, model_name, warmup_image=None, settings=None):
+        """Load and warm up the specified model on every configured server."""
+        self.available_models = await self.get_available_models()
+        if not self.available_models:
+            raise ValueError("No models found in LM Studio. Please load a model first.")
+
+        self.model = model_name
+        image_data = make_warmup_payload(warmup_image, settings)
+
+        async def warm_up(base_url):
+            latencies = []
+            for _ in range(2):
+                start = time.monotonic()
+                await self._post_image_chat(base_url, WARMUP_PROMPT, image_data, max_tokens=1)
+                latencies.append(time.monotonic() - start)
+            return base_url, WarmupStats(*latencies)
+
+        # Servers load the model independently, so warm them up concurrently
+        self.warmup_stats = ServerWarmupStats(await asyncio.gather(*(warm_up(url) for url in self.base_urls)))
+        return True
+
+    async def ping(self, image_data=None):
+        """Send a one-token image request to every server so each keeps the model loaded."""
+        image_data = image_data or make_warmup_payload()
+        await asyncio.gather(*(self._post_image_chat(url, WARMUP_PROMPT, image_data, max_tokens=1)
+                               for url in self.base_urls))
+
+    async def _post_image_chat(self, base_url, prompt, image_data, **options):
+        """Send a chat completion with one text prompt and one image and return the parsed reply."""
+        if self.ttl:
+            options.setdefault('ttl', self.ttl)
+        body = build_image_chat_body(self.model, prompt, image_data, **options)
+
+        async def body_chunks():
+            for chunk in body:
+                yield chunk
+
+        session = await self._get_session()
+        async with session.post(
+            f"{base_url}/v1/chat/completions",
+            data=body_chunks(),
+            headers={"Content-Type": "application/json", "Content-Length": str(len(body))}
+        ) as response:
+            if response.status != 200:
+                raise ValueError(f"Request to {base_url} failed: {await response.text()}")
+            return await response.json()
+
+    async def _stream_image_chat(self, base_url, prompt, image_data, **options):
+        """Stream a chat completion and return its content as soon as a complete JSON answer arrives."""
+        if self.ttl:
+            options.setdefault('ttl', self.ttl)
+        body = build_image_chat_body(self.model, prompt, image_data, stream=True, **options)
+
+        async def body_chunks():
+            for chunk in body:
+                yield chunk
+
+        completion = StreamedCompletion()
+        session = await self._get_session()
+        async with session.post(
+            f"{base_url}/v1/chat/completions",
+            data=body_chunks(),
+            headers={"Content-Type": "application/json", "Content-Length": str(len(body))}
+        ) as response:
+            if response.status != 200:
+                raise ValueError(f"Request to {base_url} failed: {await response.text()}")
+            complete = False
+            async for line in response.content:
+                event = parse_sse_line(line)
+                if event is SSE_DONE:
+                    break
+                if event is not None and completion.add(event):
+                    complete = True
+                    break
+            completion.finish(stopped_early=complete)
+            if complete:
+                # Drop the connection so LM Studio stops generating
+                response.close()
+        self.stream_stats.record(completion)
+        self.token_usage.add_streamed(completion)
+        return completion.content
+
+    async def _score_image(self, base_url, categories, image_data, image_path, settings):
+        """Send one scoring request for categories and return the parsed result JSON string."""
+        prompt, options = build_scoring_request(categories, settings)
+        if settings.get('stream_responses') and not uses_logprob_scoring(settings):
+            content = await self._stream_image_chat(base_url, prompt, image_data, **options)
+            return parse_analysis_content(content, categories, image_path, settings)
+        result = await self._post_image_chat(base_url, prompt, image_data, **options)
+        self.token_usage.add(result.get('usage'))
+        return parse_scoring_response(result, categories, image_path, settings)
+
+    async def analyze_image(self, image_path, categories, threshold, settings, image_data=None):
+        """Analyze a single image and return category assignments as a JSON string."""
+        try:
+            if image_data is None:
+                # Decoding and resizing is CPU work, keep it off the event loop
+                image_data = await asyncio.get_running_loop().run_in_executor(
+                    None,
+                    lambda: prepare_image_payload(
+                        image_path,
+                        preprocess=settings.get('preprocess', False),
+                        max_size=settings.get('max_image_size', 1024),
+                        quality=settings.get('jpeg_quality', 85)
+                    )
+                )
+
+            base_url = next(self._next_url)
+            groups = None
+            if settings.get('category_groups') and not settings.get('auto_mode', False):
+                # Hierarchical mode: pick coarse groups first, then only offer their subcategories
+                stage_settings = group_settings(settings)
+                group_names = list(settings['category_groups'])
+                categories, groups = select_subcategories(
+                    await self._score_image(base_url, group_names, image_data, image_path, stage_settings), settings
+                )
+                if not categories:
+                    return json.dumps({"categories": [], "groups": []})
+
+            return add_groups(await self._score_image(base_url, categories, image_data, image_path, settings), groups)
+
+        except Exception as e:
+            raise Exception(f"Error analyzing image: {str(e)}")
+
+    async def analyze_many(self, image_paths, categories, threshold, settings, concurrency=64):
+        """Analyze images with at most `concurrency` requests in flight.
+
+        Yields (image_path, result, error) tuples in completion order; exactly
+        one of result and error is None.
+        """
+        semaphore = asyncio.Semaphore(concurrency)
+        pending = set()
+
+        async def run_one(image_path):
+            try:
+                return image_path, await self.analyze_image(image_path, categories, threshold, settings), None
+            except Exception as e:
+                return image_path, None, e
+            finally:
+                semaphore.release()
+
+        try:
+            for image_path in image_paths:
+                await semaphore.acquire()
+                pending.add(asyncio.ensure_future(run_one(Path(image_path))))
+
+                # Hand back whatever finished while we were waiting for a free slot
+                done = {task for task in pending if task.done()}
+                pending -= done
+                for task in done:
+                    yield task.result()
+
+            for task in asyncio.as_completed(pending):
+                yield await task
+            pending.clear()
+        finally:
+            for task in pending:
+                task.cancel()
+
+class AsyncLoopThread:
+    """Runs an asyncio event loop in a dedicated daemon thread.
+
+    Lets synchronous code (the Tk GUI, worker threads) drive coroutines and
+    async generators without blocking its own thread on an event loop.
+    """
+
+    def __init__(self):
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever, daemon=True)
+        self.thread.start()
+
+    def run(self, coro):
+        """Run a coroutine on the loop thread and block until it finishes."""
+        return asyncio.run_coroutine_threadsafe(coro, self.loop).result()
+
+    def iterate(self, async_iterable):
+        """Iterate an async iterable from synchronous code."""
+        iterator = async_iterable.__aiter__()
+        try:
+            while True:
+                try:
+                    yield self.run(iterator.__anext__())
+                except StopAsyncIteration:
+                    break
+        finally:
+            # Close the generator on early exit so its in-flight requests are cancelled
+            if hasattr(iterator, 'aclose'):
+                self.run(iterator.aclose())
+
+    def blocking(self, client):
+        """Return a synchronous view of client's ping(), for ModelKeepAlive."""
+        return BlockingPing(self, client)
+
+    def stop(self):
+        """Stop the loop and wait for the thread to exit."""
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join()
+
+class BlockingPing:
+    """Calls an async client's ping() on an AsyncLoopThread from an ordinary thread."""
+
+    def __init__(self, loop_thread, client):
+        self.loop_thread = loop_thread
+        self.client = client
+
+    def ping(self, image_data=None):
+        self.loop_thread.run(self.client.ping(image_data))
@@ -0,0 +1,137 @@
+import json
+import threading
+import time
+
+def _parse_gate(text):
+    """Return text as a gate if it is a number between 0 and 1, else None."""
+    try:
+        gate = float(text)
+    except ValueError:
+        return None
+    return gate if 0 <= gate <= 1 else None
+
+def parse_cascade(text, default_gate=0.7):
+    """Parse 'small-vlm:0.8, big-vlm' into [(model, gate), ...], smallest model first.
+
+    A tier's gate is the top confidence an image needs to stop at that tier;
+    images below it go on to the next model. Tiers without a gate use
+    default_gate, and the last tier never passes images on. Model IDs may
+    contain colons (e.g. 'qwen2-vl:7b' or 'llava:13'), so text after the
+    last colon is only a gate if it is a number between 0 and 1; write
+    'model@gate' to give a gate to a model whose tag is such a number.
+    """
+    tiers = []
+    for entry in [part.strip() for part in text.split(',') if part.strip()]:
+        if '@' in entry:
+            model, _, gate_text = entry.rpartition('@')
+            gate = _parse_gate(gate_text)
+            if gate is None:
+                raise ValueError(f"Cascade gate for {model.strip()} must be a number between 0 and 1")
+        else:
+            model, separator, gate_text = entry.rpartition(':')
+            gate = _parse_gate(gate_text) if separator else None
+            if gate is None:
+                model = entry
+        tiers.append((model.strip(), default_gate if gate is None else gate))
+    if len(tiers) < 2:
+        raise ValueError("A cascade needs at least two models, e.g. 'small-vlm:0.8, big-vlm'")
+    tiers[-1] = (tiers[-1][0], None)
+    return tiers
+
+def top_category(result):
+    """Return (name, confidence) of the most confident category in a result JSON string."""
+    categories = json.loads(result)['categories']
+    if not categories:
+        return None, 0.0
+    best = max(categories, key=lambda cat: cat['confidence'])
+    return best['name'], best['confidence']
+
+class TierStats:
+    """Requests, time and outcomes of one cascade tier."""
+
+    def __init__(self, model, gate):
+        self.model = model
+        self.gate = gate
+        self.requests = 0
+        self.busy_seconds = 0.0
+        self.passed_on = 0
+        self.agreed = 0  # Passed-on images where the next tier picked the same top category
+
+    def summary(self):
+        rate = self.requests / self.busy_seconds if self.busy_seconds else 0.0
+        line = (f"{self.model}: {self.requests} images, {self.busy_seconds / max(1, self.requests):.2f}s each "
+                f"({rate:.2f} images/s per request slot)")
+        if self.gate is not None:
+            agreement = f", next tier agreed on {self.agreed / self.passed_on:.0%}" if self.passed_on else ""
+            line += f", {self.passed_on} below {self.gate:.2f} passed on{agreement}"
+        return line
+
+class CascadeClient:
+    """Analyze images with a chain of models, passing only uncertain images to the next one.
+
+    tiers is a list of (client, gate) with each client's model loaded,
+    smallest model first. An image stays with the first tier whose top
+    confidence reaches its gate; the last tier's answer is always final.
+    Agreement counts how often the next tier kept the previous tier's top
+    category, which shows whether a gate is stricter than it needs to be.
+    """
+
+    def __init__(self, tiers):
+        self.tiers = tiers
+        self.model = ' > '.join(client.model for client, _ in tiers)
+        self.lock = threading.Lock()
+        self.stats = [TierStats(client.model, gate) for client, gate in tiers]
+        # Share the first tier's statistics with the others
+        self.stream_stats = tiers[0][0].stream_stats
+        self.token_usage = tiers[0][0].token_usage
+
+    @property
+    def stream_stats(self):
+        return self.tiers[0][0].stream_stats
+
+    @stream_stats.setter
+    def stream_stats(self, stats):
+        # Streamed request timings from all tiers go into one set of statistics
+        for client, _ in self.tiers:
+            client.stream_stats = stats
+
+    @property
+    def token_usage(self):
+        return self.tiers[0][0].token_usage
+
+    @token_usage.setter
+    def token_usage(self, usage):
+        for client, _ in self.tiers:
+            client.token_usage = usage
+
+    @property
+    def base_url(self):
+        return self.tiers[0][0].base_url
+
+    def ping(self, image_data=None):
+        """Keep every tier's model loaded."""
+        for client, _ in self.tiers:
+            client.ping(image_data)
+
+    def analyze_image(self, image_path, categories, threshold, settings, image_data=None):
+        previous = None
+        for index, (client, gate) in enumerate(self.tiers):
+            start = time.monotonic()
+            result = client.analyze_image(image_path, categories, threshold, settings, image_data=image_data)
+            name, confidence = top_category(result)
+            stats = self.stats[index]
+            with self.lock:
+                stats.requests += 1
+                stats.busy_seconds += time.monotonic() - start
+                if previous is not None:
+                    self.stats[index - 1].agreed += previous == name
+                if gate is not None and confidence < gate:
+                    stats.passed_on += 1
+            if gate is None or confidence >= gate:
+                return result
+            previous = name
+        return result
+
+    def summary(self):
+        with self.lock:
+            return "Model cascade:\n" + "\n".join(f"  {stats.summary()}" for stats in self.stats)
@@ -0,0 +1,101 @@
+import math
+import threading
+import time
+
+def percentile(values, fraction):
+    """Return the value at the given fraction (0-1) of the sorted values."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, math.ceil(fraction * len(ordered)) - 1))
+    return ordered[index]
+
+class AdaptiveConcurrencyController:
+    """AIMD limit on the number of in-flight analyze_image requests.
+
+    Completions are grouped into windows. After each window the limit is
+    raised by one unless the server shows congestion: any error halves the
+    limit, and a p95 latency rise without a matching throughput gain cuts
+    it by `backoff`. The limit therefore climbs to the point where extra
+    requests only queue on the server and then oscillates around it.
+    """
+
+    def __init__(self, initial=2, minimum=1, maximum=16, window=None,
+                 latency_tolerance=1.25, throughput_gain=1.05, backoff=0.75, verbose=True):
+        self.limit = max(minimum, min(initial, maximum))
+        self.minimum = minimum
+        self.maximum = maximum
+        self.window = window
+        self.latency_tolerance = latency_tolerance
+        self.throughput_gain = throughput_gain
+        self.backoff = backoff
+        self.verbose = verbose
+        self.in_flight = 0
+        self.condition = threading.Condition()
+        self.latencies = []
+        self.errors = 0
+        self.window_start = time.monotonic()
+        self.previous = None  # (throughput, p95) of the last window
+        self.history = []  # (limit, throughput, p95, errors) per window
+
+    def acquire(self):
+        """Block until a request slot is free under the current limit."""
+        with self.condition:
+            while self.in_flight >= self.limit:
+                self.condition.wait()
+            self.in_flight += 1
+
+    def release(self, latency, error=False):
+        """Free a slot and record the request's latency in seconds."""
+        with self.condition:
+            self.in_flight -= 1
+            self.latencies.append(latency)
+            if error:
+                self.errors += 1
+            if len(self.latencies) >= (self.window or max(8, 2 * self.limit)):
+                self._adjust()
+            self.condition.notify_all()
+
+    def cancel(self):
+        """Free a slot without recording a completion."""
+        with self.condition:
+            self.in_flight -= 1
+            self.condition.notify_all()
+
+    def _adjust(self):
+        now = time.monotonic()
+        elapsed = now - self.window_start
+        throughput = len(self.latencies) / elapsed if elapsed > 0 else 0.0
+        p95 = percentile(self.latencies, 0.95)
+        self.history.append((self.limit, throughput, p95, self.errors))
+
+        old_limit = self.limit
+        if self.errors:
+            self.limit = max(self.minimum, self.limit // 2)
+            reason = f"{self.errors} error(s)"
+        elif (self.previous is not None
+              and p95 > self.previous[1] * self.latency_tolerance
+              and throughput < self.previous[0] * self.throughput_gain):
+            self.limit = max(self.minimum, int(self.limit * self.backoff))
+            reason = "p95 latency rising without throughput gain"
+        else:
+            self.limit = min(self.maximum, self.limit + 1)
+            reason = "no congestion"
+
+        if self.verbose and self.limit != old_limit:
+            print(f"Concurrency {old_limit} -> {self.limit} ({reason}; "
+                  f"{throughput:.2f} images/s, p95 {p95:.2f}s)")
+
+        self.previous = (throughput, p95)
+        self.latencies = []
+        self.errors = 0
+        self.window_start = now
+
+    def summary(self):
+        """Return a one-line description of the levels the controller chose."""
+        if not self.history:
+            return f"Concurrency {self.limit} (not enough requests to adapt)"
+        best = max(self.history, key=lambda entry: entry[1])
+        levels = [entry[0] for entry in self.history]
+        return (f"Concurrency ranged {min(levels)}-{max(levels)}, ended at {self.limit}; "
+                f"best throughput {best[1]:.2f} images/s at {best[0]} in flight")
@@ -0,0 +1,121 @@
+import json
+import threading
+from pipeline import DEFAULT_ESCALATION_SIZE, prepare_image_payload
+from streaming_output import OnlineThresholdEstimator
+
+class EscalationStats:
+    """How many images needed the full-resolution request, and the image bytes sent."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.images = 0
+        self.escalated = 0
+        self.low_bytes = 0
+        self.high_bytes = 0
+
+    def record(self, low_bytes, high_bytes=None):
+        with self.lock:
+            self.images += 1
+            self.low_bytes += low_bytes
+            if high_bytes is not None:
+                self.escalated += 1
+                self.high_bytes += high_bytes
+
+    @property
+    def rate(self):
+        return self.escalated / self.images if self.images else 0.0
+
+    def summary(self):
+        with self.lock:
+            if not self.images:
+                return "Escalated no images"
+            average = (self.low_bytes + self.high_bytes) / self.images / 1024
+            return (f"Escalated {self.escalated} of {self.images} images ({self.rate:.0%}) to full resolution, "
+                    f"{average:.0f} KB of image data per image")
+
+class EscalatingClient:
+    """Wrap a client so images are classified from a small rendition first.
+
+    The pipeline prepares payloads at settings['escalation_size']. Only when
+    the answer is uncertain is the image prepared again the way a normal run
+    would send it and analyzed a second time:
+    - the top confidence is below the threshold. A fixed threshold is used
+      as given; with an adaptive threshold the estimate from the results so
+      far is used once warmup results are in, and 0.7 before that.
+    - in single ambiguity mode, the runner-up is within conflict_margin of
+      the top category, so the pick is a toss-up.
+    - no category was returned at all.
+    ImagePipeline calls analyze_small, re-encodes uncertain images in its
+    encode pool and sends them with analyze_full, then records the final
+    answer with finish; analyze_image does all of it in the calling thread.
+    Everything else is delegated to the wrapped client, so it can be used
+    wherever the client is.
+    """
+
+    def __init__(self, client, settings, warmup=20, default_threshold=0.7):
+        self.client = client
+        self.settings = settings
+        self.warmup = warmup
+        self.default_threshold = default_threshold
+        self.conflict_margin = settings.get('conflict_margin', 0.1)
+        self.estimator = OnlineThresholdEstimator(settings.get('priority_categories', []))
+        self.lock = threading.Lock()
+        self.stats = EscalationStats()
+
+    def __getattr__(self, name):
+        return getattr(self.client, name)
+
+    def threshold(self):
+        if self.settings['threshold'] is not None:
+            return self.settings['threshold']
+        with self.lock:
+            if self.estimator.samples < self.warmup:
+                return self.default_threshold
+            return self.estimator.threshold()
+
+    def is_uncertain(self, result):
+        """Return True if a low-resolution result should be re-checked at full resolution."""
+        confidences = sorted((cat['confidence'] for cat in json.loads(result)['categories']), reverse=True)
+        if not confidences or confidences[0] < self.threshold():
+            return True
+        return (self.settings['ambiguity_mode'] == 'single' and len(confidences) > 1
+                and confidences[0] - confidences[1] < self.conflict_margin)
+
+    def full_size_options(self, settings):
+        """Keyword arguments for prepare_image_payload that prepare the image as a normal run would."""
+        return {
+            'preprocess': settings.get('preprocess', False),
+            'max_size': settings.get('max_image_size', 1024),
+            'quality': settings.get('jpeg_quality', 85)
+        }
+
+    def analyze_small(self, image_path, categories, threshold, settings, image_data):
+        """Analyze the small rendition and return (result, whether it should be escalated)."""
+        result = self.client.analyze_image(image_path, categories, threshold, settings, image_data=image_data)
+        return result, not settings.get('auto_mode', False) and self.is_uncertain(result)
+
+    def analyze_full(self, image_path, categories, threshold, settings, image_data):
+        return self.client.analyze_image(image_path, categories, threshold, settings, image_data=image_data)
+
+    def finish(self, result, low_bytes, high_bytes=None):
+        """Record an image's final answer and return it."""
+        self.stats.record(low_bytes, high_bytes)
+        # The adaptive threshold is estimated from final answers only
+        with self.lock:
+            self.estimator.add(json.loads(result)['categories'])
+        return result
+
+    def analyze_image(self, image_path, categories, threshold, settings, image_data=None):
+        if image_data is None:
+            image_data = prepare_image_payload(
+                image_path,
+                preprocess=True,
+                max_size=settings.get('escalation_size', DEFAULT_ESCALATION_SIZE),
+                quality=settings.get('jpeg_quality', 85)
+            )
+        result, uncertain = self.analyze_small(image_path, categories, threshold, settings, image_data)
+        if not uncertain:
+            return self.finish(result, image_data.size)
+        full_image = prepare_image_payload(image_path, **self.full_size_options(settings))
+        result = self.analyze_full(image_path, categories, threshold, settings, full_image)
+        return self.finish(result, image_data.size, full_image.size)
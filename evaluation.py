@@ -0,0 +1,142 @@
+import json
+import time
+from pathlib import Path
+from concurrency import percentile
+from media import is_media_file
+
+EVALUATION_FILE_NAME = 'evaluation_results.jsonl'
+
+def load_golden_set(root):
+    """Return ([(path, label)], labels) for a labelled folder tree.
+
+    Every top-level folder is a category and every image below it, at any
+    depth, is labelled with that folder's name.
+    """
+    root = Path(root)
+    if not root.is_dir():
+        raise ValueError(f"Golden set directory does not exist: {root}")
+    labels = sorted(folder.name for folder in root.iterdir() if folder.is_dir() and not folder.name.startswith('.'))
+    if len(labels) < 2:
+        raise ValueError(f"A golden set needs at least two category folders in {root}")
+    samples = []
+    for label in labels:
+        samples.extend((path, label) for path in sorted((root / label).rglob('*')) if path.is_file() and is_media_file(path))
+    if not samples:
+        raise ValueError(f"No images found in the category folders of {root}")
+    return samples, labels
+
+def parse_configuration(text, index):
+    """Parse a configuration given as inline JSON or a JSON file path into (name, overrides).
+
+    The object holds settings overrides, e.g. {"preprocess": true,
+    "max_image_size": 512}, plus optional "name", "model" and "cascade" keys.
+    """
+    path = Path(text)
+    try:
+        data = json.loads(path.read_text() if not text.lstrip().startswith('{') and path.is_file() else text)
+    except json.JSONDecodeError as e:
+        raise ValueError(f"Configuration {text!r} is not valid JSON: {str(e)}")
+    if not isinstance(data, dict):
+        raise ValueError(f"Configuration {text!r} must be a JSON object")
+    return data.pop('name', path.stem if path.is_file() else f"config-{index}"), data
+
+def top_prediction(result, threshold):
+    """Return the top category of a result JSON string, or None if it is below threshold (Uncertain)."""
+    categories = json.loads(result)['categories']
+    if not categories:
+        return None
+    best = max(categories, key=lambda cat: cat['confidence'])
+    return best['name'] if best['confidence'] >= threshold else None
+
+def score_predictions(pairs, labels):
+    """Score (label, prediction) pairs, where a prediction of None means Uncertain.
+
+    Precision counts only confident predictions; recall counts every image
+    of the category, so an uncertain image lowers recall but not precision.
+    """
+    per_category = {}
+    for label in labels:
+        predicted = sum(1 for _, prediction in pairs if prediction == label)
+        correct = sum(1 for truth, prediction in pairs if truth == label and prediction == label)
+        support = sum(1 for truth, _ in pairs if truth == label)
+        per_category[label] = {
+            'precision': correct / predicted if predicted else 0.0,
+            'recall': correct / support if support else 0.0,
+            'images': support
+        }
+    total = len(pairs)
+    return {
+        'accuracy': sum(1 for truth, prediction in pairs if truth == prediction) / total if total else 0.0,
+        'uncertain': sum(1 for _, prediction in pairs if prediction is None) / total if total else 0.0,
+        'macro_precision': sum(score['precision'] for score in per_category.values()) / len(labels),
+        'macro_recall': sum(score['recall'] for score in per_category.values()) / len(labels),
+        'categories': per_category
+    }
+
+def performance_record(metrics, elapsed, usage):
+    """Throughput, latency percentiles and tokens per image from a pipeline run."""
+    images = metrics.analyzed
+    return {
+        'images': images,
+        'errors': metrics.analyze_errors + metrics.encode_errors,
+        'seconds': round(elapsed, 3),
+        'images_per_second': round(images / elapsed, 3) if elapsed > 0 else 0.0,
+        'latency_p50': round(percentile(metrics.latencies, 0.5), 3),
+        'latency_p95': round(percentile(metrics.latencies, 0.95), 3),
+        'latency_p99': round(percentile(metrics.latencies, 0.99), 3),
+        'prompt_tokens_per_image': round(usage.prompt_tokens / images, 1) if images else 0.0,
+        'completion_tokens_per_image': round(usage.completion_tokens / images, 1) if images else 0.0
+    }
+
+def format_evaluation(record):
+    """Return the human readable report for one evaluated configuration."""
+    scores = record['scores']
+    performance = record['performance']
+    width = max(len('Category'), *(len(name) for name in scores['categories']))
+    lines = [f"=== {record['name']} ({record['model']}) ===", f"{'Category':<{width}}  Precision  Recall  Images"]
+    for name, score in scores['categories'].items():
+        lines.append(f"{name:<{width}}  {score['precision']:>9.2f}  {score['recall']:>6.2f}  {score['images']:>6}")
+    lines.append(f"Accuracy {scores['accuracy']:.2f}, macro precision {scores['macro_precision']:.2f}, "
+                 f"macro recall {scores['macro_recall']:.2f}, {scores['uncertain']:.0%} uncertain "
+                 f"(threshold {record['threshold']:.2f})")
+    lines.append(f"{performance['images']} images in {performance['seconds']:.1f}s ({performance['images_per_second']:.2f} images/s), "
+                 f"{performance['errors']} errors, latency p50 {performance['latency_p50']:.2f}s / "
+                 f"p95 {performance['latency_p95']:.2f}s / p99 {performance['latency_p99']:.2f}s, "
+                 f"{performance['prompt_tokens_per_image']:.0f} prompt + {performance['completion_tokens_per_image']:.0f} "
+                 f"completion tokens per image")
+    return "\n".join(lines)
+
+def save_evaluation(path, record):
+    with open(path, 'a') as f:
+        f.write(json.dumps(record) + "\n")
+
+def load_evaluations(path):
+    path = Path(path)
+    if not path.exists():
+        return []
+    with open(path) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+def format_comparison(records):
+    """Return a table comparing evaluated configurations, one row each."""
+    lines = [f"{'When':<19}  {'Configuration':<20}  {'Model':<20}  Accuracy  Precision  Recall  Images/s  p95 (s)  Tokens/image"]
+    for record in records:
+        scores = record['scores']
+        performance = record['performance']
+        tokens = performance['prompt_tokens_per_image'] + performance['completion_tokens_per_image']
+        lines.append(f"{record['evaluated_at']:<19}  {record['name'][:20]:<20}  {record['model'][:20]:<20}  "
+                     f"{scores['accuracy']:>8.2f}  {scores['macro_precision']:>9.2f}  {scores['macro_recall']:>6.2f}  "
+                     f"{performance['images_per_second']:>8.2f}  {performance['latency_p95']:>7.2f}  {tokens:>12.0f}")
+    return "\n".join(lines)
+
+def new_record(name, model, golden_dir, overrides, threshold, scores, performance):
+    return {
+        'evaluated_at': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'name': name,
+        'model': model,
+        'golden_set': str(golden_dir),
+        'settings': overrides,
+        'threshold': threshold,
+        'scores': scores,
+        'performance': performance
+    }
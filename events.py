@@ -0,0 +1,237 @@
+import json
+import math
+import threading
+from collections import defaultdict, namedtuple
+from datetime import datetime
+
+TAG_MAKE = 0x010F
+TAG_MODEL = 0x0110
+TAG_EXIF_IFD = 0x8769
+TAG_GPS_IFD = 0x8825
+TAG_DATETIME_ORIGINAL = 0x9003
+TAG_SUBSEC_TIME_ORIGINAL = 0x9291
+TAG_BODY_SERIAL_NUMBER = 0xA431
+
+CaptureInfo = namedtuple('CaptureInfo', ['time', 'latitude', 'longitude', 'camera'])
+NO_CAPTURE_INFO = CaptureInfo(None, None, None, None)
+
+def _gps_degrees(values, reference):
+    degrees, minutes, seconds = (float(value) for value in values)
+    sign = -1 if reference in ('S', 'W') else 1
+    return sign * (degrees + minutes / 60 + seconds / 3600)
+
+def read_capture_info(image_path):
+    """Return when, where and with which camera a photo was taken, from its EXIF header.
+
+    Pillow opens images lazily, so only the header is read and no pixels
+    are decoded. Fields that are missing are None; files Pillow can't open,
+    such as videos and most RAW files, give NO_CAPTURE_INFO, and so does
+    every file without Pillow. Modification times are not used instead:
+    copied or synced folders share them, which would merge unrelated photos.
+    """
+    try:
+        from PIL import Image
+    except ImportError:
+        return NO_CAPTURE_INFO
+
+    try:
+        with Image.open(image_path) as img:
+            exif = img.getexif()
+            exif_ifd = exif.get_ifd(TAG_EXIF_IFD)
+            gps_ifd = exif.get_ifd(TAG_GPS_IFD)
+    except Exception:
+        return NO_CAPTURE_INFO
+
+    taken = None
+    try:
+        taken = datetime.strptime(str(exif_ifd.get(TAG_DATETIME_ORIGINAL, '')).strip('\x00 '), '%Y:%m:%d %H:%M:%S')
+        subsec = str(exif_ifd.get(TAG_SUBSEC_TIME_ORIGINAL, '')).strip('\x00 ')
+        if subsec.isdigit():
+            taken = taken.replace(microsecond=int(subsec.ljust(6, '0')[:6]))  # Orders shots within a burst
+    except ValueError:
+        pass
+
+    latitude = longitude = None
+    try:
+        latitude = _gps_degrees(gps_ifd[2], gps_ifd.get(1))
+        longitude = _gps_degrees(gps_ifd[4], gps_ifd.get(3))
+    except (KeyError, TypeError, ValueError, ZeroDivisionError):
+        latitude = longitude = None
+
+    serial = exif_ifd.get(TAG_BODY_SERIAL_NUMBER)
+    camera = str(serial) if serial else ' '.join(str(exif.get(tag, '')).strip('\x00 ') for tag in (TAG_MAKE, TAG_MODEL)).strip()
+    return CaptureInfo(taken, latitude, longitude, camera or None)
+
+def read_capture_infos(image_list, workers=8):
+    """Read the capture info of many images in parallel and return {path: CaptureInfo}."""
+    from concurrent.futures import ThreadPoolExecutor
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        return dict(zip(image_list, executor.map(read_capture_info, image_list)))
+
+def distance_meters(first, second):
+    """Great-circle distance between two CaptureInfos with GPS positions."""
+    lat1, lon1, lat2, lon2 = map(math.radians, (first.latitude, first.longitude, second.latitude, second.longitude))
+    a = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+    return 6371000 * 2 * math.asin(math.sqrt(min(1.0, a)))
+
+def cluster_events(infos, max_gap=30.0, max_distance=200.0, max_size=30):
+    """Group images into events: shots from one camera taken close together in time and place.
+
+    Each camera's shots are sorted by time, and a new event starts when the
+    gap to the previous shot exceeds max_gap seconds or, when both have GPS
+    positions, the distance exceeds max_distance meters. Events are split
+    after max_size images so a long shoot isn't judged by a few frames.
+    Images without a capture time are events of their own. Returns a list of
+    lists of paths.
+    """
+    by_camera = defaultdict(list)
+    events = []
+    for path, info in infos.items():
+        if info.time is None:
+            events.append([path])
+        else:
+            by_camera[info.camera].append(path)
+
+    for paths in by_camera.values():
+        paths.sort(key=lambda path: infos[path].time)
+        current = [paths[0]]
+        for previous, path in zip(paths, paths[1:]):
+            before, after = infos[previous], infos[path]
+            far = (before.latitude is not None and after.latitude is not None
+                   and distance_meters(before, after) > max_distance)
+            if (after.time - before.time).total_seconds() > max_gap or far or len(current) >= max_size:
+                events.append(current)
+                current = []
+            current.append(path)
+        events.append(current)
+    return events
+
+def pick_representatives(event, count=2):
+    """Return up to count images spread evenly over an event, always including its first image."""
+    if len(event) <= count:
+        return list(event)
+    if count == 1:
+        return [event[0]]
+    return [event[round(index * (len(event) - 1) / (count - 1))] for index in range(count)]
+
+def _parse_result(result):
+    """Return the result JSON as a dict, or None if it is missing or unreadable."""
+    if not result:
+        return None
+    json_str = result.strip('`').strip()
+    if json_str.startswith('json\n'):
+        json_str = json_str[5:].strip()
+    try:
+        parsed = json.loads(json_str)
+        return parsed if isinstance(parsed.get('categories'), list) else None
+    except (ValueError, AttributeError):
+        return None
+
+def _top_category(parsed):
+    if not parsed or not parsed['categories']:
+        return None, 0.0
+    best = max(parsed['categories'], key=lambda cat: cat['confidence'])
+    return best['name'], best['confidence']
+
+class EventFanOut:
+    """Analyze a few representatives of each event and give their answer to the rest of it.
+
+    Once all representatives of an event are in, add() returns the results
+    for its other images: a copy of the most confident representative's
+    answer, marked with the representative it came from. If the
+    representatives picked different top categories, one was below
+    min_confidence, or one failed, the other images are kept in
+    escalated so they can be analyzed individually.
+    """
+
+    def __init__(self, image_list, settings):
+        self.settings = settings
+        infos = read_capture_infos(image_list, workers=settings.get('encode_workers') or 8)
+        self.events = cluster_events(
+            infos,
+            max_gap=settings.get('event_gap', 30.0),
+            max_distance=settings.get('event_distance', 200.0),
+            max_size=settings.get('event_max_size', 30)
+        )
+        self.min_confidence = settings['threshold'] or 0.0
+        self.lock = threading.Lock()
+        self.pending = {}  # Event index -> representatives still to be answered
+        self.answers = defaultdict(list)  # Event index -> [(path, result or None)]
+        self.event_of = {}
+        self.representatives = []
+        self.escalated = []
+        self.fanned_out = 0
+        self.disagreed = 0
+        order = {path: index for index, path in enumerate(image_list)}
+        for index, event in enumerate(self.events):
+            picks = pick_representatives(event, settings.get('event_representatives', 2))
+            self.pending[index] = len(picks)
+            for path in picks:
+                self.event_of[path] = index
+            self.representatives.extend(picks)
+        # Representatives are analyzed in the run's processing order
+        self.representatives.sort(key=order.get)
+
+    def add(self, image_path, result=None):
+        """Record a representative's result (None if it failed) and return [(path, result)] to fan out."""
+        index = self.event_of[image_path]
+        with self.lock:
+            self.answers[index].append((image_path, result))
+            self.pending[index] -= 1
+            if self.pending[index]:
+                return []
+            answers = self.answers.pop(index)
+            answered = {path for path, _ in answers}
+            others = [path for path in self.events[index] if path not in answered]
+            if not others:
+                return []
+
+            parsed = [(path, _parse_result(result)) for path, result in answers]
+            tops = [_top_category(result) for _, result in parsed]
+            names = {name for name, _ in tops}
+            if len(names) != 1 or None in names or min(confidence for _, confidence in tops) < self.min_confidence:
+                self.disagreed += 1
+                self.escalated.extend(others)
+                return []
+
+            best_path, shared = max(zip(parsed, tops), key=lambda item: item[1][1])[0]
+            shared = json.dumps(dict(shared, event_representative=str(best_path)))
+            self.fanned_out += len(others)
+            return [(path, shared) for path in others]
+
+    def summary(self):
+        with self.lock:
+            return (f"Event clustering: {sum(len(event) for event in self.events)} images in "
+                    f"{len(self.events)} events, {len(self.representatives)} representatives analyzed, "
+                    f"{self.fanned_out} images took their event's answer, {len(self.escalated)} in "
+                    f"{self.disagreed} event(s) were analyzed individually because the representatives disagreed")
+
+def analyze_by_event(run, image_list, settings, on_result=None, on_error=None):
+    """Analyze image_list event by event with run(images, on_result, on_error).
+
+    run is called once for the representatives and, if any events need it,
+    once more for the images whose representatives disagreed. Fanned-out
+    results are passed to on_result like any other, from the thread that
+    delivered the last representative. Returns (EventFanOut, [return values
+    of run]).
+    """
+    fan_out = EventFanOut(image_list, settings)
+
+    def handle_result(image_path, result):
+        if on_result:
+            on_result(image_path, result)
+        for member, shared in fan_out.add(image_path, result):
+            if on_result:
+                on_result(member, shared)
+
+    def handle_error(image_path, error):
+        if on_error:
+            on_error(image_path, error)
+        fan_out.add(image_path)
+
+    runs = [run(fan_out.representatives, handle_result, handle_error)]
+    if fan_out.escalated:
+        order = {path: index for index, path in enumerate(image_list)}
+        runs.append(run(sorted(fan_out.escalated, key=order.get), on_result, on_error))
+    return fan_out, runs
@@ -2,12 +2,26 @@ import ttkbootstrap as ttk
 from tkinter import *
 from tkinter import filedialog
 from pathlib import Path
-from photo_sorter import validate_photo_directory, validate_categories, validate_threshold, validate_mode, LMStudioClient
+from photo_sorter import validate_photo_directory, validate_categories, validate_threshold, validate_mode, validate_parallel_requests, validate_letter_choices, get_cache_dir, get_prompt_version, load_cascade, schedule_images, LMStudioClient
+from cascade import parse_cascade
+from report_writers import REPORT_FORMATS, open_report_writer
+from results_db import ResultsDatabase, default_database_path
+from scheduling import sample_images
+from response_stream import StreamStats
+from profiling import RunProfiler
+from events import analyze_by_event
+from hierarchy import GROUPS_FILE_NAME, leaf_categories, load_category_groups, parse_category_groups, save_category_groups
+from media import is_media_file
+from pipeline import ImagePipeline
+from warmup import ModelKeepAlive
+from progress import ProgressChannel, format_duration
 import json
+import os
+import sqlite3
 import threading
+import multiprocessing
 import shutil
-from datetime import datetime
-import requests
+import time
 
 # Create the main window
 root = ttk.Window()
@@ -51,10 +65,41 @@ welcome_label = ttk.Label(
 )
 welcome_label.pack(pady=(0, 20))
 
-# Initialize LM Studio client
+# Initialize LM Studio client. The model list starts from the last known
+# models and is refreshed in the background so a slow or stopped server
+# never delays the window.
 client = LMStudioClient()
-available_models_json = client.get_available_models()
-available_models = [model['id'] for model in available_models_json]  # Extract just the model names
+model_cache_file = get_cache_dir() / 'models.json'
+
+def load_cached_models():
+    """Return the model names seen the last time LM Studio was reachable."""
+    try:
+        return json.loads(model_cache_file.read_text())
+    except (OSError, ValueError):
+        return []
+
+available_models = load_cached_models()
+
+# Async dispatch runs on its own event-loop thread, created on first use
+async_loop = None
+async_client = None
+
+def get_async_client(settings):
+    """Return an async client for the configured servers, starting the loop thread if needed."""
+    global async_loop, async_client
+    from async_client import AsyncLMStudioClient, AsyncLoopThread
+    
+    if async_loop is None:
+        async_loop = AsyncLoopThread()
+    if async_client is None or async_client.base_urls != settings['servers']:
+        if async_client is not None:
+            async_loop.run(async_client.close())
+        async_client = AsyncLMStudioClient(settings['servers'])
+    if async_client.model != client.model:
+        # Warm every server up so the first images don't wait for a model load
+        async_loop.run(async_client.load_model(client.model))
+        print(async_client.warmup_stats.summary())
+    return async_client
 
 def update_status(message, status_type="info"):
     """Update status label with message and appropriate style."""
@@ -66,6 +111,50 @@ def update_status(message, status_type="info"):
     else:
         status_label.configure(bootstyle="info")
 
+# Photo directory checks by path: the directory if it holds images, or (modification time, error
+# message). A folder with images stays valid, so the database, reports and category folders a run
+# writes into it don't force another scan; a failed check is repeated once the folder changes.
+VALIDATION_DELAY_MS = 300
+directory_checks = {}
+directory_checks_lock = threading.Lock()
+pending_validation = None
+
+def folder_mtime(folder):
+    try:
+        return os.stat(folder.strip("'\"")).st_mtime_ns
+    except OSError:
+        return None
+
+def cached_directory_check(folder):
+    """Return the cached check of folder (the directory or an error message), or None if it needs checking."""
+    with directory_checks_lock:
+        checked = directory_checks.get(folder)
+    if isinstance(checked, tuple):
+        mtime, message = checked
+        return message if folder_mtime(folder) == mtime else None
+    if checked is not None and not checked.is_dir():
+        return None  # Removed or replaced since it was checked
+    return checked
+
+def check_photo_directory(folder):
+    """Validate the photo directory, reusing an earlier result (see cached_directory_check)."""
+    checked = cached_directory_check(folder)
+    if checked is None:
+        mtime = folder_mtime(folder)  # Taken first so a change during the scan invalidates the result
+        try:
+            checked = validate_photo_directory(folder)
+        except ValueError as e:
+            checked = str(e)
+        if not isinstance(checked, str):
+            with directory_checks_lock:
+                directory_checks[folder] = checked
+        elif mtime is not None:  # Missing paths are cheap to check again
+            with directory_checks_lock:
+                directory_checks[folder] = (mtime, checked)
+    if isinstance(checked, str):
+        raise ValueError(checked)
+    return checked
+
 def validate_inputs():
     """Validate all inputs and return settings dict if valid."""
     try:
@@ -73,12 +162,17 @@ def validate_inputs():
         folder = folder_entry.get().strip()
         if not folder:
             raise ValueError("Please select a photo directory")
-        photo_dir = validate_photo_directory(folder)
+        photo_dir = check_photo_directory(folder)
         
         # Validate categories based on auto mode
         cat_str = cat_entry.get().strip()
+        groups_path = groups_entry.get().strip()
+        category_groups = None
         if auto_mode_var.get():
             categories = []  # Auto mode doesn't use predefined categories
+        elif groups_path:
+            category_groups = load_category_groups(groups_path)
+            categories = leaf_categories(category_groups)
         else:
             categories = validate_categories(cat_str)
             if not categories:
@@ -89,25 +183,64 @@ def validate_inputs():
         if priority_cats and not all(cat in categories for cat in priority_cats):
             raise ValueError("Priority categories must be a subset of main categories")
             
+        if logprob_var.get():
+            validate_letter_choices(categories, category_groups)
+            
         # Validate threshold
         threshold_str = thresh_entry.get().strip()
         threshold = None if not threshold_str else validate_threshold(threshold_str)
         
+        # Validate model cascade
+        cascade_str = cascade_entry.get().strip()
+        cascade = parse_cascade(cascade_str, threshold or 0.7) if cascade_str else None
+        if cascade and async_var.get():
+            raise ValueError("A model cascade can't be combined with async dispatch")
+        if events_var.get() and async_var.get():
+            raise ValueError("Event clustering can't be combined with async dispatch")
+        if escalation_var.get() and async_var.get():
+            raise ValueError("Resolution escalation can't be combined with async dispatch")
+        if adaptive_var.get() and async_var.get():
+            raise ValueError("Adaptive parallel requests can't be combined with async dispatch")
+        
         # Validate modes
         ambig_mode = validate_mode(ambig_combo.get().lower(), ['single', 'multi'], 'multi')
         output_mode = validate_mode(output_combo.get().lower(), ['move', 'copy', 'report'], 'report')
+        report_format = validate_mode(report_format_combo.get().lower(), REPORT_FORMATS, 'text')
+        
+        # Validate parallel requests
+        parallel_requests = validate_parallel_requests(parallel_spin.get().strip() or '2')
+        
+        # Validate servers for async dispatch
+        servers = [url.strip().rstrip('/') for url in servers_entry.get().split(',') if url.strip()]
+        if not servers:
+            servers = [client.base_url]
+        if not all(url.startswith(('http://', 'https://')) for url in servers):
+            raise ValueError("Server URLs must start with http:// or https://")
         
         # Create settings dict
         settings = {
             'photo_dir': photo_dir,
             'categories': categories,
+            'category_groups': category_groups,
             'priority_categories': priority_cats,
             'threshold': threshold,
+            'cascade': cascade,
             'ambiguity_mode': ambig_mode,
+            'scoring': 'logprobs' if logprob_var.get() else 'json',
+            'stream_responses': stream_var.get(),
             'output_mode': output_mode,
+            'report_format': report_format,
             'auto_mode': auto_mode_var.get(),
             'preprocess': preprocess_var.get(),
-            'scan_subfolders': subfolder_var.get()
+            'resolution_escalation': escalation_var.get(),
+            'event_clustering': events_var.get(),
+            'scan_subfolders': subfolder_var.get(),
+            'parallel_requests': parallel_requests,
+            'adaptive_concurrency': adaptive_var.get(),
+            'schedule': SCHEDULE_LABELS.get(schedule_combo.get(), 'path'),
+            'async_dispatch': async_var.get(),
+            'servers': servers,
+            'profile': profile_var.get()
         }
         
         # Update status and enable start button
@@ -122,14 +255,52 @@ def validate_inputs():
         return None
 
 def on_input_change(*args):
-    validate_inputs()
+    """Validate the form once input has paused instead of on every keystroke."""
+    global pending_validation
+    if pending_validation is not None:
+        root.after_cancel(pending_validation)
+    pending_validation = root.after(VALIDATION_DELAY_MS, validate_in_background)
+
+def validate_in_background(then=None):
+    """Validate the form, checking an unseen photo directory on a worker thread first.
+
+    If the form is valid, then(settings) is called on the Tk thread; the
+    buttons use this so a click never scans the folder on the UI thread.
+    """
+    global pending_validation
+    if pending_validation is not None:
+        root.after_cancel(pending_validation)
+    pending_validation = None
+    folder = folder_entry.get().strip()
+    
+    def finish():
+        settings = validate_inputs()
+        if settings and then:
+            then(settings)
+    
+    if not folder or not os.path.isdir(folder.strip("'\"")) or cached_directory_check(folder) is not None:
+        finish()
+        return
+    
+    update_status("Checking photo directory...", "info")
+    start_btn.configure(state='disabled')
+    
+    def check_in_thread():
+        try:
+            check_photo_directory(folder)
+        except ValueError:
+            pass  # Reported by validate_inputs from the cache
+        # Skip the result if the folder was edited meanwhile; that edit schedules its own check
+        root.after(0, lambda: finish() if folder_entry.get().strip() == folder else None)
+    
+    threading.Thread(target=check_in_thread, daemon=True).start()
 
 def browse_folder():
     folder = filedialog.askdirectory()
     if folder:
         folder_entry.delete(0, END)
         folder_entry.insert(0, folder)
-        validate_inputs()
+        on_input_change()
 
 # Model Selection Section
 model_frame = ttk.LabelFrame(main_frame, text='Model Selection', padding=10)
@@ -144,31 +315,65 @@ model_combo = ttk.Combobox(
 model_combo.set(available_models[0] if available_models else '')
 model_combo.pack(fill=X, pady=(5, 0))
 
-def load_selected_model():
-    """Load the selected model from LM Studio."""
+ttk.Label(model_frame, text="Model cascade, smallest first (optional, e.g. 'small-vlm:0.8, big-vlm'):").pack(anchor=W, pady=(10, 0))
+cascade_entry = ttk.Entry(model_frame)
+cascade_entry.pack(fill=X, pady=(5, 0))
+
+model_loading = False
+
+def load_selected_model(then=None):
+    """Load and warm up the selected model on a worker thread, then call then() on the Tk thread if it loaded."""
+    global model_loading
     selected_model = model_combo.get()
-    if selected_model:
+    if not selected_model or model_loading:
+        return
+    if selected_model == client.model and client.warmup_stats:  # Only load if different from current model
+        update_status(f"Successfully loaded model: {selected_model}. {client.warmup_stats.summary()}", "success")
+        if then:
+            then()
+        return
+    
+    # A cold load plus warm-up can take minutes; keep the window responsive meanwhile.
+    # Start and Quick Sample wait for it through ensure_model_loaded.
+    load_model_btn.configure(state='disabled')
+    update_status(f"Loading model {selected_model}...", "info")
+    model_loading = True
+    
+    def finish(error=None):
+        global model_loading
+        model_loading = False
+        load_model_btn.configure(state='normal')
+        if error is not None:
+            update_status(f"Error loading model: {error}", "danger")
+            return
+        update_status(f"Successfully loaded model: {selected_model}. {client.warmup_stats.summary()}", "success")
+        if then:
+            then()
+    
+    def load_in_thread():
         try:
-            if selected_model != client.model:  # Only load if different from current model
-                client.load_model(selected_model)
-            update_status(f"Successfully loaded model: {selected_model}", "success")
-            return True
+            client.load_model(selected_model)
         except Exception as e:
-            update_status(f"Error loading model: {str(e)}", "danger")
-            return False
-    return False
+            client.model = None  # A failed warm-up leaves the model unusable; load it again next time
+            root.after(0, lambda err=str(e): finish(err))
+            return
+        root.after(0, finish)
+    
+    threading.Thread(target=load_in_thread, daemon=True).start()
 
-def ensure_model_loaded():
-    """Ensure a model is loaded before processing."""
+def ensure_model_loaded(then):
+    """Call then() once the selected model is loaded, loading it first if needed."""
     selected_model = model_combo.get()
     if not selected_model:
         update_status("Please select a model first", "danger")
-        return False
-    if not client.model:  # If no model is currently loaded
-        return load_selected_model()
-    if selected_model != client.model:  # If selected model is different from loaded model
-        return load_selected_model()
-    return True
+        return
+    if model_loading:
+        update_status("Please wait for the model to finish loading", "info")
+        return
+    if not client.model or selected_model != client.model:
+        load_selected_model(then)
+        return
+    then()
 
 # Add load model button
 load_model_btn = ttk.Button(
@@ -179,6 +384,49 @@ load_model_btn = ttk.Button(
 )
 load_model_btn.pack(pady=5)
 
+model_status_label = ttk.Label(model_frame, text='Checking LM Studio for models...')
+model_status_label.pack(anchor=W)
+
+def apply_model_list(models):
+    """Show a freshly fetched model list in the combobox and remember it."""
+    global available_models
+    refresh_models_btn.configure(state='normal')
+    if not models:
+        if available_models:
+            model_status_label.configure(text='LM Studio not reachable, showing last known models')
+        else:
+            model_status_label.configure(text='No models found. Is LM Studio running?')
+        return
+    
+    available_models = models
+    model_combo.configure(values=models)
+    if model_combo.get() not in models:
+        model_combo.set(models[0])
+    model_status_label.configure(text=f'{len(models)} model(s) available')
+    try:
+        model_cache_file.write_text(json.dumps(models))
+    except OSError:
+        pass
+
+def refresh_models():
+    """Fetch the model list from LM Studio without blocking the window."""
+    refresh_models_btn.configure(state='disabled')
+    model_status_label.configure(text='Checking LM Studio for models...')
+    
+    def refresh_in_thread():
+        models = [model['id'] for model in client.get_available_models(timeout=5)]
+        root.after(0, lambda: apply_model_list(models))
+    
+    threading.Thread(target=refresh_in_thread, daemon=True).start()
+
+refresh_models_btn = ttk.Button(
+    model_frame,
+    text='Refresh Models',
+    style='secondary.TButton',
+    command=refresh_models
+)
+refresh_models_btn.pack(pady=(5, 0))
+
 # Photo Directory Section
 dir_frame = ttk.LabelFrame(main_frame, text='Photo Directory', padding=10)
 dir_frame.pack(fill=X, pady=(0, 10))
@@ -206,7 +454,8 @@ auto_mode_check = ttk.Checkbutton(
     command=lambda: [
         cat_entry.configure(state='disabled' if auto_mode_var.get() else 'normal'),
         priority_entry.configure(state='disabled' if auto_mode_var.get() else 'normal'),
-        validate_inputs()
+        groups_entry.configure(state='disabled' if auto_mode_var.get() else 'normal'),
+        on_input_change()
     ]
 )
 auto_mode_check.pack(anchor=W, pady=(0, 10))
@@ -217,7 +466,22 @@ cat_entry.pack(fill=X, pady=(5, 10))
 
 ttk.Label(cat_frame, text='Priority categories (comma-separated, optional):').pack(anchor=W)
 priority_entry = ttk.Entry(cat_frame)
-priority_entry.pack(fill=X, pady=(5, 0))
+priority_entry.pack(fill=X, pady=(5, 10))
+
+ttk.Label(cat_frame, text='Category groups file for hierarchical classification (optional, replaces the categories above):').pack(anchor=W)
+groups_frame = ttk.Frame(cat_frame)
+groups_frame.pack(fill=X, pady=(5, 0))
+groups_entry = ttk.Entry(groups_frame)
+groups_entry.pack(side=LEFT, fill=X, expand=YES, padx=(0, 10))
+
+def browse_groups_file():
+    path = filedialog.askopenfilename(filetypes=[('JSON files', '*.json'), ('All files', '*.*')])
+    if path:
+        groups_entry.delete(0, END)
+        groups_entry.insert(0, path)
+        on_input_change()
+
+ttk.Button(groups_frame, text='Browse', command=browse_groups_file).pack(side=LEFT)
 
 # Confidence Threshold
 thresh_frame = ttk.LabelFrame(main_frame, text='Confidence Threshold', padding=10)
@@ -249,7 +513,35 @@ output_combo = ttk.Combobox(
     state='readonly'
 )
 output_combo.set('Report')
-output_combo.pack(fill=X, pady=(5, 0))
+output_combo.pack(fill=X, pady=(5, 10))
+
+# Report Format
+ttk.Label(mode_frame, text='Report Format:').pack(anchor=W)
+report_format_combo = ttk.Combobox(
+    mode_frame,
+    values=['Text', 'CSV', 'JSONL', 'Parquet'],
+    state='readonly'
+)
+report_format_combo.set('Text')
+report_format_combo.pack(fill=X, pady=(5, 10))
+
+# Processing Order
+SCHEDULE_LABELS = {
+    'Path': 'path',
+    'Newest first': 'newest',
+    'Smallest first': 'smallest',
+    'Folder round-robin': 'round_robin',
+    'Not yet analyzed first': 'uncached',
+    'Disk order': 'disk'
+}
+ttk.Label(mode_frame, text='Processing Order:').pack(anchor=W)
+schedule_combo = ttk.Combobox(
+    mode_frame,
+    values=list(SCHEDULE_LABELS),
+    state='readonly'
+)
+schedule_combo.set('Path')
+schedule_combo.pack(fill=X, pady=(5, 0))
 
 # Options
 options_frame = ttk.LabelFrame(main_frame, text='Options', padding=10)
@@ -263,6 +555,22 @@ preprocess_check = ttk.Checkbutton(
 )
 preprocess_check.pack(anchor=W)
 
+escalation_var = BooleanVar(value=False)
+escalation_check = ttk.Checkbutton(
+    options_frame,
+    text='Classify from a small image first, full size only when uncertain',
+    variable=escalation_var
+)
+escalation_check.pack(anchor=W)
+
+events_var = BooleanVar(value=False)
+events_check = ttk.Checkbutton(
+    options_frame,
+    text='Analyze a few shots per burst or event (by EXIF time and place)',
+    variable=events_var
+)
+events_check.pack(anchor=W)
+
 subfolder_var = BooleanVar(value=True)
 subfolder_check = ttk.Checkbutton(
     options_frame,
@@ -271,6 +579,56 @@ subfolder_check = ttk.Checkbutton(
 )
 subfolder_check.pack(anchor=W)
 
+logprob_var = BooleanVar(value=False)
+logprob_check = ttk.Checkbutton(
+    options_frame,
+    text='Score with token probabilities (one-letter answers, fewer tokens)',
+    variable=logprob_var
+)
+logprob_check.pack(anchor=W)
+
+stream_var = BooleanVar(value=False)
+stream_check = ttk.Checkbutton(
+    options_frame,
+    text='Stream responses and stop each one as soon as its answer is complete',
+    variable=stream_var
+)
+stream_check.pack(anchor=W)
+
+ttk.Label(options_frame, text='Parallel requests to LM Studio:').pack(anchor=W, pady=(10, 0))
+parallel_spin = ttk.Spinbox(options_frame, from_=1, to=512, width=5)
+parallel_spin.set(2)
+parallel_spin.pack(anchor=W, pady=(5, 0))
+
+adaptive_var = BooleanVar(value=False)
+adaptive_check = ttk.Checkbutton(
+    options_frame,
+    text='Adapt parallel requests to server latency',
+    variable=adaptive_var
+)
+adaptive_check.pack(anchor=W, pady=(10, 0))
+
+async_var = BooleanVar(value=False)
+async_check = ttk.Checkbutton(
+    options_frame,
+    text='Async dispatch (many requests in flight, multiple servers)',
+    variable=async_var
+)
+async_check.pack(anchor=W, pady=(10, 0))
+
+ttk.Label(options_frame, text='LM Studio servers for async dispatch (comma-separated URLs):').pack(anchor=W, pady=(10, 0))
+servers_entry = ttk.Entry(options_frame)
+servers_entry.insert(0, client.base_url)
+servers_entry.pack(fill=X, pady=(5, 0))
+
+profile_var = BooleanVar(value=False)
+profile_check = ttk.Checkbutton(
+    options_frame,
+    text='Profile the run (CPU and memory profiles in a profile_<time> folder)',
+    variable=profile_var
+)
+profile_check.pack(anchor=W, pady=(10, 0))
+
 # Start Button
 start_btn = ttk.Button(
     main_frame,
@@ -284,14 +642,28 @@ start_btn.pack(pady=10)
 folder_entry.bind('<KeyRelease>', on_input_change)
 cat_entry.bind('<KeyRelease>', on_input_change)
 priority_entry.bind('<KeyRelease>', on_input_change)
+groups_entry.bind('<KeyRelease>', on_input_change)
 thresh_entry.bind('<KeyRelease>', on_input_change)
+parallel_spin.bind('<KeyRelease>', on_input_change)
+parallel_spin.configure(command=on_input_change)
+servers_entry.bind('<KeyRelease>', on_input_change)
+cascade_entry.bind('<KeyRelease>', on_input_change)
 ambig_combo.bind('<<ComboboxSelected>>', on_input_change)
 output_combo.bind('<<ComboboxSelected>>', on_input_change)
+report_format_combo.bind('<<ComboboxSelected>>', on_input_change)
+schedule_combo.bind('<<ComboboxSelected>>', on_input_change)
 auto_mode_var.trace_add('write', lambda *args: on_input_change())
 
 # Bind checkbox changes
 preprocess_var.trace_add('write', on_input_change)
 subfolder_var.trace_add('write', on_input_change)
+adaptive_var.trace_add('write', on_input_change)
+logprob_var.trace_add('write', on_input_change)
+escalation_var.trace_add('write', on_input_change)
+events_var.trace_add('write', on_input_change)
+stream_var.trace_add('write', on_input_change)
+async_var.trace_add('write', on_input_change)
+profile_var.trace_add('write', on_input_change)
 
 # Initial validation
 validate_inputs()
@@ -314,42 +686,76 @@ canvas.bind_all("<MouseWheel>", _on_mousewheel)  # Windows
 canvas.bind_all("<Button-4>", _on_mousewheel)    # Linux scroll up
 canvas.bind_all("<Button-5>", _on_mousewheel)    # Linux scroll down
 
-def test_single_image():
-    """Test LM Studio with a single image."""
-    settings = validate_inputs()
-    if not settings or not ensure_model_loaded():
-        return
+def run_quick_sample():
+    """Analyze a small sample spread across the folders without changing any files."""
+    validate_in_background(then=lambda settings: ensure_model_loaded(lambda: start_quick_sample(settings)))
+
+def start_quick_sample(settings):
+    sample_size = max(1, int(sample_spin.get() or 5))
     
     # Disable buttons during processing
     test_btn.configure(state='disabled')
     start_btn.configure(state='disabled')
     load_model_btn.configure(state='disabled')
+    update_status(f"Analyzing a sample of {sample_size} images...", "info")
     
-    def test_in_thread():
+    def sample_in_thread():
+        database = None
         try:
-            # Get first image from directory
             photo_dir = Path(settings['photo_dir'])
-            image_files = set()  # Use a set to prevent duplicates
-            for ext in ('*.jpg', '*.jpeg', '*.png', '*.webp'):
-                if settings['scan_subfolders']:
-                    image_files.update(photo_dir.rglob(ext))
-                else:
-                    image_files.update(photo_dir.glob(ext))
-            
-            image_files = sorted(list(image_files))  # Convert back to sorted list
+            candidates = photo_dir.rglob('*') if settings['scan_subfolders'] else photo_dir.glob('*')
+            image_files = [path for path in candidates if path.is_file() and is_media_file(path)]
             
             if not image_files:
                 root.after(0, lambda: update_status("No images found in directory", "danger"))
                 return
-                
-            test_image = image_files[0]
-            try:
-                result = client.analyze_image(test_image, settings['categories'], settings['threshold'], settings)
-                root.after(0, lambda: update_status(f"Test result for {test_image.name}: {result}", "success"))
-            except Exception as e:
-                root.after(0, lambda: update_status(f"Error processing {test_image.name}: {str(e)}", "danger"))
-                
+            
+            sample = sample_images(image_files, sample_size)
+            results = []
+            errors = []
+            lock = threading.Lock()
+            
+            # Sample results are real results: keep them so a full run can skip these images
+            database = ResultsDatabase(default_database_path(photo_dir))
+            database.start_run(settings, client.model, get_prompt_version(settings['categories'], settings))
+            
+            def on_result(image_file, result):
+                with lock:
+                    results.append((image_file, json.loads(result)))
+                    database.record(image_file, result)
+            
+            def on_error(image_file, error):
+                with lock:
+                    errors.append(image_file)
+                    database.record(image_file, error=error)
+            
+            ImagePipeline(client, settings, use_processes=False).run(sample, on_result=on_result, on_error=on_error)
+            
+            lines = []
+            for image_file, result in results:
+                if result['categories']:
+                    top = max(result['categories'], key=lambda cat: cat['confidence'])
+                    lines.append(f"{image_file.name}: {top['name']} ({top['confidence']:.2f})")
+                else:
+                    lines.append(f"{image_file.name}: no category")
+            lines.extend(f"{image_file.name}: error" for image_file in errors)
+            message = f"Sample of {len(sample)} images:\n" + "\n".join(lines)
+            
+            global last_results, last_settings
+            last_results = results
+            last_settings = settings
+            root.after(0, lambda: [
+                update_status(message, "danger" if errors and not results else "success"),
+                browse_results_btn.configure(state='normal')
+            ])
+        
+        except Exception as e:
+            root.after(0, lambda err=str(e): update_status(f"Error running sample: {err}", "danger"))
+        
         finally:
+            if database is not None:
+                database.finish_run()
+                database.close()
             # Re-enable buttons
             root.after(0, lambda: [
                 test_btn.configure(state='normal'),
@@ -357,21 +763,60 @@ def test_single_image():
                 load_model_btn.configure(state='normal')
             ])
     
-    # Start testing in a separate thread
-    threading.Thread(target=test_in_thread, daemon=True).start()
+    # Start the sample in a separate thread
+    threading.Thread(target=sample_in_thread, daemon=True).start()
 
 # Add test button in a frame to maintain layout
 test_frame = ttk.Frame(main_frame)
 test_frame.pack(fill=X, pady=5)
 
+sample_controls = ttk.Frame(test_frame)
+sample_controls.pack()
+
 test_btn = ttk.Button(
-    test_frame,
-    text='Test with First Image',
+    sample_controls,
+    text='Quick Sample',
     style='info.TButton',
-    command=test_single_image,
+    command=run_quick_sample,
     width=20  # Set fixed width
 )
-test_btn.pack()
+test_btn.pack(side=LEFT)
+
+ttk.Label(sample_controls, text='Images:').pack(side=LEFT, padx=(10, 5))
+sample_spin = ttk.Spinbox(sample_controls, from_=1, to=100, width=4)
+sample_spin.set(5)
+sample_spin.pack(side=LEFT)
+
+# Results from the last completed run, shown in the results browser
+last_results = []
+last_settings = None
+
+def record_correction(image_path, category):
+    """Save a manual category correction from the results browser to the database."""
+    database = ResultsDatabase(default_database_path(last_settings['photo_dir']))
+    try:
+        database.record_correction(image_path, category)
+        update_status(f"{Path(image_path).name} set to {category}", "success")
+    except (ValueError, sqlite3.Error) as e:
+        update_status(f"Error saving correction: {str(e)}", "danger")
+    finally:
+        database.close()
+
+def open_results_browser():
+    """Open the results browser for the last completed run."""
+    from results_view import ResultsBrowser
+    
+    ResultsBrowser(root, last_results, categories=last_settings['categories'], on_correct=record_correction)
+
+browse_results_btn = ttk.Button(
+    test_frame,
+    text='Browse Results',
+    style='info.TButton',
+    command=open_results_browser,
+    state='disabled',
+    width=20
+)
+browse_results_btn.pack(pady=(5, 0))
 
 # Create progress bar (initially hidden)
 progress_frame = ttk.LabelFrame(main_frame, text='Progress', padding=10)
@@ -388,32 +833,99 @@ progress_bar.pack(fill=X, pady=(0, 5))
 progress_label = ttk.Label(progress_frame, text='')
 progress_label.pack(fill=X)
 
+# Workers report through a ProgressChannel that is polled at a fixed frame
+# rate, so fast runs don't flood the Tk event queue with callbacks
+PROGRESS_FPS = 15
+current_job = None
+
+def poll_progress(job):
+    """Redraw the progress section from the job's channel."""
+    state = job.snapshot()
+    if state['total']:
+        progress_bar.configure(value=(state['processed'] / state['total']) * 100)
+    
+    if state['message']:
+        text = state['message']
+    else:
+        text = f"Processed {state['last_name']} ({state['processed']}/{state['total']})"
+        details = [f"{state['rate']:.1f} images/s"]
+        if state['eta'] is not None and not state['paused']:
+            details.append(f"ETA {format_duration(state['eta'])}")
+        if state['errors']:
+            details.append(f"{state['errors']} error(s)")
+        if state['paused']:
+            details.append("paused")
+        text += " - " + ", ".join(details)
+    progress_label.configure(text=text)
+    
+    if state['new_errors']:
+        update_status(state['new_errors'][-1], "danger")
+    
+    if not state['finished']:
+        root.after(1000 // PROGRESS_FPS, poll_progress, job)
+
+def toggle_pause():
+    """Pause or resume the running job."""
+    if current_job is None:
+        return
+    if current_job.paused:
+        current_job.resume()
+        pause_btn.configure(text='Pause')
+    else:
+        current_job.pause()
+        pause_btn.configure(text='Resume')
+
+def cancel_job():
+    """Stop dispatching images; requests already in flight are allowed to finish."""
+    if current_job is not None:
+        current_job.cancel()
+        cancel_btn.configure(state='disabled')
+        pause_btn.configure(state='disabled')
+
+progress_controls = ttk.Frame(progress_frame)
+progress_controls.pack(fill=X, pady=(5, 0))
+
+pause_btn = ttk.Button(progress_controls, text='Pause', style='secondary.TButton', command=toggle_pause)
+pause_btn.pack(side=LEFT, padx=(0, 5))
+
+cancel_btn = ttk.Button(progress_controls, text='Cancel', style='danger.TButton', command=cancel_job)
+cancel_btn.pack(side=LEFT)
+
 def process_images():
     """Process all images in the directory."""
-    settings = validate_inputs()
-    if not settings or not ensure_model_loaded():
-        return
+    validate_in_background(then=lambda settings: ensure_model_loaded(lambda: start_processing(settings)))
+
+def start_processing(settings):
     
     # Disable buttons during processing
     start_btn.configure(state='disabled')
     test_btn.configure(state='disabled')
     load_model_btn.configure(state='disabled')
     
+    # Show progress frame and start polling the new job
+    global current_job
+    job = current_job = ProgressChannel()
+    pause_btn.configure(text='Pause', state='normal')
+    cancel_btn.configure(state='normal')
+    progress_bar.configure(value=0)
+    progress_label.configure(text='Scanning for images...')
+    progress_frame.pack(fill=X, pady=(0, 10))
+    poll_progress(job)
+    
     def process_in_thread():
+        database = report = keep_alive = profiler = None
+        report_summary = None
         try:
-            # Show progress frame
-            root.after(0, lambda: progress_frame.pack(fill=X, pady=(0, 10)))
             
-            # Collect all image files using a set to prevent duplicates
+            # Collect all images, RAW files and videos
             photo_dir = Path(settings['photo_dir'])
-            image_files = set()
-            for ext in ('*.jpg', '*.jpeg', '*.png', '*.webp'):
-                if settings['scan_subfolders']:
-                    image_files.update(photo_dir.rglob(ext))
-                else:
-                    image_files.update(photo_dir.glob(ext))
+            profiler = RunProfiler(photo_dir, enabled=settings['profile'])
+            profiler.stage('scan')
+            candidates = photo_dir.rglob('*') if settings['scan_subfolders'] else photo_dir.glob('*')
+            image_files = [path for path in candidates if path.is_file() and is_media_file(path)]
             
-            image_files = sorted(list(image_files))  # Convert back to sorted list
+            # Order the run by the selected policy so useful results arrive first
+            image_files = schedule_images(image_files, settings)
             
             if not image_files:
                 root.after(0, lambda: [
@@ -423,28 +935,115 @@ def process_images():
                 return
             
             total_images = len(image_files)
+            job.set_total(total_images)
             processed = 0
             results = []
+            results_lock = threading.Lock()
+            pipeline = None
             
-            # Process each image
-            for image_file in image_files:
-                try:
-                    # Update progress
+            # A cascade loads its own models; the selected model is used otherwise
+            analysis_client = client
+            if settings['cascade']:
+                job.set_message("Loading cascade models...")
+                profiler.stage('load_model')
+                analysis_client = load_cascade(client.base_url, settings['cascade'], image_files[0], settings)
+            
+            # Record every result in the photo directory's database as it completes
+            database = ResultsDatabase(default_database_path(photo_dir))
+            database.start_run(settings, analysis_client.model, get_prompt_version(settings['categories'], settings))
+            
+            # Stream the report as results arrive so it can be read mid-run
+            if settings['output_mode'] == 'report':
+                report = open_report_writer(settings['report_format'], photo_dir, settings)
+            
+            # Ping the model while the run is paused or otherwise idle so it stays loaded,
+            # on every server with async dispatch
+            dispatcher = analysis_client
+            pinged = analysis_client
+            if settings['async_dispatch']:
+                dispatcher = get_async_client(settings)
+                pinged = async_loop.blocking(dispatcher)
+            keep_alive = ModelKeepAlive(pinged).start()
+            
+            def checkpoint():
+                # Blocks this worker while paused; stops dispatching new images once cancelled
+                if not job.checkpoint() and pipeline is not None:
+                    pipeline.stop()
+            
+            def on_result(image_file, result):
+                nonlocal processed
+                keep_alive.touch()
+                with results_lock:
                     processed += 1
-                    progress = (processed / total_images) * 100
-                    root.after(0, lambda p=progress, f=image_file.name, c=processed: [
-                        progress_bar.configure(value=p),
-                        progress_label.configure(text=f'Processing {f} ({c}/{total_images})')
-                    ])
-                    
-                    # Analyze image
-                    result = client.analyze_image(image_file, settings['categories'], settings['threshold'], settings)
                     results.append((image_file, json.loads(result)))
-                    
-                except Exception as e:
-                    root.after(0, lambda err=str(e), f=image_file.name: 
-                        update_status(f"Error processing {f}: {err}", "danger")
+                    database.record(image_file, result)
+                    if report is not None:
+                        report.write(image_file, result)
+                job.advance(image_file.name)
+                checkpoint()
+            
+            def on_error(image_file, error):
+                nonlocal processed
+                keep_alive.touch()
+                with results_lock:
+                    processed += 1
+                    database.record(image_file, error=error)
+                    if report is not None:
+                        report.write(image_file, error=error)
+                job.advance(image_file.name, str(error))
+                checkpoint()
+            
+            profiler.stage('analyze')
+            if settings['async_dispatch']:
+                # Coroutines on the shared event-loop thread, spread over all servers
+                start_time = time.monotonic()
+                dispatcher.stream_stats = StreamStats()
+                for image_file, result, error in async_loop.iterate(dispatcher.analyze_many(
+                    image_files,
+                    settings['categories'],
+                    settings['threshold'],
+                    settings,
+                    concurrency=settings['parallel_requests']
+                )):
+                    if error is None:
+                        on_result(image_file, result)
+                    else:
+                        on_error(image_file, error)
+                    if job.cancelled:
+                        break
+                elapsed = time.monotonic() - start_time
+                performance_summary = (f"Analyzed {processed} images in {elapsed:.1f}s "
+                                       f"across {len(settings['servers'])} server(s) (async dispatch)")
+            else:
+                # Encode images in a worker pool while network threads keep LM Studio busy.
+                # Worker processes re-import the main script on spawn-based platforms,
+                # which would rebuild this window, so fall back to threads there.
+                dispatcher.stream_stats = StreamStats()
+                pipeline = ImagePipeline(analysis_client, settings, use_processes=multiprocessing.get_start_method() == 'fork')
+                if settings['event_clustering']:
+                    # Representatives first, then the events whose representatives disagreed
+                    job.set_message('Reading capture times...')
+                    fan_out, runs = analyze_by_event(
+                        lambda images, on_result, on_error: pipeline.run(images, on_result=on_result, on_error=on_error),
+                        image_files, settings, on_result, on_error
                     )
+                    performance_summary = "\n".join(metrics.summary() for metrics in runs) + f"\n{fan_out.summary()}"
+                else:
+                    metrics = pipeline.run(image_files, on_result=on_result, on_error=on_error)
+                    performance_summary = metrics.summary()
+            if settings['stream_responses']:
+                performance_summary += f"\n{dispatcher.stream_stats.summary()}"
+            if settings['cascade']:
+                performance_summary += f"\n{analysis_client.summary()}"
+            print(performance_summary)
+            report_summary = f"Performance:\n{performance_summary}"
+            
+            if job.cancelled:
+                root.after(0, lambda: [
+                    update_status(f"Processing cancelled after {processed} of {total_images} images. No files were changed.", "info"),
+                    progress_frame.pack_forget()
+                ])
+                return
             
             # In Auto mode, consolidate categories
             if settings['auto_mode']:
@@ -454,7 +1053,8 @@ def process_images():
                     all_categories.update(cat['name'] for cat in result['categories'])
                 
                 # Update progress for category consolidation
-                root.after(0, lambda: progress_label.configure(text='Consolidating categories...'))
+                job.set_message('Consolidating categories...')
+                profiler.stage('consolidate')
                 
                 try:
                     # Create prompt for category consolidation
@@ -481,6 +1081,8 @@ IMPORTANT:
 5. Create as many categories as needed to properly organize the content"""
 
                     # Send consolidation request to LLM
+                    import requests
+                    
                     response = requests.post(
                         f"{client.base_url}/v1/chat/completions",
                         json={
@@ -519,6 +1121,16 @@ IMPORTANT:
                     
                     # Update settings with consolidated categories
                     settings['categories'] = [cat['name'] for cat in consolidated_categories['categories']]
+                    database.rename_categories(category_mapping)
+                    report_summary += "\n\nConsolidated categories:\n" + "\n".join(
+                        f"- {main_cat['name']}: {', '.join(main_cat['subcategories'])}"
+                        for main_cat in consolidated_categories['categories']
+                    )
+                    
+                    # Keep the tree so later runs can classify hierarchically with it
+                    groups_file = photo_dir / GROUPS_FILE_NAME
+                    save_category_groups(groups_file, parse_category_groups(consolidated_categories))
+                    report_summary += f"\n\nCategory groups saved to {groups_file}"
                     
                 except Exception as e:
                     root.after(0, lambda err=str(e): 
@@ -527,32 +1139,11 @@ IMPORTANT:
                     return
             
             # Handle results based on output mode
+            profiler.stage('output')
             if settings['output_mode'] == 'report':
-                # Generate report file
-                report_file = photo_dir / 'photo_sort_report.txt'
-                with open(report_file, 'w') as f:
-                    f.write(f"Photo Sorting Report\n")
-                    f.write(f"Generated on: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n\n")
-                    f.write(f"Settings:\n")
-                    f.write(f"- Auto Mode: {'Enabled' if settings['auto_mode'] else 'Disabled'}\n")
-                    f.write(f"- Categories: {', '.join(settings['categories'])}\n")
-                    f.write(f"- Priority Categories: {', '.join(settings['priority_categories'])}\n")
-                    f.write(f"- Threshold: {settings['threshold']}\n")
-                    f.write(f"- Ambiguity Mode: {settings['ambiguity_mode']}\n")
-                    f.write(f"- Output Mode: {settings['output_mode']}\n\n")
-                    
-                    f.write(f"Results:\n")
-                    f.write("-" * 80 + "\n\n")
-                    
-                    for image_file, result in results:
-                        f.write(f"Image: {image_file.name}\n")
-                        for cat in result['categories']:
-                            priority = " (Priority)" if cat['name'] in settings['priority_categories'] else ""
-                            f.write(f"- {cat['name']}{priority}: {cat['confidence']:.2%}\n")
-                        f.write("\n")
-                
+                # The report rows were streamed as images completed; the summary is added on close
                 root.after(0, lambda: update_status(
-                    f"Processed {processed} images successfully! Report saved to {report_file}", 
+                    f"Processed {processed} images successfully! Report saved to {report.path}", 
                     "success"
                 ))
                 
@@ -568,6 +1159,7 @@ IMPORTANT:
                     category_dir.mkdir(exist_ok=True)
                 
                 # Move/copy files to their highest confidence category
+                final_paths = {}
                 for image_file, result in results:
                     if result['categories']:
                         top_category = max(result['categories'], key=lambda x: x['confidence'])
@@ -578,6 +1170,8 @@ IMPORTANT:
                             try:
                                 if settings['output_mode'] == 'move':
                                     shutil.move(str(image_file), str(dest_file))
+                                    final_paths[image_file] = dest_file
+                                    database.relocate(image_file, dest_file)
                                 else:  # copy
                                     shutil.copy2(str(image_file), str(dest_file))
                             except Exception as e:
@@ -590,10 +1184,29 @@ IMPORTANT:
                     "success"
                 ))
             
+            # Keep the results for the browser, pointing at moved files' new locations
+            global last_results, last_settings
+            if settings['output_mode'] == 'move':
+                last_results = [(final_paths.get(image_file, image_file), result) for image_file, result in results]
+            else:
+                last_results = results
+            last_settings = settings
+            root.after(0, lambda: browse_results_btn.configure(state='normal'))
+            
             # Hide progress frame
             root.after(0, lambda: progress_frame.pack_forget())
             
         finally:
+            if keep_alive is not None:
+                keep_alive.stop()
+            if database is not None:
+                database.finish_run()
+                database.close()
+            if report is not None:
+                report.close(report_summary)
+            if profiler is not None:
+                profiler.close()
+            job.finish()
             # Re-enable buttons
             root.after(0, lambda: [
                 start_btn.configure(state='normal'),
@@ -607,4 +1220,7 @@ IMPORTANT:
 # Update start button command
 start_btn.configure(command=process_images)
 
+# Fetch the model list once the window is up
+root.after_idle(refresh_models)
+
 root.mainloop() 
\ No newline at end of file
@@ -0,0 +1,74 @@
+import json
+from pathlib import Path
+
+GROUPS_FILE_NAME = 'category_groups.json'
+
+def parse_category_groups(data):
+    """Turn a consolidation tree into {group: [subcategories]}.
+
+    Accepts the JSON Auto Mode's consolidation produces,
+    {"categories": [{"name": "Animals", "subcategories": ["Dog", "Cat"]}]},
+    or a plain {"Animals": ["Dog", "Cat"]} mapping.
+    """
+    if isinstance(data, dict) and isinstance(data.get('categories'), list):
+        data = {group.get('name'): group.get('subcategories') for group in data['categories']}
+    if not isinstance(data, dict) or not data:
+        raise ValueError("Category groups must map group names to lists of subcategories")
+
+    groups = {}
+    for name, subcategories in data.items():
+        if not isinstance(name, str) or not name.strip():
+            raise ValueError("Every category group needs a name")
+        if not isinstance(subcategories, list) or not subcategories:
+            raise ValueError(f"Category group '{name}' has no subcategories")
+        groups[name.strip()] = [str(sub).strip() for sub in subcategories if str(sub).strip()]
+    return groups
+
+def load_category_groups(path):
+    """Read and validate a category groups JSON file."""
+    path = Path(str(path).strip("'\""))
+    if not path.is_file():
+        raise ValueError(f"Category groups file does not exist: {path}")
+    try:
+        data = json.loads(path.read_text())
+    except json.JSONDecodeError as e:
+        raise ValueError(f"Category groups file is not valid JSON: {str(e)}")
+    return parse_category_groups(data)
+
+def save_category_groups(path, groups):
+    """Write groups in the consolidation tree format so they can be loaded for a later run."""
+    tree = {'categories': [{'name': name, 'subcategories': subs} for name, subs in groups.items()]}
+    Path(path).write_text(json.dumps(tree, indent=2))
+
+def leaf_categories(groups):
+    """Return every subcategory once, in group order."""
+    return list(dict.fromkeys(sub for subs in groups.values() for sub in subs))
+
+def largest_second_stage(groups, max_groups=2):
+    """Return how many subcategories the second stage can offer at once: the max_groups largest groups combined."""
+    largest = sorted(groups.values(), key=len, reverse=True)[:max_groups]
+    return len(dict.fromkeys(sub for subs in largest for sub in subs))
+
+def group_settings(settings):
+    """Settings for the first stage, where groups holding a priority category are the priorities."""
+    priority = set(settings.get('priority_categories', []))
+    groups = settings['category_groups']
+    return {
+        **settings,
+        'priority_categories': [name for name, subs in groups.items() if priority.intersection(subs)]
+    }
+
+def select_subcategories(group_result, settings):
+    """Return (subcategories, group names) for the groups the first stage picked.
+
+    group_result is the parsed first-stage JSON string. The most confident
+    group is always kept, and others that reach group_threshold are added up
+    to max_groups in total, so images on the border between groups still
+    see both groups' subcategories.
+    """
+    groups = settings['category_groups']
+    picked = sorted(json.loads(group_result).get('categories', []), key=lambda cat: cat['confidence'], reverse=True)
+    picked = [cat for index, cat in enumerate(picked)
+              if index == 0 or cat['confidence'] >= settings.get('group_threshold', 0.3)]
+    picked = picked[:settings.get('max_groups', 2)]
+    return list(dict.fromkeys(sub for cat in picked for sub in groups.get(cat['name'], []))), [cat['name'] for cat in picked]
@@ -0,0 +1,74 @@
+import json
+import math
+import string
+
+SCORING_MODES = ['json', 'logprobs']
+LETTERS = string.ascii_uppercase
+MAX_TOP_LOGPROBS = 20  # The OpenAI API's limit, which LM Studio follows
+
+def build_letter_prompt(categories, priority_categories=()):
+    """Create a prompt that asks for the letter of the single best category.
+
+    Priority categories are marked and favored the way the JSON prompt
+    favors them; they keep their place in the list, because the letters
+    follow the order of categories.
+    """
+    if len(categories) > len(LETTERS):
+        raise ValueError(f"Logprob scoring supports at most {len(LETTERS)} categories per request, "
+                         f"but this request has {len(categories)}")
+    options = "\n".join(f"{letter}. {cat}{' (priority)' if cat in priority_categories else ''}"
+                        for letter, cat in zip(LETTERS, categories))
+    guidance = "\n\nFavor priority categories when confident." if any(cat in priority_categories for cat in categories) else ""
+    return f"""Which one of these categories best describes this image?{guidance}
+
+{options}
+
+Answer with the letter only."""
+
+def letter_request_options(categories):
+    """Request options for a one-token answer with the probabilities of the alternatives."""
+    return {
+        'max_tokens': 1,
+        'temperature': 0,
+        'logprobs': True,
+        # Extra slots for variants of the same letter, such as " A" or "a"
+        'top_logprobs': min(MAX_TOP_LOGPROBS, len(categories) + 5)
+    }
+
+def _letter(token):
+    token = token.strip().strip('.()[]*:').upper()
+    return token if len(token) == 1 and token in LETTERS else None
+
+def letter_probabilities(response_json, count):
+    """Return the probability of each of the first count letters from a chat completion with logprobs.
+
+    Token variants of the same letter are added together and the result is
+    normalized over the offered letters, so the probabilities sum to 1 no
+    matter how much mass the model put on other tokens. Letters missing from
+    top_logprobs get 0.
+    """
+    choice = response_json['choices'][0]
+    content = (choice.get('logprobs') or {}).get('content') or []
+    if not content:
+        raise ValueError("The server returned no logprobs; logprob scoring needs an LM Studio version "
+                         "that supports them, otherwise use JSON scoring")
+    top = content[0].get('top_logprobs') or [content[0]]
+
+    mass = [0.0] * count
+    for entry in top:
+        letter = _letter(entry.get('token', ''))
+        if letter is not None and LETTERS.index(letter) < count:
+            mass[LETTERS.index(letter)] += math.exp(entry['logprob'])
+    total = sum(mass)
+    if total <= 0:
+        raise ValueError(f"The model did not answer with a category letter: {choice['message'].get('content', '')!r}")
+    return [value / total for value in mass]
+
+def parse_letter_response(response_json, categories, min_probability=0.01):
+    """Turn a letter answer into the usual result JSON string, most likely category first."""
+    probabilities = letter_probabilities(response_json, len(categories))
+    scored = sorted(zip(categories, probabilities), key=lambda item: item[1], reverse=True)
+    return json.dumps({"categories": [
+        {"name": name, "confidence": round(probability, 3)}
+        for name, probability in scored if probability >= min_probability
+    ]})
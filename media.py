@@ -0,0 +1,170 @@
+import shutil
+import struct
+import subprocess
+from pathlib import Path
+
+IMAGE_EXTENSIONS = {'.jpg', '.jpeg', '.png', '.webp'}
+RAW_EXTENSIONS = {'.cr2', '.nef', '.arw', '.dng'}
+VIDEO_EXTENSIONS = {'.mp4', '.mov', '.m4v', '.avi', '.mkv', '.mts'}
+MEDIA_EXTENSIONS = IMAGE_EXTENSIONS | RAW_EXTENSIONS | VIDEO_EXTENSIONS
+
+# TIFF tags used to find embedded previews
+TAG_COMPRESSION = 0x0103
+TAG_PHOTOMETRIC = 0x0106
+TAG_STRIP_OFFSETS = 0x0111
+TAG_STRIP_BYTE_COUNTS = 0x0117
+TAG_SUB_IFDS = 0x014A
+TAG_JPEG_OFFSET = 0x0201
+TAG_JPEG_LENGTH = 0x0202
+TAG_EXIF_IFD = 0x8769
+RAW_PHOTOMETRIC = {32803, 34892}  # CFA and LinearRaw hold sensor data, not previews
+TIFF_TYPE_SIZES = {1: 1, 2: 1, 3: 2, 4: 4, 5: 8, 6: 1, 7: 1, 8: 2, 9: 4, 10: 8, 11: 4, 12: 8, 13: 4}
+
+def is_media_file(path):
+    """Return True for images, RAW files and videos the sorter can analyze."""
+    return Path(path).suffix.lower() in MEDIA_EXTENSIONS and not Path(path).name.startswith('.')
+
+def needs_extraction(path):
+    """Return True if the file must be turned into a JPEG before it can be sent."""
+    suffix = Path(path).suffix.lower()
+    return suffix in RAW_EXTENSIONS or suffix in VIDEO_EXTENSIONS
+
+def _read_ifd(f, offset, endian):
+    """Return {tag: [values]} for the IFD at offset and the offset of the next IFD."""
+    f.seek(offset)
+    count = struct.unpack(endian + 'H', f.read(2))[0]
+    entries = f.read(count * 12)
+    next_offset = struct.unpack(endian + 'I', f.read(4))[0]
+    tags = {}
+    for index in range(count):
+        tag, kind, number, value = struct.unpack_from(endian + 'HHI4s', entries, index * 12)
+        if kind not in (3, 4, 13):
+            continue  # Only SHORT, LONG and IFD values are needed
+        size = TIFF_TYPE_SIZES[kind] * number
+        if size > 4:
+            position = f.tell()
+            f.seek(struct.unpack(endian + 'I', value)[0])
+            value = f.read(size)
+            f.seek(position)
+        code = 'H' if kind == 3 else 'I'
+        tags[tag] = list(struct.unpack_from(endian + code * number, value))
+    return tags, next_offset
+
+def _preview_candidates(f):
+    """Yield (offset, length) of every JPEG preview referenced by the TIFF structure."""
+    header = f.read(8)
+    if header[:2] == b'II':
+        endian = '<'
+    elif header[:2] == b'MM':
+        endian = '>'
+    else:
+        raise ValueError("Not a TIFF-based RAW file")
+    pending = [struct.unpack(endian + 'I', header[4:8])[0]]
+    seen = set()
+
+    while pending:
+        offset = pending.pop()
+        if not offset or offset in seen or len(seen) > 64:
+            continue
+        seen.add(offset)
+        tags, next_offset = _read_ifd(f, offset, endian)
+        pending.append(next_offset)
+        pending.extend(tags.get(TAG_SUB_IFDS, []))
+        pending.extend(tags.get(TAG_EXIF_IFD, []))
+
+        if TAG_JPEG_OFFSET in tags and TAG_JPEG_LENGTH in tags:
+            yield tags[TAG_JPEG_OFFSET][0], tags[TAG_JPEG_LENGTH][0]
+        compression = tags.get(TAG_COMPRESSION, [1])[0]
+        photometric = tags.get(TAG_PHOTOMETRIC, [0])[0]
+        strips = tags.get(TAG_STRIP_OFFSETS, [])
+        if compression in (6, 7) and photometric not in RAW_PHOTOMETRIC and len(strips) == 1:
+            yield strips[0], tags.get(TAG_STRIP_BYTE_COUNTS, [0])[0]
+
+def _is_viewable_jpeg(f, offset, length):
+    """Return True if the data at offset is a baseline or progressive JPEG.
+
+    Some RAW formats store the sensor data itself as lossless JPEG (SOF3),
+    which image viewers and vision models cannot decode.
+    """
+    f.seek(offset)
+    data = f.read(min(length, 65536))
+    if data[:2] != b'\xff\xd8':  # JPEG start-of-image marker
+        return False
+    position = 2
+    while position + 4 <= len(data):
+        if data[position] != 0xFF:
+            return False
+        marker = data[position + 1]
+        if marker in (0xC0, 0xC1, 0xC2):
+            return True
+        if 0xC3 <= marker <= 0xCF and marker not in (0xC4, 0xC8, 0xCC):
+            return False  # Lossless, hierarchical or arithmetic-coded frame
+        position += 2 + struct.unpack('>H', data[position + 2:position + 4])[0]
+    return False
+
+def extract_raw_preview(path):
+    """Return the largest JPEG preview embedded in a CR2, NEF, ARW or DNG file.
+
+    Only the TIFF directory entries and the preview bytes are read; the
+    sensor data is never decoded, so this takes milliseconds instead of the
+    seconds a full RAW development would.
+    """
+    with open(path, 'rb') as f:
+        best = None
+        for offset, length in _preview_candidates(f):
+            if length <= 0 or (best is not None and length <= best[1]):
+                continue
+            if _is_viewable_jpeg(f, offset, length):
+                best = (offset, length)
+        if best is None:
+            raise ValueError(f"No embedded JPEG preview found in {Path(path).name}")
+        f.seek(best[0])
+        return f.read(best[1])
+
+def extract_video_keyframes(path, count=3, max_size=1024, timeout=60):
+    """Return a JPEG with count keyframes of a video side by side, extracted by ffmpeg.
+
+    Each frame comes from its own fast seek to the keyframe nearest an
+    evenly spaced timestamp, so only a handful of frames are decoded no
+    matter how long the video is. Requires ffmpeg and ffprobe on the PATH.
+    """
+    ffmpeg = shutil.which('ffmpeg')
+    ffprobe = shutil.which('ffprobe')
+    if not ffmpeg or not ffprobe:
+        raise ValueError("Video support requires ffmpeg and ffprobe on the PATH")
+
+    probe = subprocess.run(
+        [ffprobe, '-v', 'error', '-show_entries', 'format=duration', '-of', 'csv=p=0', str(path)],
+        capture_output=True, text=True, timeout=timeout
+    )
+    try:
+        duration = float(probe.stdout.strip())
+    except ValueError:
+        raise ValueError(f"Could not read the duration of {Path(path).name}: {probe.stderr.strip()}")
+
+    command = [ffmpeg, '-v', 'error']
+    for index in range(count):
+        timestamp = duration * (index + 0.5) / count
+        command += ['-noaccurate_seek', '-ss', f"{timestamp:.3f}", '-i', str(path)]
+    frame_height = max(64, max_size // 2)
+    scaled = ''.join(f"[{index}:v]scale=-2:{frame_height}[f{index}];" for index in range(count))
+    stacked = ''.join(f"[f{index}]" for index in range(count))
+    layout = f"{stacked}hstack=inputs={count}" if count > 1 else f"{stacked}null"
+    command += [
+        '-filter_complex',
+        f"{scaled}{layout},scale='min({max_size},iw)':-2",
+        '-frames:v', '1', '-f', 'image2pipe', '-c:v', 'mjpeg', '-q:v', '3', '-'
+    ]
+    result = subprocess.run(command, capture_output=True, timeout=timeout)
+    if result.returncode != 0 or not result.stdout:
+        raise ValueError(f"ffmpeg could not extract frames from {Path(path).name}: {result.stderr.decode(errors='replace').strip()}")
+    return result.stdout
+
+def extract_preview(path, max_size=1024):
+    """Return JPEG bytes standing in for a RAW file or video."""
+    suffix = Path(path).suffix.lower()
+    if suffix in RAW_EXTENSIONS:
+        return extract_raw_preview(path)
+    if suffix in VIDEO_EXTENSIONS:
+        return extract_video_keyframes(path, max_size=max_size)
+    raise ValueError(f"No preview extraction for {suffix} files")
@@ -1,20 +1,54 @@
 import os
+import sys
+import argparse
+import hashlib
 from pathlib import Path
-import requests
 import json
-import base64
 import shutil
+import threading
+import time
+from collections import deque
+from cascade import CascadeClient, parse_cascade
+from evaluation import (EVALUATION_FILE_NAME, format_comparison, format_evaluation, load_evaluations, load_golden_set,
+                        new_record, parse_configuration, performance_record, save_evaluation, score_predictions, top_prediction)
+from events import analyze_by_event
+from hierarchy import group_settings, largest_second_stage, leaf_categories, load_category_groups, select_subcategories
+from logprob_scoring import LETTERS, SCORING_MODES, build_letter_prompt, letter_request_options, parse_letter_response
+from media import is_media_file
+from pipeline import ImagePipeline, prepare_image_payload
+from profiling import RunProfiler
+from report_writers import REPORT_FORMATS, open_report_writer
+from response_stream import StreamedCompletion, StreamStats, TokenUsage, sse_events
+from results_db import DATABASE_NAME, ResultsDatabase, default_database_path
+from scheduling import SCHEDULING_POLICIES, order_images
+from streaming_body import StreamingChatBody
+from streaming_output import StreamingOutput
+from warmup import WARMUP_PROMPT, ModelKeepAlive, WarmupStats, make_warmup_payload
+from watch import FileBatcher, open_watcher
+from work_queue import QUEUE_NAME, WorkQueue, default_queue_path, default_worker_id, network_filesystem
+
+# Bump when the wording or expected format of the analysis prompt changes
+PROMPT_VERSION = 1
+
+# Seconds LM Studio keeps a just-in-time loaded model after its last request
+MODEL_TTL = 3600
 
 class LMStudioClient:
-    def __init__(self, base_url="http://localhost:1234"):
+    def __init__(self, base_url="http://localhost:1234", ttl=MODEL_TTL):
         self.base_url = base_url
         self.model = None
         self.available_models = []
+        self.ttl = ttl
+        self.warmup_stats = None
+        self.stream_stats = StreamStats()
+        self.token_usage = TokenUsage()
     
-    def get_available_models(self):
+    def get_available_models(self, timeout=10):
         """Get list of available models from LM Studio."""
+        import requests  # Deferred so importing this module stays fast
+        
         try:
-            response = requests.get(f"{self.base_url}/v1/models")
+            response = requests.get(f"{self.base_url}/v1/models", timeout=timeout)
             if response.status_code == 200:
                 models = response.json().get('data', [])
                 return models
@@ -23,8 +57,14 @@ class LMStudioClient:
             print(f"Error getting available models: {str(e)}")
             return []
     
-    def load_model(self, model_name=None):
-        """Load the specified model in LM Studio."""
+    def load_model(self, model_name=None, warmup_image=None, settings=None):
+        """Load the specified model in LM Studio and warm it up.
+
+        warmup_image is an optional image from the upcoming run, used so the
+        warm-up goes through the same preprocessing and vision path.
+        """
+        import requests
+        
         try:
             # Check if LM Studio is running
             self.available_models = self.get_available_models()
@@ -49,20 +89,11 @@ class LMStudioClient:
                     except ValueError:
                         print("Please enter a valid number.")
             
-            # Load the model
-            response = requests.post(
-                f"{self.base_url}/v1/chat/completions",
-                json={
-                    "model": model_name,
-                    "messages": [{"role": "user", "content": "Hello"}]
-                }
-            )
-            
-            if response.status_code != 200:
-                raise ValueError(f"Failed to load model: {response.text}")
-            
+            # Load the model by sending it an image, so the vision encoder is loaded too
             self.model = model_name
+            self.warmup_stats = self.warm_up(warmup_image, settings)
             print(f"\nSuccessfully loaded model: {model_name}")
+            print(self.warmup_stats.summary())
             return True
             
         except requests.exceptions.ConnectionError:
@@ -72,30 +103,165 @@ class LMStudioClient:
     
     def test_connection(self):
         """Test the connection to LM Studio."""
+        import requests
+        
         try:
             response = requests.get(f"{self.base_url}/v1/models")
             return response.status_code == 200
         except:
             return False
     
-    def analyze_image(self, image_path, categories, threshold, settings):
-        """Analyze a single image and return category assignments."""
+    def warm_up(self, image_path=None, settings=None):
+        """Send two small image requests and return their cold and warm latency."""
+        image_data = make_warmup_payload(image_path, settings)
+        latencies = []
+        for _ in range(2):
+            start = time.monotonic()
+            self.ping(image_data)
+            latencies.append(time.monotonic() - start)
+        return WarmupStats(*latencies)
+    
+    def ping(self, image_data=None):
+        """Send a one-token image request that keeps the model loaded."""
+        response = self._post_image_chat(WARMUP_PROMPT, image_data or make_warmup_payload(), max_tokens=1)
+        if response.status_code != 200:
+            raise ValueError(f"Failed to load model: {response.text}")
+    
+    def _post_image_chat(self, prompt, image_data, **options):
+        """Send a chat completion with one text prompt and one image."""
+        import requests
+        
+        if self.ttl:
+            options.setdefault('ttl', self.ttl)  # Keeps a JIT-loaded model resident between requests
+        return requests.post(
+            f"{self.base_url}/v1/chat/completions",
+            data=build_image_chat_body(self.model, prompt, image_data, **options),
+            headers={"Content-Type": "application/json"}
+        )
+    
+    def _stream_image_chat(self, prompt, image_data, **options):
+        """Stream a chat completion and return its content as soon as a complete JSON answer arrives.
+
+        Closing the connection early makes LM Studio stop generating, so a
+        model that keeps writing after the JSON closes doesn't hold the
+        server slot or the caller any longer.
+        """
+        import requests
+        
+        if self.ttl:
+            options.setdefault('ttl', self.ttl)
+        completion = StreamedCompletion()
+        response = requests.post(
+            f"{self.base_url}/v1/chat/completions",
+            data=build_image_chat_body(self.model, prompt, image_data, stream=True, **options),
+            headers={"Content-Type": "application/json"},
+            stream=True
+        )
+        try:
+            if response.status_code != 200:
+                raise ValueError(f"Failed to analyze image: {response.text}")
+            complete = False
+            # Small reads so each event is handled as soon as it arrives
+            for event in sse_events(response.iter_lines(chunk_size=128)):
+                if completion.add(event):
+                    complete = True
+                    break
+            completion.finish(stopped_early=complete)
+        finally:
+            response.close()
+        self.stream_stats.record(completion)
+        self.token_usage.add_streamed(completion)
+        return completion.content
+    
+    def _score_image(self, categories, image_data, image_path, settings):
+        """Send one scoring request for categories and return the parsed result JSON string."""
+        prompt, options = build_scoring_request(categories, settings)
+        if settings.get('stream_responses') and not uses_logprob_scoring(settings):
+            content = self._stream_image_chat(prompt, image_data, **options)
+            return parse_analysis_content(content, categories, image_path, settings)
+        
+        # Send request to LM Studio, base64-encoding the image as the body is streamed
+        response = self._post_image_chat(prompt, image_data, **options)
+        if response.status_code != 200:
+            raise ValueError(f"Failed to analyze image: {response.text}")
+        response_json = response.json()
+        self.token_usage.add(response_json.get('usage'))
+        return parse_scoring_response(response_json, categories, image_path, settings)
+    
+    def analyze_image(self, image_path, categories, threshold, settings, image_data=None):
+        """Analyze a single image and return category assignments.
+
+        image_data is an optional ImagePayload prepared ahead of time (see
+        ImagePipeline); when omitted the image is prepared here.
+        """
         try:
-            # Read the image file and encode as base64
-            with open(image_path, 'rb') as f:
-                image_data = base64.b64encode(f.read()).decode('utf-8')
+            # Prepare the image unless the pipeline already did
+            if image_data is None:
+                image_data = prepare_image_payload(
+                    image_path,
+                    preprocess=settings.get('preprocess', False),
+                    max_size=settings.get('max_image_size', 1024),
+                    quality=settings.get('jpeg_quality', 85)
+                )
+            
+            groups = None
+            if settings.get('category_groups') and not settings.get('auto_mode', False):
+                # Hierarchical mode: pick coarse groups first, then only offer their subcategories
+                stage_settings = group_settings(settings)
+                group_names = list(settings['category_groups'])
+                categories, groups = select_subcategories(
+                    self._score_image(group_names, image_data, image_path, stage_settings), settings
+                )
+                if not categories:
+                    return json.dumps({"categories": [], "groups": []})
+            
+            return add_groups(self._score_image(categories, image_data, image_path, settings), groups)
             
-            # Create the prompt based on auto mode
-            if settings.get('auto_mode', False):
-                prompt = """Analyze this image and suggest 3-5 categories with confidence scores (0-1). 
+        except Exception as e:
+            raise Exception(f"Error analyzing image: {str(e)}")
+
+def build_image_chat_body(model, prompt, image_data, **options):
+    """Build a chat completion request body with one text prompt and one image.
+
+    The body is a StreamingChatBody, so the image is base64-encoded in
+    chunks while it is written to the socket instead of being held in
+    memory as one large string.
+    """
+    request_json = {
+        "model": model,
+        "messages": [
+            {
+                "role": "user",
+                "content": [
+                    {
+                        "type": "text",
+                        "text": prompt
+                    },
+                    {
+                        "type": "image_url",
+                        "image_url": {
+                            "url": StreamingChatBody.image_url(image_data.mime_type)
+                        }
+                    }
+                ]
+            }
+        ],
+        **options
+    }
+    return StreamingChatBody(request_json, image_data)
+
+def build_analysis_prompt(categories, settings):
+    """Create the image analysis prompt based on auto mode and priority categories."""
+    if settings.get('auto_mode', False):
+        return """Analyze this image and suggest 3-5 categories with confidence scores (0-1). 
 Return as JSON: {"categories": [{"name": "category", "confidence": 0.9}]}. 
 Do not use predefined categories. Be specific and descriptive."""
-            else:
-                # Create the prompt with priority categories first
-                priority_list = "\n".join([f"- {cat} (priority)" for cat in categories if cat in settings.get('priority_categories', [])])
-                regular_list = "\n".join([f"- {cat}" for cat in categories if cat not in settings.get('priority_categories', [])])
-                
-                prompt = f"""Analyze this image and assign it to one or more of these EXACT categories (do not create new ones). Favor priority categories when confident:
+    
+    # Create the prompt with priority categories first
+    priority_list = "\n".join([f"- {cat} (priority)" for cat in categories if cat in settings.get('priority_categories', [])])
+    regular_list = "\n".join([f"- {cat}" for cat in categories if cat not in settings.get('priority_categories', [])])
+    
+    return f"""Analyze this image and assign it to one or more of these EXACT categories (do not create new ones). Favor priority categories when confident:
 
 {priority_list}
 {regular_list}
@@ -103,69 +269,129 @@ Do not use predefined categories. Be specific and descriptive."""
 Return the category(ies) and a confidence score (0-1) for each.
 Format your response as JSON: {{"categories": [{{"name": "category", "confidence": 0.9}}]}}
 IMPORTANT: Only use the categories listed above. Do not create or suggest new categories."""
+
+def uses_logprob_scoring(settings):
+    """Return True if images are scored from the logprobs of a one-letter answer."""
+    return settings.get('scoring') == 'logprobs' and not settings.get('auto_mode', False)
+
+def build_scoring_request(categories, settings):
+    """Return the prompt and extra request options for scoring an image against categories."""
+    if uses_logprob_scoring(settings):
+        return build_letter_prompt(categories, settings.get('priority_categories', [])), letter_request_options(categories)
+    return build_analysis_prompt(categories, settings), {}
+
+def parse_scoring_response(response_json, categories, image_path, settings):
+    """Parse a chat completion into a result JSON string for the scoring mode in use."""
+    if uses_logprob_scoring(settings):
+        return parse_letter_response(response_json, categories)
+    content = response_json['choices'][0]['message']['content']
+    return parse_analysis_content(content, categories, image_path, settings)
+
+def add_groups(result, groups):
+    """Record the groups chosen by hierarchical classification in a result JSON string."""
+    if groups is None:
+        return result
+    result_json = json.loads(result)
+    result_json['groups'] = groups
+    return json.dumps(result_json)
+
+def get_prompt_version(categories, settings):
+    """Identify the prompt used for a run: PROMPT_VERSION plus a hash of the actual prompt."""
+    prompt = build_scoring_request(categories, settings)[0]
+    if settings.get('category_groups'):
+        prompt += json.dumps(settings['category_groups'], sort_keys=True)
+    return f"{PROMPT_VERSION}:{hashlib.sha1(prompt.encode('utf-8')).hexdigest()[:8]}"
+
+def normalize_categories(raw_categories, image_path):
+    """Return the well-formed entries of a reply's category list, with numeric confidences.
+
+    Entries need a name and a confidence that float() accepts; anything else
+    is dropped with a warning, so results, reports and the database only
+    ever see {'name': str, 'confidence': float, ...} entries.
+    """
+    if not isinstance(raw_categories, list):
+        return []
+    normalized = []
+    for cat in raw_categories:
+        try:
+            name = str(cat['name']).strip()
+            confidence = float(cat['confidence'])
+        except (KeyError, TypeError, ValueError):
+            print(f"Warning: Ignoring malformed category {cat!r} for {Path(image_path).name}")
+            continue
+        if not name or confidence != confidence:  # Empty name or NaN
+            print(f"Warning: Ignoring malformed category {cat!r} for {Path(image_path).name}")
+            continue
+        normalized.append(dict(cat, name=name, confidence=confidence))
+    return normalized
+
+def parse_analysis_content(content, categories, image_path, settings):
+    """Parse the model's reply into a JSON result string, dropping hallucinated categories."""
+    # Validate that only user-specified categories are used in non-auto mode
+    try:
+        json_str = content.strip('`').strip()
+        if json_str.startswith('json\n'):
+            json_str = json_str[5:].strip()
+        result_json = json.loads(json_str)
+        result_json['categories'] = normalize_categories(result_json.get('categories'), image_path)
+        
+        if not settings.get('auto_mode', False):  # Only filter categories in non-auto mode
+            # Filter out any hallucinated categories
+            valid_categories = []
+            for cat in result_json['categories']:
+                if cat['name'] in categories:
+                    valid_categories.append(cat)
+                else:
+                    print(f"Warning: Ignoring hallucinated category '{cat['name']}' for {Path(image_path).name}")
             
-            # Send request to LM Studio with base64 image data
-            response = requests.post(
-                f"{self.base_url}/v1/chat/completions",
-                json={
-                    "model": self.model,
-                    "messages": [
-                        {
-                            "role": "user",
-                            "content": [
-                                {
-                                    "type": "text",
-                                    "text": prompt
-                                },
-                                {
-                                    "type": "image_url",
-                                    "image_url": {
-                                        "url": f"data:image/jpeg;base64,{image_data}"
-                                    }
-                                }
-                            ]
-                        }
-                    ]
-                }
-            )
-            
-            if response.status_code != 200:
-                raise ValueError(f"Failed to analyze image: {response.text}")
-            
-            # Parse the response
-            result = response.json()
-            content = result['choices'][0]['message']['content']
-            
-            # Validate that only user-specified categories are used in non-auto mode
-            try:
-                json_str = content.strip('`').strip()
-                if json_str.startswith('json\n'):
-                    json_str = json_str[5:].strip()
-                result_json = json.loads(json_str)
-                
-                if not settings.get('auto_mode', False):  # Only filter categories in non-auto mode
-                    # Filter out any hallucinated categories
-                    valid_categories = []
-                    for cat in result_json['categories']:
-                        if cat['name'] in categories:
-                            valid_categories.append(cat)
-                        else:
-                            print(f"Warning: Ignoring hallucinated category '{cat['name']}' for {image_path.name}")
-                    
-                    # Update the response with only valid categories
-                    result_json['categories'] = valid_categories
-                
-                return json.dumps(result_json)
-                
-            except Exception as e:
-                print(f"Error validating categories: {str(e)}")
-                return json.dumps({"categories": []})
-            
-        except Exception as e:
-            raise Exception(f"Error analyzing image: {str(e)}")
+            # Update the response with only valid categories
+            result_json['categories'] = valid_categories
+        
+        return json.dumps(result_json)
+        
+    except Exception as e:
+        print(f"Error validating categories: {str(e)}")
+        return json.dumps({"categories": []})
+
+def get_cache_dir():
+    """Return the per-user directory for Photo Sorter caches, creating it if needed."""
+    cache_dir = Path(os.environ.get('PHOTO_SORTER_CACHE_DIR', Path.home() / '.photo_sorter'))
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    return cache_dir
+
+def find_media_file(photo_dir, max_entries=20000):
+    """Check whether photo_dir or a subfolder holds an image, RAW file or video.
 
-def validate_photo_directory(path):
-    """Validate if the directory exists and contains image files."""
+    Returns True if one was found and False if there is none. Folders are
+    searched breadth first, so images near the top are found after a few
+    entries, and the search stops at the first match. After max_entries
+    directory entries without a match it gives up and returns None, meaning
+    unknown: a huge library on a network share is never walked in full.
+    """
+    pending = deque([photo_dir])
+    seen = 0
+    while pending:
+        try:
+            with os.scandir(pending.popleft()) as entries:
+                for entry in entries:
+                    seen += 1
+                    if seen > max_entries:
+                        return None
+                    if entry.is_dir(follow_symlinks=False):
+                        pending.append(entry.path)
+                    elif is_media_file(entry.name):
+                        return True
+        except OSError:
+            continue  # Unreadable folders are skipped, as the scan will
+    return False
+
+def validate_photo_directory(path, max_entries=20000):
+    """Validate if the directory exists and contains image files.
+
+    At most max_entries directory entries are checked (see
+    find_media_file); a library too large to check that quickly is assumed
+    to hold images.
+    """
     # Remove any quotes from the path
     path = path.strip("'\"")
     photo_dir = Path(path)
@@ -176,21 +402,8 @@ def validate_photo_directory(path):
     if not photo_dir.is_dir():
         raise ValueError(f"Path is not a directory: {path}")
     
-    # Check for images in the directory and all subfolders
-    image_extensions = {'.jpg', '.jpeg', '.png', '.webp'}
-    has_images = False
-    
-    # Check top-level directory
-    has_images = any(f.suffix.lower() in image_extensions for f in photo_dir.iterdir())
-    
-    # If no images in top directory, check subfolders
-    if not has_images:
-        for root, dirs, files in os.walk(photo_dir):
-            if any(f.lower().endswith(tuple(image_extensions)) for f in files):
-                has_images = True
-                break
-    
-    if not has_images:
+    # Check for images, RAW files or videos in the directory and all subfolders
+    if find_media_file(photo_dir, max_entries) is False:
         raise ValueError(f"No image files found in directory or its subfolders: {path}")
     
     return photo_dir
@@ -217,6 +430,33 @@ def validate_threshold(threshold_str):
     except ValueError:
         raise ValueError("Threshold must be a valid number between 0 and 1")
 
+def validate_parallel_requests(value_str):
+    """Validate the number of parallel requests sent to LM Studio."""
+    try:
+        value = int(value_str)
+        if value < 1:
+            raise ValueError("Parallel requests must be at least 1")
+        return value
+    except ValueError:
+        raise ValueError("Parallel requests must be a whole number of at least 1")
+
+def validate_letter_choices(categories, category_groups=None, max_groups=2):
+    """Check that every request of logprob scoring offers at most one choice per letter.
+
+    With category groups the first stage chooses between the groups and the
+    second between the subcategories of up to max_groups of them, so both
+    lists must fit.
+    """
+    if category_groups:
+        second_stage = largest_second_stage(category_groups, max_groups)
+        if len(category_groups) > len(LETTERS) or second_stage > len(LETTERS):
+            raise ValueError(f"Logprob scoring supports at most {len(LETTERS)} choices per request, but there are "
+                             f"{len(category_groups)} groups and up to {second_stage} subcategories from "
+                             f"{max_groups} groups at once; use smaller groups or JSON scoring")
+    elif len(categories) > len(LETTERS):
+        raise ValueError(f"Logprob scoring supports at most {len(LETTERS)} choices per request; "
+                         "use category groups to split larger lists")
+
 def validate_mode(mode, valid_modes, default_mode):
     """Validate the mode input."""
     mode = mode.strip().lower()
@@ -239,14 +479,26 @@ def collect_user_inputs():
         except ValueError as e:
             print(f"Error: {e}")
     
-    # Get categories
+    # Get category groups for hierarchical classification
     while True:
+        groups_str = input("Enter a category groups file for hierarchical classification (JSON, or leave empty for a flat list): ").strip()
+        try:
+            category_groups = load_category_groups(groups_str) if groups_str else None
+            break
+        except ValueError as e:
+            print(f"Error: {e}")
+    
+    # Get categories
+    while category_groups is None:
         categories_str = input("Enter categories (comma-separated, e.g., 'Family, Vacation, Pets'): ").strip()
         try:
             categories = validate_categories(categories_str)
             break
         except ValueError as e:
             print(f"Error: {e}")
+    if category_groups is not None:
+        categories = leaf_categories(category_groups)
+        print(f"Loaded {len(categories)} categories in {len(category_groups)} groups")
     
     # Get priority categories
     while True:
@@ -274,6 +526,15 @@ def collect_user_inputs():
         except ValueError as e:
             print(f"Error: {e}")
     
+    # Get model cascade
+    while True:
+        cascade_str = input("Model cascade, smallest first (e.g. 'small-vlm:0.8, big-vlm'), or leave empty to choose one model: ").strip()
+        try:
+            cascade = parse_cascade(cascade_str, threshold or 0.7) if cascade_str else None
+            break
+        except ValueError as e:
+            print(f"Error: {e}")
+    
     # Get ambiguity mode
     while True:
         ambiguity_mode = input("Enter ambiguity mode (single/multi, default multi): ").strip()
@@ -283,6 +544,28 @@ def collect_user_inputs():
         except ValueError as e:
             print(f"Error: {e}")
     
+    # Get scoring mode
+    while True:
+        scoring = input("Score with JSON confidences or with token logprobs of a one-letter answer? (json/logprobs, default json): ").strip().lower()
+        try:
+            scoring = validate_mode(scoring, SCORING_MODES, 'json')
+            if scoring == 'logprobs':
+                validate_letter_choices(categories, category_groups)
+            break
+        except ValueError as e:
+            print(f"Error: {e}")
+    
+    # Get response streaming option
+    stream_responses = False
+    if scoring == 'json':
+        while True:
+            streaming = input("Stream responses and stop each one as soon as its JSON is complete? (yes/no, default no): ").strip().lower()
+            try:
+                stream_responses = validate_mode(streaming, ['yes', 'no'], 'no') == 'yes'
+                break
+            except ValueError as e:
+                print(f"Error: {e}")
+    
     # Get output mode
     while True:
         output_mode = input("Enter output mode (move/copy/tag/report, default report): ").strip()
@@ -292,6 +575,28 @@ def collect_user_inputs():
         except ValueError as e:
             print(f"Error: {e}")
     
+    # Get streaming output option
+    streaming_output = False
+    if output_mode in ['move', 'copy']:
+        while True:
+            streaming = input("Sort each file as soon as it is analyzed? (yes/no, default no): ").strip().lower()
+            try:
+                streaming_output = validate_mode(streaming, ['yes', 'no'], 'no') == 'yes'
+                break
+            except ValueError as e:
+                print(f"Error: {e}")
+    
+    # Get report format
+    report_format = 'csv'
+    if output_mode == 'report':
+        while True:
+            report_format = input(f"Enter report format ({'/'.join(REPORT_FORMATS)}, default csv): ").strip()
+            try:
+                report_format = validate_mode(report_format, REPORT_FORMATS, 'csv')
+                break
+            except ValueError as e:
+                print(f"Error: {e}")
+    
     # Get scan subfolders option
     while True:
         scan_subfolders = input("Scan subfolders for images? (yes/no, default yes): ").strip().lower()
@@ -301,15 +606,83 @@ def collect_user_inputs():
         except ValueError as e:
             print(f"Error: {e}")
     
+    # Get preprocessing option
+    while True:
+        preprocess = input("Preprocess images (fix orientation, resize, re-encode)? (yes/no, default no): ").strip().lower()
+        try:
+            preprocess = validate_mode(preprocess, ['yes', 'no'], 'no') == 'yes'
+            break
+        except ValueError as e:
+            print(f"Error: {e}")
+    
+    # Get resolution escalation option
+    while True:
+        escalate = input("Classify from a small image first and re-check only uncertain images at full size? (yes/no, default no): ").strip().lower()
+        try:
+            resolution_escalation = validate_mode(escalate, ['yes', 'no'], 'no') == 'yes'
+            break
+        except ValueError as e:
+            print(f"Error: {e}")
+    
+    # Get event clustering option
+    while True:
+        clustering = input("Group bursts and events by EXIF time and place, and analyze a few shots per event? (yes/no, default no): ").strip().lower()
+        try:
+            event_clustering = validate_mode(clustering, ['yes', 'no'], 'no') == 'yes'
+            break
+        except ValueError as e:
+            print(f"Error: {e}")
+    
+    # Get number of parallel requests
+    while True:
+        parallel_str = input("Number of parallel requests to LM Studio (default 2): ").strip()
+        try:
+            parallel_requests = 2 if not parallel_str else validate_parallel_requests(parallel_str)
+            break
+        except ValueError as e:
+            print(f"Error: {e}")
+    
+    # Get processing order
+    while True:
+        schedule = input(f"Processing order ({'/'.join(SCHEDULING_POLICIES)}, default path): ").strip().lower()
+        try:
+            schedule = validate_mode(schedule, SCHEDULING_POLICIES, 'path')
+            break
+        except ValueError as e:
+            print(f"Error: {e}")
+    
+    # Get adaptive concurrency option
+    while True:
+        adaptive = input("Adapt parallel requests to server latency automatically? (yes/no, default no): ").strip().lower()
+        try:
+            adaptive_concurrency = validate_mode(adaptive, ['yes', 'no'], 'no') == 'yes'
+            break
+        except ValueError as e:
+            print(f"Error: {e}")
+    
     # Print summary
     print("\n=== Settings Summary ===")
     print(f"Photo Directory: {photo_dir}")
     print(f"Categories: {', '.join(categories)}")
+    if category_groups:
+        print(f"Category Groups: {', '.join(category_groups)} (hierarchical)")
     print(f"Priority Categories: {', '.join(priority_categories) if priority_categories else 'None'}")
     print(f"Confidence Threshold: {'Adaptive' if threshold is None else threshold}")
+    if cascade:
+        print("Model Cascade: " + " > ".join(f"{model} (gate {gate})" if gate is not None else model for model, gate in cascade))
     print(f"Ambiguity Mode: {ambiguity_mode}")
+    print(f"Scoring: {scoring}{' (streamed)' if stream_responses else ''}")
     print(f"Output Mode: {output_mode}")
+    if output_mode == 'report':
+        print(f"Report Format: {report_format}")
+    if streaming_output:
+        print("Streaming Output: Yes")
     print(f"Scan Subfolders: {'Yes' if scan_subfolders else 'No'}")
+    print(f"Processing Order: {schedule}")
+    print(f"Preprocessing: {'Yes' if preprocess else 'No'}")
+    print(f"Resolution Escalation: {'Yes' if resolution_escalation else 'No'}")
+    print(f"Event Clustering: {'Yes' if event_clustering else 'No'}")
+    print(f"Parallel Requests: {parallel_requests}{' (adaptive)' if adaptive_concurrency else ''}")
     
     # Ask for confirmation
     while True:
@@ -325,11 +698,23 @@ def collect_user_inputs():
     return {
         'photo_dir': photo_dir,
         'categories': categories,
+        'category_groups': category_groups,
         'priority_categories': priority_categories,
         'threshold': threshold,
+        'cascade': cascade,
         'ambiguity_mode': ambiguity_mode,
+        'scoring': scoring,
+        'stream_responses': stream_responses,
         'output_mode': output_mode,
-        'scan_subfolders': scan_subfolders
+        'report_format': report_format,
+        'scan_subfolders': scan_subfolders,
+        'preprocess': preprocess,
+        'resolution_escalation': resolution_escalation,
+        'event_clustering': event_clustering,
+        'parallel_requests': parallel_requests,
+        'adaptive_concurrency': adaptive_concurrency,
+        'schedule': schedule,
+        'streaming_output': streaming_output
     }
 
 def scan_images(photo_dir, scan_subfolders=True):
@@ -344,7 +729,7 @@ def scan_images(photo_dir, scan_subfolders=True):
         for root, dirs, files in os.walk(photo_dir):
             for file in files:
                 file_path = Path(root) / file
-                if file.lower().endswith(('.jpg', '.jpeg', '.png', '.webp')):
+                if is_media_file(file):
                     image_list.append(file_path)
                 else:
                     skipped_files.append(f"{file_path}: Not an image file")
@@ -352,7 +737,7 @@ def scan_images(photo_dir, scan_subfolders=True):
         # Only scan the specified directory
         for file_path in photo_dir.iterdir():
             if file_path.is_file():
-                if file_path.suffix.lower() in ['.jpg', '.jpeg', '.png', '.webp']:
+                if is_media_file(file_path):
                     image_list.append(file_path)
                 else:
                     skipped_files.append(f"{file_path}: Not an image file")
@@ -366,13 +751,27 @@ def scan_images(photo_dir, scan_subfolders=True):
     
     return image_list
 
-def initialize_lm_studio():
+def load_cascade(base_url, tiers, warmup_image=None, settings=None):
+    """Load and warm up every model of a cascade on one LM Studio server and return a CascadeClient."""
+    clients = []
+    for model, gate in tiers:
+        client = LMStudioClient(base_url)
+        available = [available_model['id'] for available_model in client.get_available_models()]
+        if model not in available:
+            raise ValueError(f"Cascade model {model} is not available in LM Studio")
+        client.load_model(model, warmup_image=warmup_image, settings=settings)
+        clients.append((client, gate))
+    return CascadeClient(clients)
+
+def initialize_lm_studio(warmup_image=None, settings=None):
     """Initialize connection to LM Studio."""
     print("\n=== Initializing LM Studio ===\n")
     
     try:
+        if settings and settings.get('cascade'):
+            return load_cascade(LMStudioClient().base_url, settings['cascade'], warmup_image, settings)
         client = LMStudioClient()
-        if client.load_model():
+        if client.load_model(warmup_image=warmup_image, settings=settings):
             return client
     except Exception as e:
         print(f"Error: {str(e)}")
@@ -399,34 +798,84 @@ def process_single_image(client, image_path, settings):
         print(f"Error processing image: {str(e)}")
         return None
 
-def process_all_images(client, image_list, settings):
-    """Process all images in the list."""
+def schedule_images(image_list, settings):
+    """Order a run's images by settings['schedule'] (see scheduling.order_images)."""
+    policy = settings.get('schedule', 'path')
+    analyzed_paths = None
+    if policy == 'uncached':
+        database = ResultsDatabase(default_database_path(settings['photo_dir']))
+        try:
+            analyzed_paths = database.analyzed_paths()
+        finally:
+            database.close()
+    return order_images(image_list, policy, analyzed_paths)
+
+def process_all_images(client, image_list, settings, use_processes=True, on_result=None, on_error=None, keep_results=True):
+    """Process all images in the list.
+
+    Images are encoded by a process pool and sent to LM Studio by
+    settings['parallel_requests'] network workers (see ImagePipeline).
+    on_result(image_path, json_str) and on_error(image_path, error) are
+    called as each image completes, one at a time. With
+    settings['event_clustering'] only a few images per burst or event are
+    sent and the rest get their answer (see events.analyze_by_event). With
+    keep_results=False the returned dict stays empty, for callers that
+    handle every result in on_result.
+    """
     print("\n=== Processing All Images ===\n")
     results = {}
+    total = len(image_list)
+    completed = 0
+    lock = threading.Lock()
     
-    # Process all images, including the first one
-    for i, image_path in enumerate(image_list, 1):
-        print(f"\nProcessing image {i}/{len(image_list)}: {image_path.name}")
-        try:
-            result = client.analyze_image(
-                image_path,
-                settings['categories'],
-                settings['threshold'],
-                settings
-            )
+    def handle_result(image_path, result):
+        nonlocal completed
+        keep_alive.touch()
+        with lock:
+            completed += 1
             if result:
                 # Extract JSON from markdown code block
                 json_str = result.strip('`').strip()
                 if json_str.startswith('json\n'):
                     json_str = json_str[5:].strip()
-                results[image_path] = json_str
+                if keep_results:
+                    results[image_path] = json_str
+                print(f"\nProcessed image {completed}/{total}: {image_path.name}")
                 print(f"Result: {json_str}")
+                if on_result:
+                    on_result(image_path, json_str)
             else:
                 print(f"Failed to analyze {image_path.name}")
-        except Exception as e:
-            print(f"Error processing {image_path.name}: {str(e)}")
+    
+    def handle_error(image_path, error):
+        nonlocal completed
+        keep_alive.touch()
+        with lock:
+            completed += 1
+            print(f"Error processing {image_path.name}: {str(error)}")
+            if on_error:
+                on_error(image_path, error)
+    
+    # Ping the model during idle gaps so it is never unloaded mid-run
+    keep_alive = ModelKeepAlive(client, idle_seconds=settings.get('keep_alive_interval', 60))
+    pipeline = ImagePipeline(client, settings, use_processes=use_processes)
+    def run(images, on_result, on_error):
+        return pipeline.run(images, on_result=on_result, on_error=on_error)
+    
+    fan_out = None
+    with keep_alive:
+        if settings.get('event_clustering'):
+            fan_out, runs = analyze_by_event(run, image_list, settings, handle_result, handle_error)
+        else:
+            runs = [run(image_list, handle_result, handle_error)]
     
     print("\nProcessing complete!")
+    for metrics in runs:
+        print(metrics.summary())
+    if fan_out:
+        print(fan_out.summary())
+    if settings.get('stream_responses'):
+        print(client.stream_stats.summary())
     return results
 
 def calculate_adaptive_threshold(results, settings):
@@ -477,142 +926,154 @@ def calculate_adaptive_threshold(results, settings):
         print(f"Based on priority categories distribution")
     return adaptive_threshold
 
-def output_results(results, settings):
-    """Organize images based on user-selected output mode."""
-    print("\n=== Processing Output ===\n")
-    
+def prepare_output_dirs(settings):
+    """Create the category folders and the Uncertain folder in the photo directory."""
     base_dir = settings['photo_dir']
-    
-    # Create category directories
     for category in settings['categories']:
         category_dir = base_dir / category
         category_dir.mkdir(exist_ok=True)
-    
-    # Create Uncertain directory
     uncertain_dir = base_dir / 'Uncertain'
     uncertain_dir.mkdir(exist_ok=True)
-    
-    # Calculate threshold (adaptive or fixed)
-    threshold = settings['threshold'] if settings['threshold'] is not None else calculate_adaptive_threshold(results, settings)
-    
-    # Process each image based on output mode
-    import csv
-    from PIL import Image
-    from PIL.ExifTags import TAGS
-    
-    for image_path, result in results.items():
-        try:
-            # Parse the JSON result
-            json_str = result.strip('`').strip()
-            if json_str.startswith('json\n'):
-                json_str = json_str[5:].strip()
-            result_json = json.loads(json_str)
-            categories = result_json['categories']
+
+def place_image(image_path, result, settings, threshold):
+    """Move, copy or tag one analyzed image according to the output mode.
+
+    Returns the image's new path if it was moved, or None if it stayed where
+    it was (copy, report and tag modes, or a failed move).
+    """
+    base_dir = settings['photo_dir']
+    uncertain_dir = base_dir / 'Uncertain'
+    try:
+        # Parse the JSON result
+        json_str = result.strip('`').strip()
+        if json_str.startswith('json\n'):
+            json_str = json_str[5:].strip()
+        result_json = json.loads(json_str)
+        categories = result_json['categories']
+        
+        # Handle single mode
+        if settings['ambiguity_mode'] == 'single':
+            # Get highest confidence category
+            top_category = max(categories, key=lambda x: x['confidence'])
+            categories = [top_category]
+        
+        if settings['output_mode'] == 'report':
+            # Report mode: No file operations needed
+            return
             
-            # Handle single mode
-            if settings['ambiguity_mode'] == 'single':
-                # Get highest confidence category
-                top_category = max(categories, key=lambda x: x['confidence'])
-                categories = [top_category]
+        elif settings['output_mode'] in ['move', 'copy']:
+            # Check if any category meets the threshold
+            has_valid_category = False
             
-            if settings['output_mode'] == 'report':
-                # Report mode: No file operations needed
-                continue
-                
-            elif settings['output_mode'] in ['move', 'copy']:
-                # Check if any category meets the threshold
-                has_valid_category = False
-                
-                # Handle priority categories in move mode
-                if settings['output_mode'] == 'move' and settings.get('priority_categories'):
-                    priority_hits = [cat for cat in categories if cat['name'] in settings['priority_categories'] and cat['confidence'] >= threshold]
-                    if priority_hits:
-                        # Use highest confidence priority category
-                        best_priority = max(priority_hits, key=lambda x: x['confidence'])
-                        target_dir = base_dir / best_priority['name']
-                        target_path = target_dir / image_path.name
-                        shutil.move(str(image_path), str(target_path))
+            # Handle priority categories in move mode
+            if settings['output_mode'] == 'move' and settings.get('priority_categories'):
+                priority_hits = [cat for cat in categories if cat['name'] in settings['priority_categories'] and cat['confidence'] >= threshold]
+                if priority_hits:
+                    # Use highest confidence priority category
+                    best_priority = max(priority_hits, key=lambda x: x['confidence'])
+                    target_dir = base_dir / best_priority['name']
+                    target_path = target_dir / image_path.name
+                    shutil.move(str(image_path), str(target_path))
+                    return target_path
+            
+            # If no priority category met threshold, use standard logic
+            if not has_valid_category:
+                # Process each category
+                for cat_info in categories:
+                    # Only use categories that were specified by the user
+                    if cat_info['name'] not in settings['categories']:
+                        continue
+                        
+                    if cat_info['confidence'] >= threshold:
                         has_valid_category = True
-                
-                # If no priority category met threshold, use standard logic
-                if not has_valid_category:
-                    # Process each category
-                    for cat_info in categories:
-                        # Only use categories that were specified by the user
-                        if cat_info['name'] not in settings['categories']:
-                            continue
-                            
-                        if cat_info['confidence'] >= threshold:
-                            has_valid_category = True
-                            target_dir = base_dir / cat_info['name']
-                            target_path = target_dir / image_path.name
-                            if settings['output_mode'] == 'move':
-                                shutil.move(str(image_path), str(target_path))
-                            else:  # copy
-                                shutil.copy2(str(image_path), str(target_path))
-                
-                # If no valid categories or none meet threshold, move to Uncertain
-                if not has_valid_category:
-                    target_path = uncertain_dir / image_path.name
-                    if settings['output_mode'] == 'move':
-                        shutil.move(str(image_path), str(target_path))
-                    else:  # copy
-                        shutil.copy2(str(image_path), str(target_path))
-                
-            elif settings['output_mode'] == 'tag':
-                # Add categories to EXIF data
-                img = Image.open(image_path)
-                exif = img.getexif()
-                
-                # Convert categories to string
-                category_str = ','.join([
-                    f"{cat['name']}({cat['confidence']:.2f})"
-                    for cat in categories
-                ])
-                
-                # Add custom tag for categories
-                exif[0x9286] = category_str  # Using a custom tag number
-                img.save(image_path, exif=exif)
-                
-        except Exception as e:
-            print(f"Error processing {image_path.name}: {str(e)}")
-            # Move to Uncertain on error
-            if settings['output_mode'] in ['move', 'copy']:
+                        target_dir = base_dir / cat_info['name']
+                        target_path = target_dir / image_path.name
+                        if settings['output_mode'] == 'move':
+                            # A file can only be moved once, so it goes to the first matching category
+                            shutil.move(str(image_path), str(target_path))
+                            return target_path
+                        else:  # copy
+                            shutil.copy2(str(image_path), str(target_path))
+            
+            # If no valid categories or none meet threshold, move to Uncertain
+            if not has_valid_category:
                 target_path = uncertain_dir / image_path.name
                 if settings['output_mode'] == 'move':
                     shutil.move(str(image_path), str(target_path))
+                    return target_path
                 else:  # copy
                     shutil.copy2(str(image_path), str(target_path))
-    
-    # Generate report if in report mode
-    if settings['output_mode'] == 'report':
-        report_path = base_dir / 'analysis_report.csv'
-        with open(report_path, 'w', newline='') as f:
-            writer = csv.writer(f)
-            writer.writerow(['Image', 'Categories', 'Confidence', 'Threshold'])
             
-            for image_path, result in results.items():
-                try:
-                    json_str = result.strip('`').strip()
-                    if json_str.startswith('json\n'):
-                        json_str = json_str[5:].strip()
-                    result_json = json.loads(json_str)
-                    categories = result_json['categories']
-                    
-                    # Format categories and confidence scores
-                    cat_str = ', '.join([
-                        f"{cat['name']} ({cat['confidence']:.2f})"
-                        for cat in categories
-                    ])
-                    
-                    writer.writerow([image_path.name, cat_str, f"{threshold:.3f}"])
-                except Exception as e:
-                    writer.writerow([image_path.name, f"Error: {str(e)}", f"{threshold:.3f}"])
-        
-        print(f"\nReport generated: {report_path}")
+        elif settings['output_mode'] == 'tag':
+            from PIL import Image
+            
+            # Add categories to EXIF data
+            img = Image.open(image_path)
+            exif = img.getexif()
+            
+            # Convert categories to string
+            category_str = ','.join([
+                f"{cat['name']}({cat['confidence']:.2f})"
+                for cat in categories
+            ])
+            
+            # Add custom tag for categories
+            exif[0x9286] = category_str  # Using a custom tag number
+            img.save(image_path, exif=exif)
+            
+    except Exception as e:
+        print(f"Error processing {image_path.name}: {str(e)}")
+        # Move to Uncertain on error
+        if settings['output_mode'] in ['move', 'copy']:
+            target_path = uncertain_dir / image_path.name
+            if settings['output_mode'] == 'move':
+                shutil.move(str(image_path), str(target_path))
+                return target_path
+            else:  # copy
+                shutil.copy2(str(image_path), str(target_path))
+    return None
+
+def place_and_record(image_path, result, settings, threshold, database=None):
+    """Place one image and point its database result at the file's new location if it was moved."""
+    new_path = place_image(image_path, result, settings, threshold)
+    if new_path is not None and database is not None:
+        database.relocate(image_path, new_path)
+    return new_path
+
+def output_results(results, settings, database=None):
+    """Organize images based on user-selected output mode.
+
+    Moved images are relocated in database, if given, so their results keep
+    pointing at the files.
+    """
+    print("\n=== Processing Output ===\n")
+    
+    prepare_output_dirs(settings)
+    
+    # Calculate threshold (adaptive or fixed)
+    threshold = settings['threshold'] if settings['threshold'] is not None else calculate_adaptive_threshold(results, settings)
+    
+    # Process each image based on output mode; reports are written while images are analyzed
+    for image_path, result in results.items():
+        place_and_record(image_path, result, settings, threshold, database)
     
     print("\nOutput processing complete!")
 
+def open_streaming_output(settings, database=None):
+    """Return a StreamingOutput that places images as they are analyzed, or None if the mode has no files to place.
+
+    Moved images are relocated in database, if given.
+    """
+    if settings['output_mode'] not in ['move', 'copy']:
+        return None
+    prepare_output_dirs(settings)
+    return StreamingOutput(
+        settings,
+        lambda image_path, result, threshold: place_and_record(image_path, result, settings, threshold, database),
+        warmup=settings.get('stream_warmup', 20),
+        margin=settings.get('stream_margin', 0.05)
+    )
+
 def move_or_copy_file(src, dst, mode="move"):
     """Move or copy a file to a destination directory."""
     try:
@@ -630,15 +1091,519 @@ def move_or_copy_file(src, dst, mode="move"):
         print(f"Error {mode}ing file: {str(e)}")
         return False
 
-if __name__ == "__main__":
+def run_sorter(profile=False):
+    """Run the interactive sorter: collect settings, analyze images and output results.
+
+    With profile=True each stage is profiled and the profiles are written to
+    a profile_<time> folder in the photo directory (see profiling.RunProfiler).
+    """
+    settings = collect_user_inputs()
+    if not settings:
+        return
+    with RunProfiler(settings['photo_dir'], enabled=profile) as profiler:
+        profiler.stage('scan')
+        image_list = scan_images(settings['photo_dir'], settings['scan_subfolders'])
+        if image_list:
+            image_list = schedule_images(image_list, settings)
+            # Warm the model up on a real image from this run
+            profiler.stage('load_model')
+            client = initialize_lm_studio(image_list[0], settings)
+            if client:
+                # Record every result in the photo directory's database as it completes,
+                # and stream the report so it can be read mid-run
+                database = ResultsDatabase(default_database_path(settings['photo_dir']))
+                database.start_run(settings, client.model, get_prompt_version(settings['categories'], settings))
+                report = None
+                if settings['output_mode'] == 'report':
+                    report = open_report_writer(settings['report_format'], settings['photo_dir'], settings)
+                # Place files while the rest are still being analyzed
+                output = open_streaming_output(settings, database) if settings.get('streaming_output') else None
+                
+                def on_result(image_path, result):
+                    database.record(image_path, result)
+                    if report:
+                        report.write(image_path, result)
+                    if output:
+                        output.add(image_path, result)
+                
+                def on_error(image_path, error):
+                    database.record(image_path, error=error)
+                    if report:
+                        report.write(image_path, error=error)
+                
+                try:
+                    # Process all images
+                    profiler.stage('analyze')
+                    # Reports and streamed output handle every result as it arrives
+                    results = process_all_images(client, image_list, settings, on_result=on_result,
+                                                 on_error=on_error, keep_results=output is None and report is None)
+                    if results:
+                        # Placed before the database closes so moved images can be relocated in it
+                        profiler.stage('output')
+                        output_results(results, settings, database)
+                    database.finish_run()
+                finally:
+                    if output:
+                        output.finish()
+                        print(f"\n{output.summary()}")
+                    database.close()
+                    cascade_summary = client.summary() if isinstance(client, CascadeClient) else None
+                    if cascade_summary:
+                        print(f"\n{cascade_summary}")
+                    if report:
+                        report.close(cascade_summary)
+                        print(f"\nReport generated: {report.path}")
+                        print(report.threshold_summary())
+                print(f"\nResults saved to database: {database.path}")
+                print("\nAll processing complete!")
+
+def run_query(args):
+    """Print results from the database that match the query arguments."""
+    database_path = Path(args.database)
+    if database_path.is_dir():
+        database_path = default_database_path(database_path)
+    if not database_path.exists():
+        print(f"Error: Database not found: {database_path}")
+        return 1
+    
+    database = ResultsDatabase(database_path)
+    try:
+        rows = database.query(
+            category=args.category,
+            min_confidence=args.min_confidence,
+            max_confidence=args.max_confidence,
+            model=args.model,
+            run_id=args.run,
+            top_only=not args.any_category,
+            all_runs=args.all_runs,
+            limit=args.limit
+        )
+    finally:
+        database.close()
+    
+    for path, category, confidence, corrected, model, analyzed_at in rows:
+        note = " (corrected)" if corrected else ""
+        print(f"{confidence:.2f}  {category}{note}  {path}")
+    print(f"\n{len(rows)} matching image(s)")
+    return 0
+
+def run_coordinator(args):
+    """Publish a photo directory to a work queue and collect the results workers post back."""
     settings = collect_user_inputs()
-    if settings:
-        client = initialize_lm_studio()
-        if client:
-            image_list = scan_images(settings['photo_dir'], settings['scan_subfolders'])
-            if image_list:
-                # Process all images
-                results = process_all_images(client, image_list, settings)
-                if results:
-                    output_results(results, settings)
-                print("\nAll processing complete!") 
\ No newline at end of file
+    if not settings:
+        return 1
+    image_list = scan_images(settings['photo_dir'], settings['scan_subfolders'])
+    if not image_list:
+        return 1
+    
+    photo_dir = settings['photo_dir']
+    # Workers claim items in the order they were queued
+    image_list = schedule_images(image_list, settings)
+    work_queue = WorkQueue(args.queue or default_queue_path(photo_dir), max_attempts=args.max_attempts)
+    warn_network_queue(work_queue.path)
+    added = work_queue.publish(photo_dir, image_list, settings, model=args.model)
+    print(f"\nQueued {added} new image(s) in {work_queue.path}")
+    print(f"Start workers with: python photo_sorter.py worker {work_queue.path}")
+    
+    database = ResultsDatabase(default_database_path(photo_dir))
+    database.start_run(settings, args.model, get_prompt_version(settings['categories'], settings))
+    report = None
+    if settings['output_mode'] == 'report':
+        report = open_report_writer(settings['report_format'], photo_dir, settings)
+    # Workers have finished reading an image once its result is collected, so it can be placed right away
+    output = open_streaming_output(settings, database) if settings.get('streaming_output') else None
+    
+    results = {}
+    analyzed = 0
+    failed = 0
+    try:
+        while True:
+            # Read the status before collecting so nothing finished in between is missed
+            finished = work_queue.finished()
+            batch = work_queue.collect()
+            for relative_path, result, error in batch:
+                image_path = photo_dir / relative_path
+                if error is None:
+                    analyzed += 1
+                    database.record(image_path, result)
+                    if output:
+                        output.add(image_path, result)
+                    elif not report:
+                        results[image_path] = result
+                else:
+                    failed += 1
+                    print(f"\nError processing {image_path.name}: {error}")
+                    database.record(image_path, error=error)
+                if report:
+                    report.write(image_path, result, error)
+            
+            counts = work_queue.counts()
+            print(f"\rDone {counts['done']}, failed {counts['failed']}, in progress {counts['leased']}, "
+                  f"waiting {counts['pending']}", end='', flush=True)
+            if finished and not batch:
+                break
+            if not batch:
+                time.sleep(args.poll_interval)
+        print()
+        if results:
+            output_results(results, settings, database)
+        database.finish_run()
+    finally:
+        # Images still deferred are placed while the database is open, so they can be relocated
+        if output:
+            output.finish()
+            print(f"\n{output.summary()}")
+        database.close()
+        if report:
+            report.close()
+            print(f"\nReport generated: {report.path}")
+            print(report.threshold_summary())
+    
+    # Every image is accounted for, so the queue is not needed for a later run, unless
+    # workers (e.g. with --wait) still have it open or hold leases
+    attached = work_queue.attached_workers()
+    leased = work_queue.counts()['leased']
+    work_queue.close()
+    if attached or leased:
+        print(f"\nKeeping {work_queue.path}: {len(attached)} worker(s) still attached, {leased} image(s) leased. "
+              f"Delete it once the workers have stopped.")
+    else:
+        work_queue.path.unlink()
+    
+    print(f"\nResults saved to database: {database.path}")
+    print(f"\nAll processing complete! {analyzed} analyzed, {failed} failed.")
+    return 0
+
+def warn_network_queue(queue_path):
+    """Warn when the work queue is on a network share, where SQLite's locking is often unreliable."""
+    fs_type = network_filesystem(queue_path.parent)
+    if fs_type:
+        print(f"Warning: {queue_path} is on a {fs_type} share. SQLite's file locking is unreliable on many "
+              f"SMB and NFS setups, which can let two workers claim the same image or corrupt the queue. "
+              f"Use --queue to keep it on a filesystem with working locks if you see errors or duplicates.")
+
+def run_worker(args):
+    """Claim images from a work queue, analyze them with the local LM Studio server and post the results back."""
+    queue_path = Path(args.queue)
+    if queue_path.is_dir():
+        queue_path = default_queue_path(queue_path)
+    if not queue_path.exists():
+        print(f"Error: Work queue not found: {queue_path}")
+        return 1
+    
+    warn_network_queue(queue_path)
+    work_queue = WorkQueue(queue_path)
+    settings = work_queue.settings()
+    # Hosts may mount the library in different places; by default it is the queue's directory
+    photo_dir = Path(args.photo_dir) if args.photo_dir else queue_path.parent
+    settings['photo_dir'] = photo_dir
+    if args.parallel:
+        settings['parallel_requests'] = args.parallel
+    worker_id = args.worker_id or default_worker_id()
+    batch_size = args.batch or settings.get('parallel_requests', 2) * 8
+    
+    held = set()  # Ids of the items this worker has leased and not finished
+    held_lock = threading.Lock()
+    stop_event = threading.Event()
+    
+    def renew_leases():
+        while not stop_event.wait(args.lease / 3):
+            with held_lock:
+                item_ids = list(held)
+            try:
+                # Tells the coordinator this worker still has the queue open
+                work_queue.heartbeat(worker_id, args.lease)
+                if item_ids:
+                    work_queue.renew(item_ids, worker_id, args.lease)
+            except Exception as e:
+                print(f"Error renewing leases: {str(e)}")
+    
+    def claim():
+        items = work_queue.claim(worker_id, batch_size, args.lease)
+        with held_lock:
+            held.update(item_id for item_id, _ in items)
+        return {photo_dir / relative_path: item_id for item_id, relative_path in items}
+    
+    def on_result(image_path, result):
+        item_id = batch[image_path]
+        work_queue.complete(item_id, worker_id, result)
+        with held_lock:
+            held.discard(item_id)
+    
+    def on_error(image_path, error):
+        item_id = batch[image_path]
+        work_queue.fail(item_id, worker_id, error)
+        with held_lock:
+            held.discard(item_id)
+    
+    print(f"\n=== Worker {worker_id} ===\n")
+    print(f"Queue: {queue_path}")
+    print(f"Photo Directory: {photo_dir}")
+    print(f"LM Studio: {args.server}")
+    
+    work_queue.heartbeat(worker_id, args.lease)
+    heartbeat = threading.Thread(target=renew_leases, daemon=True)
+    heartbeat.start()
+    try:
+        batch = claim()
+        if settings.get('cascade') and not args.model:
+            client = load_cascade(args.server, settings['cascade'], warmup_image=next(iter(batch), None), settings=settings)
+        else:
+            client = LMStudioClient(args.server)
+            client.load_model(args.model or work_queue.get_meta('model'),
+                              warmup_image=next(iter(batch), None), settings=settings)
+        processed = 0
+        while True:
+            if not batch:
+                if work_queue.finished() and not args.wait:
+                    break
+                time.sleep(args.poll_interval)
+                batch = claim()
+                continue
+            process_all_images(client, list(batch), settings, on_result=on_result, on_error=on_error)
+            processed += len(batch)
+            batch = claim()
+    finally:
+        stop_event.set()
+        heartbeat.join()
+        try:
+            work_queue.leave(worker_id)
+        except Exception:
+            pass  # The coordinator keeps the queue until the heartbeat expires
+        work_queue.close()
+    
+    print(f"\nWorker finished after {processed} image(s)")
+    return 0
+
+def run_watch(args):
+    """Sort photos as they arrive in a folder until interrupted."""
+    settings = collect_user_inputs()
+    if not settings:
+        return 1
+    photo_dir = settings['photo_dir']
+    
+    database = ResultsDatabase(default_database_path(photo_dir))
+    # Files already in the folder that no earlier run has analyzed are sorted first
+    analyzed = database.analyzed_paths()
+    backlog = sorted(path for path in photo_dir.iterdir()
+                     if path.is_file() and is_media_file(path) and str(path) not in analyzed)
+    
+    client = initialize_lm_studio(backlog[0] if backlog else None, settings)
+    if not client:
+        database.close()
+        return 1
+    
+    database.start_run(settings, client.model, get_prompt_version(settings['categories'], settings))
+    report = None
+    if settings['output_mode'] == 'report':
+        report = open_report_writer(settings['report_format'], photo_dir, settings)
+    # One threshold estimate for the whole watch instead of one per batch
+    output = open_streaming_output(settings, database)
+    
+    def on_result(image_path, result):
+        database.record(image_path, result)
+        if report:
+            report.write(image_path, result)
+        if output:
+            output.add(image_path, result)
+    
+    def on_error(image_path, error):
+        database.record(image_path, error=error)
+        if report:
+            report.write(image_path, error=error)
+    
+    def signature(path):
+        try:
+            stat = path.stat()
+            return stat.st_size, stat.st_mtime_ns
+        except OSError:
+            return None
+    
+    watcher = open_watcher(photo_dir, polling=args.polling, interval=args.poll_interval)
+    batcher = FileBatcher(settle_seconds=args.settle, batch_size=args.batch_size, batch_window=args.batch_window)
+    batcher.add(backlog)
+    # Files left in the folder after sorting (report/copy/tag modes), so their own events are ignored
+    handled = {}
+    keep_alive = ModelKeepAlive(client, idle_seconds=settings.get('keep_alive_interval', 60)).start()
+    
+    print(f"\nWatching {photo_dir} for new photos. Press Ctrl+C to stop.")
+    try:
+        while True:
+            batcher.add(watcher.events(timeout=0.5))
+            batch = [path for path in batcher.next_batch() if handled.get(path) != signature(path)]
+            if not batch:
+                continue
+            
+            started = time.monotonic()
+            results = process_all_images(client, batch, settings, on_result=on_result,
+                                         on_error=on_error, keep_results=output is None and report is None)
+            if results:
+                output_results(results, settings, database)
+            if output and not batcher.waiting():
+                # Borderline photos wait for a better estimate only while more are arriving
+                output.finish()
+            database.flush()
+            if report:
+                report.flush()
+            keep_alive.touch()
+            for path in batch:
+                if path.exists():
+                    handled[path] = signature(path)
+            print(f"\nSorted {len(batch)} new photo(s) in {time.monotonic() - started:.1f}s; "
+                  f"{batcher.waiting()} waiting. Watching for more...")
+    except KeyboardInterrupt:
+        print("\nStopping watch")
+    finally:
+        keep_alive.stop()
+        watcher.close()
+        if output:
+            output.finish()
+        database.finish_run()
+        database.close()
+        if report:
+            report.close()
+            print(report.threshold_summary())
+    return 0
+
+def run_evaluate(args):
+    """Measure speed and accuracy of one or more configurations on a labelled folder tree."""
+    samples, labels = load_golden_set(args.golden_dir)
+    labels_by_path = dict(samples)
+    if args.config:
+        configurations = [parse_configuration(text, index) for index, text in enumerate(args.config, 1)]
+    else:
+        configurations = [('baseline', {})]
+    output_path = Path(args.output)
+    
+    print(f"\n=== Evaluating {len(configurations)} configuration(s) on {len(samples)} images in {len(labels)} categories ===\n")
+    records = []
+    for name, overrides in configurations:
+        settings = {
+            'photo_dir': Path(args.golden_dir),
+            'categories': labels,
+            'category_groups': None,
+            'priority_categories': [],
+            'threshold': args.threshold,
+            'ambiguity_mode': 'single',
+            'scoring': 'json',
+            'output_mode': 'report',
+            'parallel_requests': args.parallel,
+            'preprocess': False
+        }
+        settings.update(overrides)
+        if isinstance(settings.get('cascade'), str):
+            settings['cascade'] = parse_cascade(settings['cascade'])
+        
+        print(f"\n--- {name} ---")
+        warmup_image = samples[0][0]
+        if settings.get('cascade'):
+            client = load_cascade(args.server, settings['cascade'], warmup_image, settings)
+        else:
+            client = LMStudioClient(args.server)
+            client.load_model(settings.get('model') or args.model, warmup_image=warmup_image, settings=settings)
+        # Only the evaluated requests count, not the warm-up
+        client.token_usage = TokenUsage()
+        client.stream_stats = StreamStats()
+        
+        results = {}
+        def on_result(image_path, result):
+            json_str = result.strip('`').strip()
+            if json_str.startswith('json\n'):
+                json_str = json_str[5:].strip()
+            results[image_path] = json_str
+        def on_error(image_path, error):
+            print(f"Error processing {image_path.name}: {str(error)}")
+        
+        start = time.monotonic()
+        metrics = ImagePipeline(client, settings).run(list(labels_by_path), on_result=on_result, on_error=on_error)
+        elapsed = time.monotonic() - start
+        
+        threshold = settings['threshold'] if settings['threshold'] is not None else calculate_adaptive_threshold(results, settings)
+        pairs = []
+        for image_path, label in samples:
+            try:
+                prediction = top_prediction(results[image_path], threshold) if image_path in results else None
+            except (ValueError, KeyError):
+                prediction = None  # Unparseable answers count as uncertain
+            pairs.append((label, prediction))
+        
+        record = new_record(name, client.model, args.golden_dir, overrides, threshold,
+                            score_predictions(pairs, labels), performance_record(metrics, elapsed, client.token_usage))
+        save_evaluation(output_path, record)
+        records.append(record)
+        print()
+        print(format_evaluation(record))
+    
+    # Earlier runs on the same golden set, for comparison
+    history = [record for record in load_evaluations(output_path) if record['golden_set'] == str(args.golden_dir)]
+    print(f"\n=== Comparison ({output_path}) ===\n")
+    print(format_comparison(history[-max(args.history, len(records)):]))
+    return 0
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Sort photos into categories using a vision model in LM Studio.")
+    parser.add_argument('--profile', action='store_true', help="Write CPU and memory profiles of the run to a profile_<time> folder in the photo directory")
+    subparsers = parser.add_subparsers(dest='command')
+    
+    query_parser = subparsers.add_parser('query', help="Query the results database, e.g. all images in Pets with confidence < 0.6")
+    query_parser.add_argument('database', help=f"Path to {DATABASE_NAME} or the photo directory containing it")
+    query_parser.add_argument('--category', help="Only images in this category")
+    query_parser.add_argument('--min-confidence', type=float, help="Only results with confidence >= this value")
+    query_parser.add_argument('--max-confidence', type=float, help="Only results with confidence < this value")
+    query_parser.add_argument('--model', help="Only results produced by this model")
+    query_parser.add_argument('--run', type=int, help="Only results from this run id")
+    query_parser.add_argument('--any-category', action='store_true', help="Match any assigned category, not just the top one")
+    query_parser.add_argument('--all-runs', action='store_true', help="Include results superseded by later runs")
+    query_parser.add_argument('--limit', type=int, help="Maximum number of rows to print")
+    
+    coordinate_parser = subparsers.add_parser('coordinate', help="Queue a photo directory for workers on other machines and collect their results")
+    coordinate_parser.add_argument('--queue', help=f"Path of the work queue (default: {QUEUE_NAME} in the photo directory, which must be shared with the workers)")
+    coordinate_parser.add_argument('--model', help="Model the workers should load (default: ask on each worker)")
+    coordinate_parser.add_argument('--max-attempts', type=int, default=3, help="Times an image is tried before it is marked failed")
+    coordinate_parser.add_argument('--poll-interval', type=float, default=2.0, help="Seconds between checks for new results")
+    
+    worker_parser = subparsers.add_parser('worker', help="Analyze images from a coordinator's work queue with the local LM Studio server")
+    worker_parser.add_argument('queue', help=f"Path to {QUEUE_NAME} or the shared photo directory containing it")
+    worker_parser.add_argument('--photo-dir', help="Where the photo directory is mounted on this machine (default: the queue's directory)")
+    worker_parser.add_argument('--server', default="http://localhost:1234", help="LM Studio server to use")
+    worker_parser.add_argument('--model', help="Model to load (default: the coordinator's choice)")
+    worker_parser.add_argument('--parallel', type=int, help="Parallel requests to the server (default: the coordinator's setting)")
+    worker_parser.add_argument('--batch', type=int, help="Images claimed at a time (default: 8 per parallel request)")
+    worker_parser.add_argument('--lease', type=float, default=300.0, help="Seconds a claimed image is reserved before others may retry it")
+    worker_parser.add_argument('--worker-id', help="Name recorded with results (default: host name and process id)")
+    worker_parser.add_argument('--poll-interval', type=float, default=5.0, help="Seconds between checks when no work is available")
+    worker_parser.add_argument('--wait', action='store_true', help="Keep waiting for new work after the queue is empty")
+    
+    watch_parser = subparsers.add_parser('watch', help="Keep running and sort photos as they are added to the folder")
+    watch_parser.add_argument('--polling', action='store_true', help="List the folder periodically instead of using inotify")
+    watch_parser.add_argument('--poll-interval', type=float, default=1.0, help="Seconds between folder listings when polling")
+    watch_parser.add_argument('--settle', type=float, default=1.0, help="Seconds a file must stay unchanged before it is considered fully written")
+    watch_parser.add_argument('--batch-size', type=int, default=16, help="Maximum number of photos sorted together")
+    watch_parser.add_argument('--batch-window', type=float, default=2.0, help="Seconds to wait for more photos before sorting a partial batch")
+    
+    evaluate_parser = subparsers.add_parser('evaluate', help="Measure accuracy and speed of configurations on folders of labelled images")
+    evaluate_parser.add_argument('golden_dir', help="Folder with one subfolder of example images per category; the folder name is the true category")
+    evaluate_parser.add_argument('--config', action='append', help="Settings overrides as inline JSON or a JSON file, e.g. '{\"name\": \"small\", \"preprocess\": true, \"max_image_size\": 512}'; repeat to compare several (default: one baseline run)")
+    evaluate_parser.add_argument('--server', default="http://localhost:1234", help="LM Studio server to use")
+    evaluate_parser.add_argument('--model', help="Model for configurations without a \"model\" key (default: ask)")
+    evaluate_parser.add_argument('--threshold', type=float, help="Confidence below which an answer counts as uncertain (default: adaptive)")
+    evaluate_parser.add_argument('--parallel', type=int, default=2, help="Parallel requests to the server")
+    evaluate_parser.add_argument('--output', default=EVALUATION_FILE_NAME, help="File the results are appended to (default: %(default)s)")
+    evaluate_parser.add_argument('--history', type=int, default=10, help="Number of earlier results shown for comparison")
+    
+    args = parser.parse_args(argv)
+    if args.command == 'watch':
+        return run_watch(args)
+    if args.command == 'query':
+        return run_query(args)
+    if args.command == 'coordinate':
+        return run_coordinator(args)
+    if args.command == 'worker':
+        return run_worker(args)
+    if args.command == 'evaluate':
+        return run_evaluate(args)
+    run_sorter(profile=args.profile)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
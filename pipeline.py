@@ -0,0 +1,395 @@
+import io
+import os
+import queue
+import threading
+import time
+from collections import deque
+from pathlib import Path
+from concurrency import AdaptiveConcurrencyController
+from media import extract_preview, needs_extraction
+from readahead import ReadAhead
+from streaming_body import ImagePayload
+
+DEFAULT_ESCALATION_SIZE = 384
+
+IMAGE_MIME_TYPES = {
+    '.jpg': 'image/jpeg',
+    '.jpeg': 'image/jpeg',
+    '.png': 'image/png',
+    '.webp': 'image/webp'
+}
+
+def prepare_image_payload(image_path, preprocess=False, max_size=1024, quality=85):
+    """Prepare an image for sending to LM Studio and return an ImagePayload.
+
+    With preprocessing enabled the image is decoded, rotated according to its
+    EXIF orientation, downscaled to fit max_size and re-encoded as JPEG.
+    Otherwise the file is left on disk and streamed straight into the request.
+    RAW files and videos are replaced by their embedded preview or keyframes
+    (see media.py). This runs in a worker process, so it must stay a plain
+    module-level function.
+    """
+    image_path = Path(image_path)
+    source = image_path
+    if needs_extraction(image_path):
+        preview = extract_preview(image_path, max_size)
+        if not preprocess:
+            return ImagePayload(image_path, 'image/jpeg', preview)
+        source = io.BytesIO(preview)
+    elif not preprocess:
+        return ImagePayload(image_path, IMAGE_MIME_TYPES.get(image_path.suffix.lower(), 'image/jpeg'))
+
+    from PIL import Image, ImageOps
+
+    with Image.open(source) as img:
+        img = ImageOps.exif_transpose(img)
+        img.thumbnail((max_size, max_size))
+        if img.mode != 'RGB':
+            img = img.convert('RGB')
+        buffer = io.BytesIO()
+        img.save(buffer, format='JPEG', quality=quality)
+    return ImagePayload(image_path, 'image/jpeg', buffer.getvalue())
+
+class PipelineMetrics:
+    """Queue-depth and stall statistics for a pipeline run."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.depth_samples = 0
+        self.depth_total = 0
+        self.max_depth = 0
+        self.encoded = 0
+        self.encode_errors = 0
+        self.analyzed = 0
+        self.analyze_errors = 0
+        self.producer_blocked = 0.0  # Seconds encoders waited on a full queue
+        self.consumer_starved = 0.0  # Seconds network workers waited on an empty queue
+        self.latencies = []  # Seconds from request to answer per analyzed image
+        self.start_time = time.monotonic()
+        self.controller = None
+        self.escalation = None
+        self.read_ahead = None
+
+    def sample_depth(self, depth):
+        with self.lock:
+            self.depth_samples += 1
+            self.depth_total += depth
+            self.max_depth = max(self.max_depth, depth)
+
+    def add(self, name, value=1):
+        with self.lock:
+            setattr(self, name, getattr(self, name) + value)
+
+    @property
+    def average_depth(self):
+        return self.depth_total / self.depth_samples if self.depth_samples else 0.0
+
+    def summary(self):
+        """Return a one-line human readable summary."""
+        elapsed = time.monotonic() - self.start_time
+        rate = self.analyzed / elapsed if elapsed > 0 else 0.0
+        concurrency = f" {self.controller.summary()}." if self.controller else ""
+        if self.escalation:
+            concurrency += f" {self.escalation.summary()}."
+        if self.read_ahead:
+            concurrency += f" {self.read_ahead.summary()}."
+        return (f"Analyzed {self.analyzed} images in {elapsed:.1f}s ({rate:.2f} images/s), "
+                f"errors: {self.encode_errors} encode / {self.analyze_errors} analyze. "
+                f"Queue depth avg {self.average_depth:.1f}, max {self.max_depth}. "
+                f"Network workers waited {self.consumer_starved:.1f}s for payloads, "
+                f"encoders waited {self.producer_blocked:.1f}s on a full queue.{concurrency}")
+
+class ImagePipeline:
+    """Producer/consumer pipeline that decouples image encoding from network I/O.
+
+    A process pool prepares payloads (decode, orient, resize, re-encode) and
+    feeds a bounded queue that is drained by network worker threads calling
+    LMStudioClient.analyze_image. While the queue stays non-empty the
+    inference server is never waiting on the CPU side. A ReadAhead thread
+    warms the page cache for the next settings['read_ahead'] files (0 turns
+    it off), so neither side waits on disk seeks either.
+    """
+
+    def __init__(self, client, settings, encode_workers=None, network_workers=None, queue_size=None, use_processes=True):
+        self.client = client
+        self.settings = settings
+        self.escalation = None
+        if settings.get('resolution_escalation') and not settings.get('auto_mode', False):
+            # Send small renditions and re-send full size only for uncertain images
+            from escalation import EscalatingClient
+            self.client = EscalatingClient(client, settings)
+            self.escalation = self.client.stats
+        self.encode_workers = encode_workers or settings.get('encode_workers') or os.cpu_count() or 1
+        self.network_workers = max(1, network_workers or settings.get('parallel_requests', 2))
+        self.controller = None
+        if settings.get('adaptive_concurrency'):
+            # Start at the configured level; extra worker threads wait for the controller to admit them
+            self.controller = AdaptiveConcurrencyController(
+                initial=self.network_workers,
+                maximum=max(self.network_workers, settings.get('max_parallel_requests', 16))
+            )
+            self.network_workers = self.controller.maximum
+        self.queue_size = queue_size or max(2, self.network_workers * 2)
+        self.use_processes = use_processes
+        self.metrics = PipelineMetrics()
+        self.payloads = queue.Queue(maxsize=self.queue_size)
+        self.stop_event = threading.Event()
+        self.executor = None
+        # Full-size re-encodes requested by network workers, queued by the producer
+        self.escalations = queue.Queue()
+        self.open_condition = threading.Condition()
+        self.open_items = 0  # Payloads queued or being handled, plus escalations not yet queued
+        self.accepting_escalations = True
+
+    def stop(self):
+        """Ask the pipeline to stop after the requests already in flight."""
+        self.stop_event.set()
+
+    def _put(self, item):
+        """Put an item on the payload queue, recording time spent blocked."""
+        with self.open_condition:
+            self.open_items += 1
+        start = time.monotonic()
+        self.payloads.put(item)
+        self.metrics.add('producer_blocked', time.monotonic() - start)
+        self.metrics.sample_depth(self.payloads.qsize())
+
+    def _item_done(self):
+        """Mark a queued item or escalation as handled."""
+        with self.open_condition:
+            self.open_items -= 1
+            self.open_condition.notify_all()
+
+    def _produce(self, image_list):
+        """Submit encode jobs with a bounded window and queue finished payloads in order.
+
+        Full-size re-encodes of escalated images go through the same pool
+        and are queued as they are needed, so the payloads stay open until
+        every queued image has been answered.
+        """
+        from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+        
+        executor_class = ProcessPoolExecutor if self.use_processes else ThreadPoolExecutor
+        encode_options = {
+            'preprocess': self.settings.get('preprocess', False),
+            'max_size': self.settings.get('max_image_size', 1024),
+            'quality': self.settings.get('jpeg_quality', 85)
+        }
+        if self.escalation:
+            # The first request always gets a small re-encoded rendition
+            encode_options['preprocess'] = True
+            encode_options['max_size'] = self.settings.get('escalation_size', DEFAULT_ESCALATION_SIZE)
+
+        read_ahead = ReadAhead(
+            image_list,
+            window=self.settings.get('read_ahead', 8),
+            max_bytes=self.settings.get('read_ahead_mb', 256) * 1024 * 1024,
+            mode=self.settings.get('read_ahead_mode')
+        )
+        if read_ahead.window > 0:
+            self.metrics.read_ahead = read_ahead
+
+        try:
+            with read_ahead, executor_class(max_workers=self.encode_workers) as executor:
+                self.executor = executor
+                window = self.queue_size + self.encode_workers
+                pending = deque()
+
+                for index, image_path in enumerate(image_list):
+                    if self.stop_event.is_set():
+                        break
+                    self._queue_escalations()
+                    read_ahead.advance(index + 1)
+                    if not encode_options['preprocess'] and not needs_extraction(image_path):
+                        # Nothing to decode; the file is streamed from disk by the network worker
+                        self._put((image_path, prepare_image_payload(image_path), None, None))
+                        continue
+                    pending.append((image_path, executor.submit(prepare_image_payload, image_path, **encode_options)))
+                    if len(pending) >= window:
+                        self._queue_ready(*pending.popleft())
+
+                while pending:
+                    image_path, future = pending.popleft()
+                    if self.stop_event.is_set():
+                        future.cancel()
+                        continue
+                    self._queue_ready(image_path, future)
+
+                # Escalations can only come from images still being answered
+                while True:
+                    with self.open_condition:
+                        while (self.escalations.empty() and self.open_items > 0
+                               and not self.stop_event.is_set()):
+                            self.open_condition.wait(0.5)
+                        if self.escalations.empty() and (self.open_items == 0 or self.stop_event.is_set()):
+                            self.accepting_escalations = False
+                            break
+                    self._queue_escalations()
+        finally:
+            with self.open_condition:
+                self.accepting_escalations = False
+            self.executor = None
+            self._queue_escalations()  # Cancels whatever is left
+            # One sentinel per network worker signals the end of the stream
+            for _ in range(self.network_workers):
+                self.payloads.put(None)
+
+    def _queue_ready(self, image_path, future, context=None):
+        try:
+            payload = future.result()
+            if context is None:
+                self.metrics.add('encoded')
+            self._put((image_path, payload, None, context))
+        except Exception as e:
+            self.metrics.add('encode_errors')
+            self._put((image_path, None, e, context))
+
+    def _queue_escalations(self):
+        """Queue the full-size payloads network workers asked for, or cancel them once stopping."""
+        while True:
+            try:
+                image_path, future, context = self.escalations.get_nowait()
+            except queue.Empty:
+                return
+            if self.stop_event.is_set() or self.executor is None:
+                future.cancel()
+            else:
+                self._queue_ready(image_path, future, context)
+            self._item_done()
+
+    def _escalate(self, image_path, context):
+        """Ask the encode pool for a full-size payload of image_path; False if the run is ending."""
+        with self.open_condition:
+            if not self.accepting_escalations or self.stop_event.is_set():
+                return False
+            future = self.executor.submit(prepare_image_payload, image_path, **self.client.full_size_options(self.settings))
+            self.open_items += 1
+            self.escalations.put((image_path, future, context))
+            self.open_condition.notify_all()
+        return True
+
+    def _consume(self, on_result, on_error):
+        """Send queued payloads to LM Studio until a sentinel is received."""
+        while True:
+            if self.controller:
+                self.controller.acquire()
+            start = time.monotonic()
+            item = self.payloads.get()
+            self.metrics.add('consumer_starved', time.monotonic() - start)
+            if item is None or item[2] is not None or self.stop_event.is_set():
+                # No request will be sent for this item, so give its slot back unrecorded
+                if self.controller:
+                    self.controller.cancel()
+                if item is None:
+                    break
+            try:
+                self._handle(item, on_result, on_error)
+            finally:
+                self._item_done()
+
+    def _handle(self, item, on_result, on_error):
+        """Analyze one queued payload and pass the answer on, or queue its full-size escalation."""
+        image_path, payload, error, context = item
+        if error is None and self.stop_event.is_set():
+            return
+
+        if error is not None:
+            self.metrics.add('analyze_errors')
+            self._report_error(on_error, image_path, Exception(f"Error preparing image: {str(error)}"))
+            return
+
+        request_start = time.monotonic()
+        try:
+            if not self.escalation:
+                result = self.client.analyze_image(
+                    image_path,
+                    self.settings['categories'],
+                    self.settings['threshold'],
+                    self.settings,
+                    image_data=payload
+                )
+            elif context is None:
+                result, uncertain = self.client.analyze_small(
+                    image_path, self.settings['categories'], self.settings['threshold'], self.settings, payload
+                )
+            else:
+                result = self.client.analyze_full(
+                    image_path, self.settings['categories'], self.settings['threshold'], self.settings, payload
+                )
+        except Exception as e:
+            if self.controller:
+                self.controller.release(time.monotonic() - request_start, error=True)
+            self.metrics.add('analyze_errors')
+            self._report_error(on_error, image_path, e)
+            return
+
+        latency = time.monotonic() - request_start
+        if self.controller:
+            self.controller.release(latency)
+        if self.escalation:
+            if context is None:
+                # The request slot is free again while the pool re-encodes the image
+                if uncertain and self._escalate(image_path, {'low_bytes': payload.size, 'latency': latency}):
+                    return
+                result = self.client.finish(result, payload.size)
+            else:
+                latency += context['latency']
+                result = self.client.finish(result, context['low_bytes'], payload.size)
+        with self.metrics.lock:
+            self.metrics.latencies.append(latency)
+        try:
+            if on_result:
+                on_result(image_path, result)
+        except Exception as e:
+            # A failing callback costs this image, not the network worker
+            self.metrics.add('analyze_errors')
+            self._report_error(on_error, image_path, Exception(f"Error handling result: {str(e)}"))
+            return
+        self.metrics.add('analyzed')
+
+    def _report_error(self, on_error, image_path, error):
+        """Pass an error to on_error, printing it instead if on_error itself fails."""
+        if not on_error:
+            return
+        try:
+            on_error(image_path, error)
+        except Exception as e:
+            print(f"\nError handling failure of {Path(image_path).name}: {str(e)} (original error: {str(error)})")
+
+    def _consume_until_done(self, on_result, on_error):
+        """Run _consume; if it dies, stop the run and keep draining so the producer can't block forever."""
+        try:
+            self._consume(on_result, on_error)
+        except BaseException:
+            self.stop_event.set()
+            # Every worker takes exactly one sentinel, so this one's is still on its way
+            while self.payloads.get() is not None:
+                pass
+            raise
+
+    def run(self, image_list, on_result=None, on_error=None):
+        """Process image_list, calling on_result(path, result) or on_error(path, exc) per image.
+
+        Callbacks are invoked from network worker threads. If on_result
+        raises, the image is counted as an analyze error and passed to
+        on_error instead.
+        """
+        self.metrics = PipelineMetrics()
+        self.open_items = 0
+        self.accepting_escalations = True
+        self.metrics.controller = self.controller
+        self.metrics.escalation = self.escalation
+        producer = threading.Thread(target=self._produce, args=(image_list,), daemon=True)
+        consumers = [
+            threading.Thread(target=self._consume_until_done, args=(on_result, on_error), daemon=True)
+            for _ in range(self.network_workers)
+        ]
+
+        producer.start()
+        for consumer in consumers:
+            consumer.start()
+        for consumer in consumers:
+            consumer.join()
+        producer.join()
+
+        return self.metrics
@@ -0,0 +1,159 @@
+import cProfile
+import io
+import os
+import pstats
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from pathlib import Path
+
+_PROFILER_FILES = {__file__, tracemalloc.__file__, cProfile.__file__, pstats.__file__}
+
+class SamplingProfiler:
+    """Sample the stacks of every thread at a fixed interval and count them as collapsed stacks.
+
+    Each line of the output is 'frame;frame;...;frame count' with the
+    outermost frame first, the format read by flamegraph.pl, speedscope and
+    most other flame graph viewers. Unlike cProfile this sees the pipeline's
+    network and encoding threads too. Encoding worker processes are not
+    sampled.
+    """
+
+    def __init__(self, interval=0.01):
+        self.interval = interval
+        self.counts = Counter()
+        self.label = None  # Prepended to every stack, e.g. the current stage; None pauses sampling
+        self.samples = 0
+        self.stop_event = threading.Event()
+        self.thread = None
+
+    def start(self):
+        self.thread = threading.Thread(target=self._run, name='sampling-profiler', daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.stop_event.set()
+        if self.thread:
+            self.thread.join()
+
+    def _run(self):
+        own_id = threading.get_ident()
+        while not self.stop_event.wait(self.interval):
+            label = self.label
+            if label is None:
+                continue
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                    frame = frame.f_back
+                stack.append(names.get(thread_id, f"thread-{thread_id}"))
+                stack.append(label)
+                self.counts[';'.join(reversed(stack))] += 1
+            self.samples += 1
+
+    def write(self, path):
+        with open(path, 'w') as f:
+            for stack, count in self.counts.most_common():
+                f.write(f"{stack} {count}\n")
+
+class RunProfiler:
+    """Profile the stages of a run and write the results to a folder in output_dir.
+
+    Call stage(name) as each stage starts; it ends the previous one. For
+    every stage this writes:
+    - <stage>.pstats: cProfile statistics of the thread that ran the stage,
+      for pstats, snakeviz and similar tools.
+    - <stage>_allocations.txt: the lines that allocated the most memory
+      still held at the end of the stage, from tracemalloc.
+    A sampling profiler covers all threads of the run and writes
+    stacks.collapsed, labelled by stage, for flame graphs. summary.txt has
+    time, CPU time and peak memory per stage with the slowest functions.
+    tracemalloc makes allocation-heavy code noticeably slower, so profiled
+    runs are slower than normal ones. With enabled=False every method does
+    nothing, so callers don't need to check.
+    """
+
+    def __init__(self, output_dir, enabled=True, top=20, sample_interval=0.01):
+        self.enabled = enabled
+        self.top = top
+        self.directory = Path(output_dir) / f"profile_{time.strftime('%Y%m%d_%H%M%S')}"
+        self.sampler = SamplingProfiler(sample_interval)
+        self.summaries = []
+        self.current = None  # (name, cProfile.Profile, start, cpu_start, snapshot)
+        if enabled:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            tracemalloc.start(10)
+            self.sampler.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def stage(self, name):
+        """End the current stage, if any, and start profiling the stage called name."""
+        if not self.enabled:
+            return
+        self._end_stage()
+        if hasattr(tracemalloc, 'reset_peak'):
+            tracemalloc.reset_peak()
+        snapshot = tracemalloc.take_snapshot()
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError:
+            profile = None  # Another profiler or debugger is already active
+        self.sampler.label = name
+        self.current = (name, profile, time.monotonic(), time.process_time(), snapshot)
+
+    def _end_stage(self):
+        if self.current is None:
+            return
+        name, profile, start, cpu_start, before = self.current
+        if profile:
+            profile.disable()
+        elapsed = time.monotonic() - start
+        cpu = time.process_time() - cpu_start
+        _, peak = tracemalloc.get_traced_memory()
+        # The profiler's own work below is not part of any stage
+        self.current = None
+        self.sampler.label = None
+        after = tracemalloc.take_snapshot()
+
+        growth = [stat for stat in after.compare_to(before, 'lineno')
+                  if stat.size_diff > 0 and stat.traceback[0].filename not in _PROFILER_FILES]
+        growth.sort(key=lambda stat: stat.size_diff, reverse=True)
+        with open(self.directory / f"{name}_allocations.txt", 'w') as f:
+            f.write(f"Lines that allocated the most memory still held at the end of stage {name}\n\n")
+            for stat in growth[:self.top]:
+                f.write(f"{stat}\n")
+
+        summary = f"{name}: {elapsed:.2f}s, {cpu:.2f}s CPU in this process, peak traced memory {peak / 1024 / 1024:.1f} MB"
+        if profile:
+            profile.dump_stats(str(self.directory / f"{name}.pstats"))
+            buffer = io.StringIO()
+            pstats.Stats(profile, stream=buffer).sort_stats('cumulative').print_stats(self.top)
+            summary += "\n" + buffer.getvalue().strip()
+        self.summaries.append(summary)
+
+    def close(self):
+        """End the last stage and write the stack samples and summary."""
+        if not self.enabled:
+            return
+        self._end_stage()
+        self.sampler.stop()
+        tracemalloc.stop()
+        self.enabled = False
+        self.sampler.write(self.directory / 'stacks.collapsed')
+        with open(self.directory / 'summary.txt', 'w') as f:
+            f.write("\n\n".join(self.summaries) + "\n")
+        print(f"\nProfile written to {self.directory} ({self.sampler.samples} stack samples)")
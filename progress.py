@@ -0,0 +1,127 @@
+import queue
+import threading
+import time
+
+class ProgressChannel:
+    """Thread-safe progress reporting from worker threads to a UI poller.
+
+    Workers push small events onto a queue; the UI drains and coalesces
+    them at a fixed frame rate with snapshot(), so thousands of fast
+    results cost one redraw per frame instead of one callback each. The
+    channel also carries pause and cancel requests back to the workers.
+    """
+
+    def __init__(self, total=0):
+        self.events = queue.SimpleQueue()
+        self.total = total
+        self.processed = 0
+        self.errors = 0
+        self.last_name = ''
+        self.last_error = None
+        self.message = None
+        self.finished = False
+        self.start_time = time.monotonic()
+        self.paused_time = 0.0
+        self.pause_started = None
+        self.resume_event = threading.Event()
+        self.resume_event.set()
+        self.cancel_event = threading.Event()
+
+    # Worker side
+
+    def set_total(self, total):
+        self.events.put(('total', total))
+
+    def advance(self, name, error=None):
+        """Record one finished item, optionally with the error it failed with."""
+        self.events.put(('item', (name, error)))
+
+    def set_message(self, text):
+        """Replace the progress text, e.g. for a post-processing phase."""
+        self.events.put(('message', text))
+
+    def finish(self):
+        self.events.put(('finished', None))
+
+    def checkpoint(self):
+        """Block while paused; return False once the job has been cancelled."""
+        while not self.resume_event.wait(0.2):
+            if self.cancel_event.is_set():
+                break
+        return not self.cancel_event.is_set()
+
+    @property
+    def cancelled(self):
+        return self.cancel_event.is_set()
+
+    # UI side
+
+    def pause(self):
+        if self.resume_event.is_set():
+            self.pause_started = time.monotonic()
+            self.resume_event.clear()
+
+    def resume(self):
+        if not self.resume_event.is_set():
+            self.paused_time += time.monotonic() - self.pause_started
+            self.pause_started = None
+            self.resume_event.set()
+
+    @property
+    def paused(self):
+        return not self.resume_event.is_set()
+
+    def cancel(self):
+        self.cancel_event.set()
+        self.resume_event.set()  # Wake paused workers so they can exit
+
+    def snapshot(self):
+        """Drain pending events and return the coalesced progress state."""
+        new_errors = []
+        while True:
+            try:
+                kind, value = self.events.get_nowait()
+            except queue.Empty:
+                break
+            if kind == 'item':
+                name, error = value
+                self.processed += 1
+                self.last_name = name
+                if error is not None:
+                    self.errors += 1
+                    self.last_error = f"Error processing {name}: {error}"
+                    new_errors.append(self.last_error)
+            elif kind == 'total':
+                self.total = value
+            elif kind == 'message':
+                self.message = value
+            elif kind == 'finished':
+                self.finished = True
+
+        elapsed = time.monotonic() - self.start_time - self.paused_time
+        if self.pause_started is not None:
+            elapsed -= time.monotonic() - self.pause_started
+        rate = self.processed / elapsed if elapsed > 0 else 0.0
+        remaining = max(self.total - self.processed, 0)
+        return {
+            'processed': self.processed,
+            'total': self.total,
+            'errors': self.errors,
+            'new_errors': new_errors,
+            'last_name': self.last_name,
+            'message': self.message,
+            'rate': rate,
+            'eta': remaining / rate if rate > 0 else None,
+            'paused': self.paused,
+            'cancelled': self.cancelled,
+            'finished': self.finished
+        }
+
+def format_duration(seconds):
+    """Format a number of seconds as H:MM:SS or M:SS."""
+    seconds = int(seconds)
+    hours, remainder = divmod(seconds, 3600)
+    minutes, seconds = divmod(remainder, 60)
+    if hours:
+        return f"{hours}:{minutes:02d}:{seconds:02d}"
+    return f"{minutes}:{seconds:02d}"
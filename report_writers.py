@@ -0,0 +1,272 @@
+import csv
+import json
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+from streaming_output import OnlineThresholdEstimator
+
+REPORT_FORMATS = ['text', 'csv', 'jsonl', 'parquet']
+
+REPORT_FILE_NAMES = {
+    'text': 'photo_sort_report.txt',
+    'csv': 'analysis_report.csv',
+    'jsonl': 'analysis_report.jsonl',
+    'parquet': 'analysis_report.parquet'
+}
+
+def report_row(image_path, result, error, threshold):
+    """Flatten one image's result into a report row."""
+    if isinstance(result, str):
+        result = json.loads(result)
+    categories = (result or {}).get('categories', [])
+    top = max(categories, key=lambda cat: cat['confidence']) if categories else None
+    return {
+        'image': str(image_path),
+        'categories': categories,
+        'top_category': top['name'] if top else None,
+        'confidence': top['confidence'] if top else None,
+        'threshold': threshold,
+        'error': str(error) if error is not None else None,
+        'analyzed_at': datetime.now().isoformat(timespec='seconds')
+    }
+
+class ReportWriter:
+    """Base class for reports written row by row while a run is in progress.
+
+    Rows are buffered and flushed at least every flush_interval seconds, so
+    the file can be read mid-run and memory does not grow with the number
+    of images. write() may be called from several threads. With an adaptive
+    threshold the rows record 'adaptive', and the threshold is estimated from
+    the confidences as they stream past and written by close(): into the
+    summary at the end of a text report, and into a <report>.summary.json
+    file next to the other formats.
+    """
+
+    summary_file = True  # Whether close() writes <report>.summary.json
+
+    def __init__(self, path, settings, flush_interval=2.0):
+        self.path = Path(path)
+        self.settings = settings
+        self.threshold = settings.get('threshold')
+        self.estimator = OnlineThresholdEstimator(settings.get('priority_categories', [])) if self.threshold is None else None
+        self.flush_interval = flush_interval
+        self.last_flush = time.monotonic()
+        self.rows_written = 0
+        self.lock = threading.Lock()
+
+    def write(self, image_path, result=None, error=None):
+        """Add one image's result (JSON string or dict) or the error it failed with."""
+        row = report_row(image_path, result, error, self.threshold)
+        with self.lock:
+            if self.estimator and row['categories']:
+                self.estimator.add(row['categories'])
+            self._write_row(row)
+            self.rows_written += 1
+            if time.monotonic() - self.last_flush >= self.flush_interval:
+                self._flush()
+                self.last_flush = time.monotonic()
+
+    def flush(self):
+        with self.lock:
+            self._flush()
+            self.last_flush = time.monotonic()
+
+    def applied_threshold(self):
+        """The fixed threshold, or the adaptive estimate from the results written so far."""
+        if self.estimator is None:
+            return self.threshold
+        with self.lock:
+            return self.estimator.threshold()
+
+    def threshold_summary(self):
+        if self.estimator is None:
+            return f"Threshold: {self.threshold:.3f} (fixed)"
+        return f"Threshold: {self.applied_threshold():.3f} (adaptive, from {self.estimator.samples} results)"
+
+    def close(self, summary=None):
+        """Flush remaining rows and finish the report with the threshold and summary text."""
+        threshold_summary = self.threshold_summary()
+        threshold = self.applied_threshold()
+        with self.lock:
+            self._close(threshold_summary + (f"\n\n{summary}" if summary else ""))
+            if self.summary_file:
+                summary_path = self.path.with_name(self.path.name + '.summary.json')
+                summary_path.write_text(json.dumps({
+                    'threshold': threshold,
+                    'adaptive': self.estimator is not None,
+                    'rows': self.rows_written,
+                    'summary': summary
+                }, indent=2))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def _write_row(self, row):
+        raise NotImplementedError
+
+    def _flush(self):
+        raise NotImplementedError
+
+    def _close(self, summary):
+        raise NotImplementedError
+
+class TextReportWriter(ReportWriter):
+    """Human readable report: settings header, one block per image, summary footer."""
+
+    summary_file = False
+
+    def __init__(self, path, settings, flush_interval=2.0):
+        super().__init__(path, settings, flush_interval)
+        self.file = open(self.path, 'w')
+        self.file.write("Photo Sorting Report\n")
+        self.file.write(f"Generated on: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n\n")
+        self.file.write("Settings:\n")
+        self.file.write(f"- Auto Mode: {'Enabled' if settings.get('auto_mode') else 'Disabled'}\n")
+        self.file.write(f"- Categories: {', '.join(settings['categories'])}\n")
+        self.file.write(f"- Priority Categories: {', '.join(settings.get('priority_categories', []))}\n")
+        threshold = settings['threshold'] if settings['threshold'] is not None else 'adaptive (see the end of the report)'
+        self.file.write(f"- Threshold: {threshold}\n")
+        self.file.write(f"- Ambiguity Mode: {settings['ambiguity_mode']}\n")
+        self.file.write(f"- Output Mode: {settings['output_mode']}\n")
+        self.file.write(f"- Parallel Requests: {settings.get('parallel_requests', 1)}\n\n")
+        self.file.write("Results:\n")
+        self.file.write("-" * 80 + "\n\n")
+        self.file.flush()
+
+    def _write_row(self, row):
+        self.file.write(f"Image: {Path(row['image']).name}\n")
+        if row['error']:
+            self.file.write(f"- Error: {row['error']}\n")
+        for cat in row['categories']:
+            priority = " (Priority)" if cat['name'] in self.settings.get('priority_categories', []) else ""
+            self.file.write(f"- {cat['name']}{priority}: {cat['confidence']:.2%}\n")
+        self.file.write("\n")
+
+    def _flush(self):
+        self.file.flush()
+
+    def _close(self, summary):
+        if summary:
+            self.file.write("-" * 80 + "\n\n")
+            self.file.write(f"{summary}\n")
+        self.file.close()
+
+class CSVReportWriter(ReportWriter):
+    """One CSV row per image."""
+
+    HEADER = ['Image', 'Categories', 'Top Category', 'Confidence', 'Threshold', 'Error']
+
+    def __init__(self, path, settings, flush_interval=2.0):
+        super().__init__(path, settings, flush_interval)
+        self.file = open(self.path, 'w', newline='')
+        self.writer = csv.writer(self.file)
+        self.writer.writerow(self.HEADER)
+        self.file.flush()
+
+    def _write_row(self, row):
+        cat_str = ', '.join(f"{cat['name']} ({cat['confidence']:.2f})" for cat in row['categories'])
+        self.writer.writerow([
+            row['image'],
+            cat_str,
+            row['top_category'] or '',
+            f"{row['confidence']:.2f}" if row['confidence'] is not None else '',
+            f"{row['threshold']:.3f}" if row['threshold'] is not None else 'adaptive',
+            row['error'] or ''
+        ])
+
+    def _flush(self):
+        self.file.flush()
+
+    def _close(self, summary):
+        self.file.close()
+
+class JSONLReportWriter(ReportWriter):
+    """One JSON object per line per image."""
+
+    def __init__(self, path, settings, flush_interval=2.0):
+        super().__init__(path, settings, flush_interval)
+        self.file = open(self.path, 'w')
+
+    def _write_row(self, row):
+        self.file.write(json.dumps(row) + "\n")
+
+    def _flush(self):
+        self.file.flush()
+
+    def _close(self, summary):
+        self.file.close()
+
+class ParquetReportWriter(ReportWriter):
+    """Compressed columnar report written as a directory of Parquet part files.
+
+    A Parquet file is only readable once its footer is written, so each
+    flush closes a complete part file. Readers such as pandas.read_parquet
+    or pyarrow.dataset treat the directory as one table, mid-run included.
+    Requires pyarrow.
+    """
+
+    def __init__(self, path, settings, flush_interval=60.0, rows_per_part=10000, compression='zstd'):
+        super().__init__(path, settings, flush_interval)
+        try:
+            import pyarrow
+            import pyarrow.parquet
+        except ImportError:
+            raise ImportError("Parquet reports require pyarrow. Install it with 'pip install pyarrow'.")
+        self.pa = pyarrow
+        self.pq = pyarrow.parquet
+        self.rows_per_part = rows_per_part
+        self.compression = compression
+        self.schema = pyarrow.schema([
+            ('image', pyarrow.string()),
+            ('categories', pyarrow.list_(pyarrow.struct([('name', pyarrow.string()), ('confidence', pyarrow.float64())]))),
+            ('top_category', pyarrow.string()),
+            ('confidence', pyarrow.float64()),
+            ('threshold', pyarrow.float64()),
+            ('error', pyarrow.string()),
+            ('analyzed_at', pyarrow.string())
+        ])
+        self.path.mkdir(parents=True, exist_ok=True)
+        for old_part in self.path.glob('part-*.parquet'):
+            old_part.unlink()
+        self.buffer = []
+        self.part_number = 0
+
+    def _write_row(self, row):
+        row['categories'] = [
+            {'name': cat['name'], 'confidence': float(cat['confidence'])} for cat in row['categories']
+        ]
+        self.buffer.append(row)
+        if len(self.buffer) >= self.rows_per_part:
+            self._flush()
+
+    def _flush(self):
+        if not self.buffer:
+            return
+        table = self.pa.Table.from_pylist(self.buffer, schema=self.schema)
+        part_path = self.path / f"part-{self.part_number:05d}.parquet"
+        temp_path = part_path.with_suffix('.tmp')
+        self.pq.write_table(table, temp_path, compression=self.compression)
+        temp_path.replace(part_path)  # Readers never see a half-written part
+        self.part_number += 1
+        self.buffer = []
+
+    def _close(self, summary):
+        self._flush()
+
+REPORT_WRITERS = {
+    'text': TextReportWriter,
+    'csv': CSVReportWriter,
+    'jsonl': JSONLReportWriter,
+    'parquet': ParquetReportWriter
+}
+
+def open_report_writer(report_format, photo_dir, settings, path=None):
+    """Create a report writer for the format, by default in the photo directory."""
+    if report_format not in REPORT_WRITERS:
+        raise ValueError(f"Report format must be one of: {', '.join(REPORT_FORMATS)}")
+    report_path = Path(path) if path else Path(photo_dir) / REPORT_FILE_NAMES[report_format]
+    return REPORT_WRITERS[report_format](report_path, settings)
@@ -0,0 +1,168 @@
+import json
+import threading
+import time
+from concurrency import percentile
+
+SSE_DONE = object()
+
+def parse_sse_line(line):
+    """Return the JSON event on a server-sent event line, None for other lines, or SSE_DONE at the end."""
+    if isinstance(line, bytes):
+        line = line.decode('utf-8')
+    line = line.strip()
+    if not line.startswith('data:'):
+        return None  # Blank separators, comments and other fields
+    data = line[5:].strip()
+    if data == '[DONE]':
+        return SSE_DONE
+    return json.loads(data)
+
+def sse_events(lines):
+    """Yield the JSON events of a server-sent event stream until [DONE]."""
+    for line in lines:
+        event = parse_sse_line(line)
+        if event is SSE_DONE:
+            return
+        if event is not None:
+            yield event
+
+class JsonObjectScanner:
+    """Find the first complete, valid JSON object in text that arrives in pieces.
+
+    Text before the first brace, such as a markdown code fence, is skipped.
+    Braces inside strings are ignored, so the object is recognized as soon
+    as its closing brace arrives without re-parsing the whole text on every
+    token. A balanced candidate that doesn't parse is dropped and scanning
+    resumes after it.
+    """
+
+    def __init__(self):
+        self.buffer = []
+        self.depth = 0
+        self.in_string = False
+        self.escaped = False
+
+    def feed(self, text):
+        """Add text and return the object's JSON text once it is complete, else None."""
+        for char in text:
+            if self.depth == 0 and char != '{':
+                continue
+            self.buffer.append(char)
+            if self.in_string:
+                if self.escaped:
+                    self.escaped = False
+                elif char == '\\':
+                    self.escaped = True
+                elif char == '"':
+                    self.in_string = False
+            elif char == '"':
+                self.in_string = True
+            elif char == '{':
+                self.depth += 1
+            elif char == '}':
+                self.depth -= 1
+                if self.depth == 0:
+                    candidate = ''.join(self.buffer)
+                    self.buffer = []
+                    try:
+                        if isinstance(json.loads(candidate), dict):
+                            return candidate
+                    except ValueError:
+                        pass
+        return None
+
+class StreamedCompletion:
+    """Collect a streamed chat completion and tell when its JSON answer is complete.
+
+    Timing starts when the object is created, just before the request is
+    sent, so time to first token includes uploading the image and the
+    prompt processing on the server.
+    """
+
+    def __init__(self):
+        self.start = time.monotonic()
+        self.first_token = None
+        self.end = None
+        self.parts = []
+        self.scanner = JsonObjectScanner()
+        self.answer = None
+        self.stopped_early = False
+
+    def add(self, event):
+        """Add one SSE event; returns True once a complete JSON object has been received."""
+        choices = event.get('choices') or [{}]
+        text = (choices[0].get('delta') or {}).get('content')
+        if not text:
+            return False
+        if self.first_token is None:
+            self.first_token = time.monotonic()
+        self.parts.append(text)
+        self.answer = self.scanner.feed(text)
+        return self.answer is not None
+
+    def finish(self, stopped_early=False):
+        self.end = time.monotonic()
+        self.stopped_early = stopped_early
+
+    @property
+    def content(self):
+        """The JSON answer if one was found, otherwise everything the model wrote."""
+        return self.answer if self.answer is not None else ''.join(self.parts)
+
+    @property
+    def time_to_first_token(self):
+        return (self.first_token or self.end) - self.start
+
+    @property
+    def generation_time(self):
+        return self.end - (self.first_token or self.end)
+
+class StreamStats:
+    """Time to first token, generation time and early stops over the streamed requests of a run."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.first_token_times = []
+        self.generation_times = []
+        self.stopped_early = 0
+
+    def record(self, completion):
+        with self.lock:
+            self.first_token_times.append(completion.time_to_first_token)
+            self.generation_times.append(completion.generation_time)
+            self.stopped_early += completion.stopped_early
+
+    def summary(self):
+        with self.lock:
+            count = len(self.first_token_times)
+            if not count:
+                return "Streaming: no streamed responses"
+            return (f"Streaming: time to first token p50 {percentile(self.first_token_times, 0.5):.2f}s / "
+                    f"p95 {percentile(self.first_token_times, 0.95):.2f}s, generation p50 "
+                    f"{percentile(self.generation_times, 0.5):.2f}s / p95 {percentile(self.generation_times, 0.95):.2f}s, "
+                    f"{self.stopped_early} of {count} responses stopped once the answer was complete")
+
+class TokenUsage:
+    """Tokens reported by the server over the requests of a run.
+
+    Non-streamed responses carry the server's usage counts. A streamed
+    response closed early has no usage block, so its completion tokens are
+    counted from the content deltas received (one token each in LM Studio)
+    and its prompt tokens are unknown.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+
+    def add(self, usage):
+        usage = usage or {}
+        with self.lock:
+            self.requests += 1
+            self.prompt_tokens += usage.get('prompt_tokens') or 0
+            self.completion_tokens += usage.get('completion_tokens') or 0
+
+    def add_streamed(self, completion):
+        self.add({'completion_tokens': len(completion.parts)})
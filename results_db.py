@@ -0,0 +1,222 @@
+import json
+import sqlite3
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+
+DATABASE_NAME = 'photo_sorter.db'
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY,
+    started_at TEXT NOT NULL,
+    finished_at TEXT,
+    photo_dir TEXT,
+    model TEXT,
+    prompt_version TEXT,
+    settings TEXT
+);
+CREATE TABLE IF NOT EXISTS images (
+    id INTEGER PRIMARY KEY,
+    run_id INTEGER NOT NULL REFERENCES runs(id),
+    path TEXT NOT NULL,
+    file_size INTEGER,
+    file_mtime REAL,
+    analyzed_at TEXT NOT NULL,
+    error TEXT
+);
+CREATE TABLE IF NOT EXISTS classifications (
+    image_id INTEGER NOT NULL REFERENCES images(id),
+    category TEXT NOT NULL,
+    confidence REAL NOT NULL,
+    is_top INTEGER NOT NULL DEFAULT 0,
+    corrected INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS idx_images_path ON images(path);
+CREATE INDEX IF NOT EXISTS idx_images_run ON images(run_id);
+CREATE INDEX IF NOT EXISTS idx_classifications_image ON classifications(image_id);
+CREATE INDEX IF NOT EXISTS idx_classifications_category ON classifications(category, confidence);
+CREATE INDEX IF NOT EXISTS idx_classifications_confidence ON classifications(confidence);
+"""
+
+def default_database_path(photo_dir):
+    """Return the database path used for a photo directory."""
+    return Path(photo_dir) / DATABASE_NAME
+
+def _settings_to_json(settings):
+    """Serialize settings, turning paths and other objects into strings."""
+    return json.dumps({key: value for key, value in settings.items() if not callable(value)}, default=str)
+
+class ResultsDatabase:
+    """SQLite store of every analyzed image, its categories and the run that produced it.
+
+    Results can be recorded from several worker threads; writes are
+    serialized with a lock and committed in batches.
+    """
+
+    def __init__(self, path, commit_interval=1.0):
+        self.path = Path(path)
+        self.conn = sqlite3.connect(str(self.path), check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+        self.lock = threading.Lock()
+        self.commit_interval = commit_interval
+        self.last_commit = time.monotonic()
+        self.run_id = None
+
+    def start_run(self, settings, model=None, prompt_version=None):
+        """Create a run row and make it the target of subsequent records."""
+        with self.lock:
+            cursor = self.conn.execute(
+                "INSERT INTO runs (started_at, photo_dir, model, prompt_version, settings) VALUES (?, ?, ?, ?, ?)",
+                (
+                    datetime.now().isoformat(timespec='seconds'),
+                    str(settings.get('photo_dir', '')),
+                    model,
+                    prompt_version,
+                    _settings_to_json(settings)
+                )
+            )
+            self.conn.commit()
+            self.run_id = cursor.lastrowid
+        return self.run_id
+
+    def finish_run(self):
+        with self.lock:
+            self.conn.execute(
+                "UPDATE runs SET finished_at = ? WHERE id = ?",
+                (datetime.now().isoformat(timespec='seconds'), self.run_id)
+            )
+            self.conn.commit()
+            self.last_commit = time.monotonic()
+
+    def record(self, image_path, result=None, error=None):
+        """Store one image's result (JSON string or dict) or the error it failed with."""
+        if isinstance(result, str):
+            result = json.loads(result)
+        categories = (result or {}).get('categories', [])
+        top = max(categories, key=lambda cat: cat['confidence']) if categories else None
+
+        try:
+            stat = Path(image_path).stat()
+            file_size, file_mtime = stat.st_size, stat.st_mtime
+        except OSError:
+            file_size, file_mtime = None, None
+
+        with self.lock:
+            cursor = self.conn.execute(
+                "INSERT INTO images (run_id, path, file_size, file_mtime, analyzed_at, error) VALUES (?, ?, ?, ?, ?, ?)",
+                (
+                    self.run_id,
+                    str(image_path),
+                    file_size,
+                    file_mtime,
+                    datetime.now().isoformat(timespec='seconds'),
+                    str(error) if error is not None else None
+                )
+            )
+            self.conn.executemany(
+                "INSERT INTO classifications (image_id, category, confidence, is_top) VALUES (?, ?, ?, ?)",
+                [(cursor.lastrowid, cat['name'], float(cat['confidence']), int(cat is top)) for cat in categories]
+            )
+            if time.monotonic() - self.last_commit >= self.commit_interval:
+                self.conn.commit()
+                self.last_commit = time.monotonic()
+
+    def flush(self):
+        """Commit pending records now instead of waiting for the commit interval."""
+        with self.lock:
+            self.conn.commit()
+            self.last_commit = time.monotonic()
+
+    def rename_categories(self, mapping):
+        """Apply a category consolidation mapping to the current run's results."""
+        with self.lock:
+            self.conn.executemany(
+                "UPDATE classifications SET category = ? WHERE category = ? "
+                "AND image_id IN (SELECT id FROM images WHERE run_id = ?)",
+                [(new, old, self.run_id) for old, new in mapping.items()]
+            )
+            self.conn.commit()
+
+    def relocate(self, old_path, new_path):
+        """Point the current run's result for old_path at the file's new location."""
+        with self.lock:
+            self.conn.execute(
+                "UPDATE images SET path = ? WHERE path = ? AND run_id = ?",
+                (str(new_path), str(old_path), self.run_id)
+            )
+
+    def record_correction(self, image_path, category):
+        """Replace the latest result for image_path with a manual category."""
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT MAX(id) FROM images WHERE path = ?", (str(image_path),)
+            ).fetchone()
+            if row[0] is None:
+                raise ValueError(f"No results recorded for {image_path}")
+            self.conn.execute("DELETE FROM classifications WHERE image_id = ?", (row[0],))
+            self.conn.execute(
+                "INSERT INTO classifications (image_id, category, confidence, is_top, corrected) VALUES (?, ?, 1.0, 1, 1)",
+                (row[0], category)
+            )
+            self.conn.commit()
+
+    def analyzed_paths(self):
+        """Return the set of paths that have a successful result in any run."""
+        with self.lock:
+            rows = self.conn.execute("SELECT DISTINCT path FROM images WHERE error IS NULL").fetchall()
+        return {row[0] for row in rows}
+
+    def query(self, category=None, min_confidence=None, max_confidence=None, model=None,
+              run_id=None, top_only=True, all_runs=False, limit=None):
+        """Return (path, category, confidence, corrected, model, analyzed_at) rows.
+
+        By default only each image's most recent result and its top category
+        are considered, so "all images in Pets with confidence < 0.6" means
+        images whose current best guess is Pets at under 0.6.
+        """
+        conditions = []
+        params = []
+        if not all_runs and run_id is None:
+            conditions.append("i.id IN (SELECT MAX(id) FROM images GROUP BY path)")
+        if run_id is not None:
+            conditions.append("i.run_id = ?")
+            params.append(run_id)
+        if top_only:
+            conditions.append("c.is_top = 1")
+        if category is not None:
+            conditions.append("c.category = ?")
+            params.append(category)
+        if min_confidence is not None:
+            conditions.append("c.confidence >= ?")
+            params.append(min_confidence)
+        if max_confidence is not None:
+            conditions.append("c.confidence < ?")
+            params.append(max_confidence)
+        if model is not None:
+            conditions.append("r.model = ?")
+            params.append(model)
+
+        sql = (
+            "SELECT i.path, c.category, c.confidence, c.corrected, r.model, i.analyzed_at "
+            "FROM classifications c "
+            "JOIN images i ON i.id = c.image_id "
+            "JOIN runs r ON r.id = i.run_id"
+        )
+        if conditions:
+            sql += " WHERE " + " AND ".join(conditions)
+        sql += " ORDER BY c.confidence ASC, i.path"
+        if limit is not None:
+            sql += " LIMIT ?"
+            params.append(limit)
+
+        with self.lock:
+            return self.conn.execute(sql, params).fetchall()
+
+    def close(self):
+        with self.lock:
+            self.conn.commit()
+            self.conn.close()
@@ -0,0 +1,252 @@
+import queue
+from collections import OrderedDict
+from pathlib import Path
+from tkinter import Canvas, Menu, PhotoImage, Toplevel, TclError
+import ttkbootstrap as ttk
+from thumbnail_cache import ThumbnailCache
+
+ROW_HEIGHT = 144
+THUMBNAIL_SIZE = 128
+MAX_CACHED_IMAGES = 300  # PhotoImages kept in memory, independent of the number of results
+
+def top_category(result):
+    """Return (name, confidence) of the highest confidence category, or (None, 0.0)."""
+    if not result.get('categories'):
+        return None, 0.0
+    best = max(result['categories'], key=lambda cat: cat['confidence'])
+    return best['name'], best['confidence']
+
+class ResultsBrowser:
+    """Window for reviewing and correcting classification results.
+
+    Only the rows inside the visible part of the canvas exist as canvas
+    items, and only a bounded number of thumbnails are kept as PhotoImages,
+    so browsing tens of thousands of results stays fast and memory stays
+    flat. Thumbnails come from a ThumbnailCache and are generated lazily
+    the first time a row scrolls into view.
+    """
+
+    def __init__(self, parent, rows, categories=(), on_correct=None, thumbnail_cache=None):
+        self.all_rows = list(rows)
+        self.rows = self.all_rows
+        self.on_correct = on_correct
+        self.cache = thumbnail_cache or ThumbnailCache(size=THUMBNAIL_SIZE)
+        self.images = OrderedDict()
+        self.drawn = {}
+        self.ready = queue.SimpleQueue()
+        self.categories = sorted(set(categories) | {
+            cat['name'] for _, result in self.all_rows for cat in result.get('categories', [])
+        })
+
+        self.window = Toplevel(parent)
+        self.window.title('Results Browser')
+        self.window.geometry('760x720')
+        self.window.protocol('WM_DELETE_WINDOW', self.close)
+
+        # Filter bar
+        filter_frame = ttk.Frame(self.window, padding=10)
+        filter_frame.pack(fill='x')
+
+        ttk.Label(filter_frame, text='Category:').pack(side='left')
+        self.category_combo = ttk.Combobox(
+            filter_frame,
+            values=['All', 'Uncategorized'] + self.categories,
+            state='readonly',
+            width=18
+        )
+        self.category_combo.set('All')
+        self.category_combo.pack(side='left', padx=(5, 10))
+
+        ttk.Label(filter_frame, text='Max confidence:').pack(side='left')
+        self.max_conf_entry = ttk.Entry(filter_frame, width=6)
+        self.max_conf_entry.pack(side='left', padx=(5, 10))
+
+        ttk.Label(filter_frame, text='Sort:').pack(side='left')
+        self.sort_combo = ttk.Combobox(
+            filter_frame,
+            values=['Path', 'Confidence (low first)', 'Confidence (high first)'],
+            state='readonly',
+            width=20
+        )
+        self.sort_combo.set('Path')
+        self.sort_combo.pack(side='left', padx=(5, 10))
+
+        self.count_label = ttk.Label(filter_frame, text='')
+        self.count_label.pack(side='right')
+
+        self.category_combo.bind('<<ComboboxSelected>>', lambda e: self.apply_filter())
+        self.sort_combo.bind('<<ComboboxSelected>>', lambda e: self.apply_filter())
+        self.max_conf_entry.bind('<KeyRelease>', lambda e: self.apply_filter())
+
+        # Virtualized list
+        list_frame = ttk.Frame(self.window)
+        list_frame.pack(fill='both', expand=True)
+        self.canvas = Canvas(list_frame, highlightthickness=0)
+        self.scrollbar = ttk.Scrollbar(list_frame, orient='vertical', command=self.on_scrollbar)
+        self.canvas.configure(yscrollcommand=self.scrollbar.set)
+        self.canvas.pack(side='left', fill='both', expand=True)
+        self.scrollbar.pack(side='right', fill='y')
+
+        self.canvas.bind('<Configure>', lambda e: self.redraw())
+        self.canvas.bind('<MouseWheel>', self.on_mousewheel)
+        self.canvas.bind('<Button-4>', self.on_mousewheel)
+        self.canvas.bind('<Button-5>', self.on_mousewheel)
+        self.canvas.bind('<Double-Button-1>', self.show_category_menu)
+        self.canvas.bind('<Button-3>', self.show_category_menu)
+
+        ttk.Label(
+            self.window,
+            text='Double-click or right-click an image to change its category',
+            padding=5
+        ).pack(fill='x')
+
+        self.apply_filter()
+        self.poll_thumbnails()
+
+    def apply_filter(self):
+        """Rebuild the filtered row list and redraw from the top."""
+        category = self.category_combo.get()
+        try:
+            max_conf = float(self.max_conf_entry.get()) if self.max_conf_entry.get().strip() else None
+        except ValueError:
+            max_conf = None
+
+        rows = []
+        for image_path, result in self.all_rows:
+            name, confidence = top_category(result)
+            if category == 'Uncategorized' and name is not None:
+                continue
+            if category not in ('All', 'Uncategorized') and not any(cat['name'] == category for cat in result.get('categories', [])):
+                continue
+            if max_conf is not None and confidence >= max_conf:
+                continue
+            rows.append((image_path, result))
+
+        sort_mode = self.sort_combo.get()
+        if sort_mode == 'Path':
+            rows.sort(key=lambda row: str(row[0]))
+        else:
+            rows.sort(key=lambda row: top_category(row[1])[1], reverse=sort_mode.endswith('(high first)'))
+
+        self.rows = rows
+        self.count_label.configure(text=f'{len(rows)} of {len(self.all_rows)} images')
+        self.canvas.delete('all')
+        self.drawn = {}
+        self.canvas.configure(scrollregion=(0, 0, 0, len(rows) * ROW_HEIGHT))
+        self.canvas.yview_moveto(0)
+        self.redraw()
+
+    def on_scrollbar(self, *args):
+        self.canvas.yview(*args)
+        self.redraw()
+
+    def on_mousewheel(self, event):
+        if event.num == 4:
+            delta = -1
+        elif event.num == 5:
+            delta = 1
+        else:
+            delta = -1 * (event.delta / 120)
+        self.canvas.yview_scroll(int(delta), 'units')
+        self.redraw()
+        return 'break'  # Don't also scroll the main window
+
+    def visible_range(self):
+        top = self.canvas.canvasy(0)
+        bottom = top + self.canvas.winfo_height()
+        first = max(0, int(top // ROW_HEIGHT))
+        last = min(len(self.rows) - 1, int(bottom // ROW_HEIGHT))
+        return first, last
+
+    def redraw(self):
+        """Create canvas items for rows that scrolled into view and drop the rest."""
+        first, last = self.visible_range()
+        for index in list(self.drawn):
+            if index < first or index > last:
+                self.canvas.delete(f'row{index}')
+                del self.drawn[index]
+        for index in range(first, last + 1):
+            if index not in self.drawn:
+                self.draw_row(index)
+
+    def draw_row(self, index):
+        image_path, result = self.rows[index]
+        tag = f'row{index}'
+        y = index * ROW_HEIGHT
+        width = max(self.canvas.winfo_width(), 400)
+
+        self.canvas.create_rectangle(0, y, width, y + ROW_HEIGHT, fill='#2b2b2b' if index % 2 else '#222222', outline='', tags=tag)
+        image_item = self.canvas.create_image(8 + THUMBNAIL_SIZE // 2, y + ROW_HEIGHT // 2, tags=tag)
+        self.drawn[index] = (image_path, image_item)
+
+        name, confidence = top_category(result)
+        headline = f"{name} ({confidence:.0%})" if name else 'Uncategorized'
+        if result.get('corrected'):
+            headline += '  [corrected]'
+        details = ', '.join(f"{cat['name']} {cat['confidence']:.2f}" for cat in result.get('categories', []))
+        text_x = THUMBNAIL_SIZE + 24
+        self.canvas.create_text(text_x, y + 16, anchor='nw', text=Path(image_path).name, fill='#ffffff', font=('Helvetica', 11, 'bold'), tags=tag)
+        self.canvas.create_text(text_x, y + 42, anchor='nw', text=headline, fill='#00bc8c' if name else '#e74c3c', font=('Helvetica', 11), tags=tag)
+        self.canvas.create_text(text_x, y + 68, anchor='nw', text=details, fill='#aaaaaa', width=width - text_x - 10, tags=tag)
+
+        photo = self.images.get(image_path)
+        if photo is not None:
+            self.images.move_to_end(image_path)
+            self.canvas.itemconfigure(image_item, image=photo)
+        else:
+            self.cache.request(image_path, lambda path, thumb: self.ready.put((path, thumb)))
+
+    def poll_thumbnails(self):
+        """Attach thumbnails finished by the cache's pool to rows that are still visible."""
+        try:
+            visible = {path: item for path, item in self.drawn.values()}
+            while True:
+                try:
+                    image_path, thumb_path = self.ready.get_nowait()
+                except queue.Empty:
+                    break
+                if thumb_path is None or image_path not in visible:
+                    continue
+                photo = self.load_photo(image_path, thumb_path)
+                if photo is not None:
+                    self.canvas.itemconfigure(visible[image_path], image=photo)
+            self.window.after(50, self.poll_thumbnails)
+        except TclError:
+            pass  # Window was closed
+
+    def load_photo(self, image_path, thumb_path):
+        try:
+            photo = PhotoImage(master=self.window, file=str(thumb_path))
+        except TclError:
+            return None
+        self.images[image_path] = photo
+        while len(self.images) > MAX_CACHED_IMAGES:
+            self.images.popitem(last=False)
+        return photo
+
+    def show_category_menu(self, event):
+        """Offer the known categories for the row under the pointer."""
+        index = int(self.canvas.canvasy(event.y) // ROW_HEIGHT)
+        if not 0 <= index < len(self.rows):
+            return
+        menu = Menu(self.window, tearoff=0)
+        for category in self.categories:
+            menu.add_command(label=category, command=lambda c=category: self.set_category(index, c))
+        menu.tk_popup(event.x_root, event.y_root)
+
+    def set_category(self, index, category):
+        """Replace the result for a row with a manual category assignment."""
+        image_path, result = self.rows[index]
+        result['categories'] = [{'name': category, 'confidence': 1.0}]
+        result['corrected'] = True
+        if index in self.drawn:
+            self.canvas.delete(f'row{index}')
+            del self.drawn[index]
+            self.draw_row(index)
+        if self.on_correct:
+            self.on_correct(image_path, category)
+
+    def close(self):
+        self.cache.shutdown()
+        self.images.clear()
+        self.window.destroy()
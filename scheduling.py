@@ -0,0 +1,106 @@
+import os
+import struct
+from collections import defaultdict
+from pathlib import Path
+
+SCHEDULING_POLICIES = ['path', 'newest', 'smallest', 'round_robin', 'uncached', 'disk']
+
+FS_IOC_FIEMAP = 0xC020660B
+_FIEMAP_HEADER = struct.Struct('=QQIIII')  # fm_start, fm_length, fm_flags, fm_mapped_extents, fm_extent_count, fm_reserved
+_FIEMAP_EXTENT = struct.Struct('=QQQQQIIII')  # fe_logical, fe_physical, fe_length, 2 reserved, fe_flags, 3 reserved
+
+def _stat_key(path, attribute, missing):
+    try:
+        return getattr(os.stat(path), attribute)
+    except OSError:
+        return missing
+
+def physical_offset(path):
+    """Return where a file's first extent starts on its device, or None if that can't be found.
+
+    Uses the FIEMAP ioctl, which Linux supports on local file systems such as
+    ext4, XFS and Btrfs. Network shares, other platforms and files without
+    allocated extents give None.
+    """
+    try:
+        import fcntl
+    except ImportError:
+        return None
+    request = bytearray(_FIEMAP_HEADER.pack(0, 0xFFFFFFFFFFFFFFFF, 0, 0, 1, 0) + bytes(_FIEMAP_EXTENT.size))
+    try:
+        with open(path, 'rb') as f:
+            fcntl.ioctl(f.fileno(), FS_IOC_FIEMAP, request)
+    except OSError:
+        return None
+    if not _FIEMAP_HEADER.unpack_from(request)[3]:
+        return None
+    return _FIEMAP_EXTENT.unpack_from(request, _FIEMAP_HEADER.size)[1]
+
+def disk_order(image_list):
+    """Order images by where their data is stored, so reading them is one sweep across the disk.
+
+    Files are sorted by physical offset where it is available. Elsewhere,
+    for example on a NAS share, they are grouped by folder and sorted by
+    inode number, which most file systems hand out roughly in the order
+    files were written. Files that can't be read go last.
+    """
+    def key(path):
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return (1, 0, 0, 0, '', 0)
+        offset = physical_offset(path)
+        if offset is None:
+            return (0, stat.st_dev, 1, 0, str(Path(path).parent), stat.st_ino)
+        return (0, stat.st_dev, 0, offset, '', stat.st_ino)
+    return sorted(image_list, key=key)
+
+def round_robin(image_list):
+    """Interleave folders: the first image of every folder, then the second, and so on."""
+    folders = defaultdict(list)
+    for image_path in sorted(image_list, key=str):
+        folders[Path(image_path).parent].append(image_path)
+    queues = [folders[folder] for folder in sorted(folders, key=str)]
+    ordered = []
+    for index in range(max((len(queue) for queue in queues), default=0)):
+        ordered.extend(queue[index] for queue in queues if index < len(queue))
+    return ordered
+
+def order_images(image_list, policy='path', analyzed_paths=None):
+    """Return image_list in the order a run should process it.
+
+    path: sorted by path, the historical order.
+    newest: most recently modified first, so the latest shoot is sorted first.
+    smallest: smallest files first, for the fastest early feedback.
+    round_robin: alternate between folders so every folder gets partial results early.
+    uncached: images without a result in analyzed_paths first, then the rest.
+    disk: in on-disk order, so spinning disks and NAS archives read with few seeks.
+    """
+    if policy not in SCHEDULING_POLICIES:
+        raise ValueError(f"Processing order must be one of: {', '.join(SCHEDULING_POLICIES)}")
+    ordered = sorted(image_list, key=str)
+    if policy == 'newest':
+        ordered.sort(key=lambda path: _stat_key(path, 'st_mtime', 0.0), reverse=True)
+    elif policy == 'smallest':
+        ordered.sort(key=lambda path: _stat_key(path, 'st_size', float('inf')))
+    elif policy == 'round_robin':
+        ordered = round_robin(ordered)
+    elif policy == 'uncached':
+        analyzed_paths = analyzed_paths or set()
+        ordered.sort(key=lambda path: str(path) in analyzed_paths)  # Stable, so path order within each part
+    elif policy == 'disk':
+        ordered = disk_order(ordered)
+    return ordered
+
+def sample_images(image_list, count):
+    """Pick count images spread across folders and, within each folder, across its files."""
+    folders = defaultdict(list)
+    for image_path in sorted(image_list, key=str):
+        folders[Path(image_path).parent].append(image_path)
+    # Evenly spaced picks inside each folder, then round-robin over the folders
+    per_folder = -(-count // max(1, len(folders)))  # Ceiling division
+    spread = []
+    for folder in folders.values():
+        picks = min(per_folder, len(folder))
+        spread.extend(folder[index * len(folder) // picks] for index in range(picks))
+    return round_robin(spread)[:count]
@@ -0,0 +1,78 @@
+import base64
+import json
+import mmap
+from pathlib import Path
+
+IMAGE_PLACEHOLDER = '__PHOTO_SORTER_IMAGE_DATA__'
+CHUNK_SIZE = 3 * 64 * 1024  # Multiple of 3 so base64 chunks concatenate cleanly
+
+class ImagePayload:
+    """Image bytes ready to be sent, either held in memory or read from disk on demand.
+
+    Preprocessed images carry their re-encoded bytes in data. Unprocessed
+    images only carry the path and are memory-mapped while the request body
+    is being sent, so the file is never copied into Python memory.
+    """
+
+    def __init__(self, path, mime_type, data=None):
+        self.path = Path(path)
+        self.mime_type = mime_type
+        self.data = data
+
+    @property
+    def size(self):
+        if self.data is not None:
+            return len(self.data)
+        return self.path.stat().st_size
+
+    def iter_base64(self, chunk_size=CHUNK_SIZE):
+        """Yield the image as base64 encoded chunks."""
+        if self.data is not None:
+            view = memoryview(self.data)
+            for start in range(0, len(view), chunk_size):
+                yield base64.b64encode(view[start:start + chunk_size])
+            return
+
+        with open(self.path, 'rb') as f:
+            if self.path.stat().st_size == 0:
+                return
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                view = memoryview(mapped)
+                try:
+                    for start in range(0, len(view), chunk_size):
+                        yield base64.b64encode(view[start:start + chunk_size])
+                finally:
+                    view.release()
+
+class StreamingChatBody:
+    """JSON request body that base64-encodes an image while it is being sent.
+
+    The request is serialized once with a placeholder where the image data
+    goes; iterating yields the JSON before the placeholder, the encoded
+    image chunks and the JSON after it. Because the length is known up front
+    requests sends a regular Content-Length body rather than chunked encoding.
+    """
+
+    def __init__(self, request_json, image_payload):
+        self.image_payload = image_payload
+        body = json.dumps(request_json)
+        if body.count(IMAGE_PLACEHOLDER) != 1:
+            raise ValueError("Request must contain exactly one image placeholder")
+        prefix, suffix = body.split(IMAGE_PLACEHOLDER)
+        self.prefix = prefix.encode('utf-8')
+        self.suffix = suffix.encode('utf-8')
+        image_size = image_payload.size
+        self.length = len(self.prefix) + 4 * ((image_size + 2) // 3) + len(self.suffix)
+
+    @staticmethod
+    def image_url(mime_type):
+        """Return the placeholder data URL to embed in the request JSON."""
+        return f"data:{mime_type};base64,{IMAGE_PLACEHOLDER}"
+
+    def __len__(self):
+        return self.length
+
+    def __iter__(self):
+        yield self.prefix
+        yield from self.image_payload.iter_base64()
+        yield self.suffix
@@ -0,0 +1,146 @@
+import json
+from collections import Counter, OrderedDict
+
+class OnlineThresholdEstimator:
+    """Adaptive threshold over a stream of results, matching calculate_adaptive_threshold.
+
+    The batch version sorts every confidence and takes the value just above
+    the steepest drop between neighbours. Equal values never form a drop, so
+    only the distinct values matter: confidences are kept as counts per value
+    rounded to precision decimals, which bounds memory at 10**precision + 1
+    entries however many images are analyzed.
+    """
+
+    def __init__(self, priority_categories=(), precision=3):
+        self.priority = set(priority_categories)
+        self.precision = precision
+        self.all_counts = Counter()
+        self.priority_counts = Counter()
+        self.samples = 0
+
+    def add(self, categories):
+        """Add the categories of one analyzed image."""
+        for cat in categories:
+            value = round(float(cat['confidence']), self.precision)
+            self.all_counts[value] += 1
+            if cat['name'] in self.priority:
+                self.priority_counts[value] += 1
+        self.samples += 1
+
+    def threshold(self, default=0.7):
+        """Return the current estimate, using the priority distribution when there is one."""
+        values = sorted(self.priority_counts or self.all_counts, reverse=True)
+        if not values:
+            return default
+        max_drop = 0
+        threshold_idx = 0
+        for i in range(len(values) - 1):
+            drop = values[i] - values[i + 1]
+            if drop > max_drop:
+                max_drop = drop
+                threshold_idx = i
+        return values[threshold_idx]
+
+class StreamingOutput:
+    """Move or copy each image as soon as its result is decided, instead of after the run.
+
+    place(image_path, result, threshold) does the file operation. With a
+    fixed threshold every image is placed at once. With an adaptive one the
+    first warmup results are held until the estimate has a sample to work
+    from; after that an image is placed immediately unless one of its
+    deciding confidences lies within margin of the current estimate, where a
+    later estimate could flip the decision. Those borderline images are
+    deferred, re-evaluated whenever the estimate moves, and the rest are
+    placed by finish() with the final threshold. At most max_deferred images
+    are held; beyond that the oldest is placed with the current estimate.
+
+    add() must not be called from several threads at once; the
+    process_all_images callbacks already run one at a time.
+    """
+
+    def __init__(self, settings, place, warmup=20, margin=0.05, max_deferred=1000):
+        self.settings = settings
+        self.place = place
+        self.warmup = warmup
+        self.margin = margin
+        self.max_deferred = max_deferred
+        self.fixed = settings['threshold']
+        self.estimator = OnlineThresholdEstimator(settings.get('priority_categories', []))
+        self.deferred = OrderedDict()  # image_path -> (result, deciding confidences)
+        self.current = None
+        self.placed_immediately = 0
+        self.placed_late = 0
+
+    def threshold(self):
+        if self.fixed is not None:
+            return self.fixed
+        return self.estimator.threshold()
+
+    def _deciding_confidences(self, categories):
+        """Confidences whose comparison with the threshold decides where the image goes."""
+        if self.settings['ambiguity_mode'] == 'single' and categories:
+            categories = [max(categories, key=lambda cat: cat['confidence'])]
+        wanted = set(self.settings['categories'])
+        return [cat['confidence'] for cat in categories if cat['name'] in wanted]
+
+    def _borderline(self, confidences, threshold):
+        return any(abs(confidence - threshold) < self.margin for confidence in confidences)
+
+    def add(self, image_path, result):
+        """Take one result (the JSON string from the model) and place it now or defer it."""
+        try:
+            json_str = result.strip('`').strip()
+            if json_str.startswith('json\n'):
+                json_str = json_str[5:].strip()
+            categories = json.loads(json_str)['categories']
+            confidences = self._deciding_confidences(categories)
+        except Exception:
+            # Unparseable results can't move the estimate; place() sends them to Uncertain
+            self.place(image_path, result, self.threshold())
+            self.placed_immediately += 1
+            return
+
+        if self.fixed is not None:
+            self.place(image_path, result, self.fixed)
+            self.placed_immediately += 1
+            return
+
+        self.estimator.add(categories)
+        if self.estimator.samples < self.warmup:
+            self.deferred[image_path] = (result, confidences)
+            return
+
+        threshold = self.estimator.threshold()
+        if threshold != self.current:
+            self.current = threshold
+            self._reevaluate(threshold)
+        if self._borderline(confidences, threshold):
+            self.deferred[image_path] = (result, confidences)
+            while len(self.deferred) > self.max_deferred:
+                old_path, (old_result, _) = self.deferred.popitem(last=False)
+                self.place(old_path, old_result, threshold)
+                self.placed_late += 1
+        else:
+            self.place(image_path, result, threshold)
+            self.placed_immediately += 1
+
+    def _reevaluate(self, threshold):
+        """Place deferred images the new estimate is no longer close to."""
+        for image_path, (result, confidences) in list(self.deferred.items()):
+            if not self._borderline(confidences, threshold):
+                del self.deferred[image_path]
+                self.place(image_path, result, threshold)
+                self.placed_late += 1
+
+    def finish(self):
+        """Place every image still deferred with the final threshold and return that threshold."""
+        threshold = self.threshold()
+        while self.deferred:
+            image_path, (result, _) = self.deferred.popitem(last=False)
+            self.place(image_path, result, threshold)
+            self.placed_late += 1
+        return threshold
+
+    def summary(self):
+        return (f"Output threshold {self.threshold():.3f}: {self.placed_immediately} images placed as they "
+                f"were analyzed, {self.placed_late} after being held for a better estimate, {len(self.deferred)} still deferred")
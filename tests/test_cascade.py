@@ -0,0 +1,24 @@
+import unittest
+
+from cascade import parse_cascade
+
+class ParseCascadeTest(unittest.TestCase):
+    def test_gates_and_default(self):
+        self.assertEqual(parse_cascade('small-vlm:0.8, mid-vlm, big-vlm', 0.6),
+                         [('small-vlm', 0.8), ('mid-vlm', 0.6), ('big-vlm', None)])
+
+    def test_tagged_model_ids_are_not_gates(self):
+        self.assertEqual(parse_cascade('qwen:7, llava:13b'), [('qwen:7', 0.7), ('llava:13b', None)])
+        self.assertEqual(parse_cascade('org/qwen2-vl:q4:0.9, big-vlm'), [('org/qwen2-vl:q4', 0.9), ('big-vlm', None)])
+
+    def test_at_separator(self):
+        self.assertEqual(parse_cascade('qwen:1@0.8, big-vlm'), [('qwen:1', 0.8), ('big-vlm', None)])
+        with self.assertRaises(ValueError):
+            parse_cascade('qwen:7@7, big-vlm')
+
+    def test_needs_two_models(self):
+        with self.assertRaises(ValueError):
+            parse_cascade('small-vlm:0.8')
+
+if __name__ == '__main__':
+    unittest.main()
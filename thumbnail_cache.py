@@ -0,0 +1,100 @@
+import hashlib
+import io
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from media import extract_preview, needs_extraction
+from photo_sorter import get_cache_dir
+
+def make_thumbnail(image_path, thumb_path, size):
+    """Write a PNG thumbnail of image_path that fits in a size x size box."""
+    from PIL import Image, ImageOps
+
+    source = image_path
+    if needs_extraction(image_path):
+        # Thumbnail the embedded preview or keyframes rather than decoding the RAW or video
+        source = io.BytesIO(extract_preview(image_path, size * 4))
+    with Image.open(source) as img:
+        # Let the JPEG decoder downscale while decoding instead of decoding full size
+        img.draft('RGB', (size * 2, size * 2))
+        img = ImageOps.exif_transpose(img)
+        img.thumbnail((size, size))
+        if img.mode not in ('RGB', 'RGBA'):
+            img = img.convert('RGB')
+        thumb_path.parent.mkdir(parents=True, exist_ok=True)
+        temp_path = thumb_path.with_suffix('.tmp')
+        img.save(temp_path, format='PNG')
+    os.replace(temp_path, thumb_path)
+    return thumb_path
+
+class ThumbnailCache:
+    """On-disk thumbnail cache keyed by path, size and modification time.
+
+    Missing thumbnails are generated in a background pool; callbacks are
+    invoked from pool threads, so GUI callers must hand results back to
+    the Tk thread themselves. PIL releases the GIL while decoding and
+    resizing, so a thread pool keeps all cores busy without the spawn
+    issues of a process pool inside the GUI.
+    """
+
+    def __init__(self, cache_dir=None, size=128, workers=None):
+        self.cache_dir = Path(cache_dir) if cache_dir else get_cache_dir() / 'thumbnails'
+        self.size = size
+        self.executor = ThreadPoolExecutor(max_workers=workers or os.cpu_count() or 1)
+        self.pending = {}
+        self.lock = threading.Lock()
+
+    def path_for(self, image_path):
+        """Return the cache path for image_path, or None if the image is missing."""
+        try:
+            stat = Path(image_path).stat()
+        except OSError:
+            return None
+        key = f"{Path(image_path).resolve()}|{stat.st_mtime_ns}|{stat.st_size}|{self.size}"
+        digest = hashlib.sha1(key.encode('utf-8')).hexdigest()
+        return self.cache_dir / digest[:2] / f"{digest}.png"
+
+    def get(self, image_path):
+        """Return the cached thumbnail path if it has already been generated."""
+        thumb_path = self.path_for(image_path)
+        if thumb_path is not None and thumb_path.exists():
+            return thumb_path
+        return None
+
+    def request(self, image_path, callback):
+        """Generate the thumbnail in the background and call callback(image_path, thumb_path).
+
+        thumb_path is None when the thumbnail could not be created. Repeated
+        requests for an image already being generated are coalesced.
+        """
+        thumb_path = self.path_for(image_path)
+        if thumb_path is None:
+            callback(image_path, None)
+            return
+        if thumb_path.exists():
+            callback(image_path, thumb_path)
+            return
+
+        with self.lock:
+            if thumb_path in self.pending:
+                self.pending[thumb_path].append(callback)
+                return
+            self.pending[thumb_path] = [callback]
+
+        def generate():
+            try:
+                result = make_thumbnail(image_path, thumb_path, self.size)
+            except Exception as e:
+                print(f"Error creating thumbnail for {Path(image_path).name}: {str(e)}")
+                result = None
+            with self.lock:
+                callbacks = self.pending.pop(thumb_path, [])
+            for pending_callback in callbacks:
+                pending_callback(image_path, result)
+
+        self.executor.submit(generate)
+
+    def shutdown(self):
+        """Stop generating thumbnails that have not started yet."""
+        self.executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,126 @@
+import struct
+import threading
+import time
+import zlib
+from pipeline import prepare_image_payload
+from streaming_body import ImagePayload
+
+WARMUP_IMAGE_SIZE = 256
+WARMUP_PROMPT = "Describe this image in one word."
+
+def make_warmup_image(size=WARMUP_IMAGE_SIZE):
+    """Return PNG bytes of a size x size colour gradient, built without PIL."""
+    rows = []
+    for y in range(size):
+        row = bytearray([0])  # Filter type 0 for each scanline
+        for x in range(size):
+            row += bytes((x * 255 // size, y * 255 // size, (x + y) * 127 // size))
+        rows.append(bytes(row))
+
+    def chunk(kind, data):
+        return struct.pack('>I', len(data)) + kind + data + struct.pack('>I', zlib.crc32(kind + data) & 0xffffffff)
+
+    header = struct.pack('>IIBBBBB', size, size, 8, 2, 0, 0, 0)
+    return (b'\x89PNG\r\n\x1a\n' + chunk(b'IHDR', header)
+            + chunk(b'IDAT', zlib.compress(b''.join(rows))) + chunk(b'IEND', b''))
+
+def make_warmup_payload(image_path=None, settings=None):
+    """Return the ImagePayload used for warm-up and keep-alive requests.
+
+    A real image from the run, prepared with the run's settings, exercises
+    the same vision path as the analysis requests; without one a generated
+    gradient is used.
+    """
+    settings = settings or {}
+    if image_path is not None:
+        try:
+            return prepare_image_payload(
+                image_path,
+                preprocess=settings.get('preprocess', False),
+                max_size=settings.get('max_image_size', 1024),
+                quality=settings.get('jpeg_quality', 85)
+            )
+        except Exception as e:
+            print(f"Could not use {image_path} for warm-up, using a generated image: {str(e)}")
+    return ImagePayload('warmup.png', 'image/png', make_warmup_image())
+
+class WarmupStats:
+    """Latency of the first (cold) and a following (warm) warm-up request."""
+
+    def __init__(self, cold_latency, warm_latency):
+        self.cold_latency = cold_latency
+        self.warm_latency = warm_latency
+
+    @property
+    def load_cost(self):
+        """Seconds the first request spent on loading rather than inference."""
+        return max(0.0, self.cold_latency - self.warm_latency)
+
+    def summary(self):
+        return (f"Model warm-up: first request {self.cold_latency:.2f}s, "
+                f"warm request {self.warm_latency:.2f}s (load cost {self.load_cost:.2f}s)")
+
+class ServerWarmupStats(WarmupStats):
+    """Warm-up latencies of several servers, summarized by the slowest one."""
+
+    def __init__(self, by_server):
+        self.by_server = dict(by_server)  # Base URL -> WarmupStats
+        super().__init__(max(stats.cold_latency for stats in self.by_server.values()),
+                         max(stats.warm_latency for stats in self.by_server.values()))
+
+    def summary(self):
+        if len(self.by_server) == 1:
+            return next(iter(self.by_server.values())).summary()
+        servers = "; ".join(f"{url} {stats.cold_latency:.2f}s / {stats.warm_latency:.2f}s"
+                            for url, stats in self.by_server.items())
+        return f"{super().summary()} on the slowest of {len(self.by_server)} servers ({servers})"
+
+class ModelKeepAlive:
+    """Background thread that pings the model whenever a run goes idle.
+
+    Callers touch() on every completed request. When nothing has completed
+    for idle_seconds (a paused run, a slow directory scan, a watch folder
+    waiting for files) a tiny image request is sent, so LM Studio's idle
+    timer never unloads the model and the next image doesn't pay the
+    reload cost.
+    """
+
+    def __init__(self, client, idle_seconds=60, image_data=None):
+        self.client = client
+        self.idle_seconds = idle_seconds
+        self.image_data = image_data or make_warmup_payload()
+        self.last_activity = time.monotonic()
+        self.pings = 0
+        self.stop_event = threading.Event()
+        self.thread = None
+
+    def touch(self):
+        self.last_activity = time.monotonic()
+
+    def start(self):
+        self.touch()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.stop_event.set()
+        if self.thread is not None:
+            self.thread.join()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def _run(self):
+        while not self.stop_event.wait(min(5.0, self.idle_seconds)):
+            if time.monotonic() - self.last_activity < self.idle_seconds:
+                continue
+            try:
+                self.client.ping(self.image_data)
+                self.pings += 1
+            except Exception as e:
+                print(f"Keep-alive ping failed: {str(e)}")
+            self.touch()
@@ -0,0 +1,160 @@
+import ctypes
+import ctypes.util
+import os
+import select
+import struct
+import sys
+import time
+from pathlib import Path
+from media import is_media_file
+
+# inotify event masks, from <sys/inotify.h>
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_CLOEXEC = 0o2000000
+EVENT_HEADER = struct.Struct('iIII')  # wd, mask, cookie, name length
+
+class InotifyWatcher:
+    """Report files written or moved into a directory, using Linux inotify through ctypes.
+
+    Only the top level of the directory is watched, so category folders
+    created inside it by move/copy output never feed back into the watch.
+    """
+
+    def __init__(self, directory):
+        if not sys.platform.startswith('linux'):
+            raise OSError("inotify is only available on Linux")
+        self.directory = Path(directory)
+        libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+        self.fd = libc.inotify_init1(IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        mask = IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE
+        if libc.inotify_add_watch(self.fd, os.fsencode(str(self.directory)), mask) < 0:
+            error = ctypes.get_errno()
+            os.close(self.fd)
+            raise OSError(error, f"Cannot watch {self.directory}: {os.strerror(error)}")
+
+    def events(self, timeout):
+        """Wait up to timeout seconds and return the image paths that saw activity."""
+        readable, _, _ = select.select([self.fd], [], [], timeout)
+        if not readable:
+            return []
+        buffer = os.read(self.fd, 64 * 1024)
+        paths = []
+        offset = 0
+        while offset < len(buffer):
+            _, mask, _, name_length = EVENT_HEADER.unpack_from(buffer, offset)
+            offset += EVENT_HEADER.size
+            name = buffer[offset:offset + name_length].rstrip(b'\0')
+            offset += name_length
+            if name and is_media_file(os.fsdecode(name)):
+                paths.append(self.directory / os.fsdecode(name))
+        return paths
+
+    def close(self):
+        os.close(self.fd)
+
+class PollingWatcher:
+    """Portable fallback that lists the directory every interval seconds.
+
+    A file counts as active whenever its size or modification time differs
+    from the previous listing, so it keeps being reported while it is still
+    being written.
+    """
+
+    def __init__(self, directory, interval=1.0):
+        self.directory = Path(directory)
+        self.interval = interval
+        self.known = self._listing()
+        self.next_poll = time.monotonic()
+
+    def _listing(self):
+        listing = {}
+        with os.scandir(self.directory) as entries:
+            for entry in entries:
+                if entry.is_file() and is_media_file(entry.name):
+                    stat = entry.stat()
+                    listing[Path(entry.path)] = (stat.st_size, stat.st_mtime_ns)
+        return listing
+
+    def events(self, timeout):
+        """Wait up to timeout seconds and return the image paths that changed."""
+        time.sleep(max(0.0, min(timeout, self.next_poll - time.monotonic())))
+        if time.monotonic() < self.next_poll:
+            return []
+        self.next_poll = time.monotonic() + self.interval
+        listing = self._listing()
+        changed = [path for path, signature in listing.items() if self.known.get(path) != signature]
+        self.known = listing
+        return changed
+
+    def close(self):
+        pass
+
+def open_watcher(directory, polling=False, interval=1.0):
+    """Return an inotify watcher where available, otherwise a polling watcher."""
+    if not polling:
+        try:
+            return InotifyWatcher(directory)
+        except (OSError, AttributeError) as e:
+            print(f"inotify unavailable ({str(e)}), polling every {interval}s instead")
+    return PollingWatcher(directory, interval)
+
+class FileBatcher:
+    """Turn a stream of file activity into batches of completely written files.
+
+    A file is considered complete once settle_seconds pass without activity
+    and its size is unchanged since it was last seen, which covers copies
+    that close and reopen the file. Complete files are released as a batch
+    when batch_size are waiting or the oldest has waited batch_window seconds.
+    """
+
+    def __init__(self, settle_seconds=1.0, batch_size=16, batch_window=2.0):
+        self.settle_seconds = settle_seconds
+        self.batch_size = batch_size
+        self.batch_window = batch_window
+        self.pending = {}  # path -> (last activity, size)
+        self.ready = {}  # path -> time it became ready
+
+    def add(self, paths):
+        now = time.monotonic()
+        for path in paths:
+            self.ready.pop(path, None)
+            self.pending[path] = (now, self._size(path))
+
+    @staticmethod
+    def _size(path):
+        try:
+            return os.stat(path).st_size
+        except OSError:
+            return None
+
+    def next_batch(self):
+        """Return the next batch of complete files, or an empty list if none is due."""
+        now = time.monotonic()
+        for path, (last_activity, size) in list(self.pending.items()):
+            if now - last_activity < self.settle_seconds:
+                continue
+            current_size = self._size(path)
+            if current_size is None:
+                del self.pending[path]  # Deleted or moved away before it settled
+            elif current_size != size:
+                self.pending[path] = (now, current_size)
+            else:
+                del self.pending[path]
+                self.ready[path] = now
+
+        if not self.ready:
+            return []
+        if len(self.ready) < self.batch_size and now - min(self.ready.values()) < self.batch_window:
+            return []
+        batch = sorted(self.ready, key=self.ready.get)[:self.batch_size]
+        for path in batch:
+            del self.ready[path]
+        return batch
+
+    def waiting(self):
+        return len(self.pending) + len(self.ready)
@@ -0,0 +1,231 @@
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+from pathlib import Path, PurePosixPath
+
+QUEUE_NAME = 'photo_sorter_queue.db'
+NETWORK_FILESYSTEMS = {'nfs', 'nfs4', 'cifs', 'smb3', 'smbfs', 'fuse.sshfs', '9p', 'afs', 'ceph', 'glusterfs'}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+CREATE TABLE IF NOT EXISTS items (
+    id INTEGER PRIMARY KEY,
+    path TEXT NOT NULL UNIQUE,
+    status TEXT NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    worker TEXT,
+    lease_expires REAL,
+    result TEXT,
+    error TEXT,
+    collected INTEGER NOT NULL DEFAULT 0,
+    updated_at REAL
+);
+CREATE INDEX IF NOT EXISTS idx_items_status ON items(status, lease_expires);
+CREATE INDEX IF NOT EXISTS idx_items_collected ON items(collected, status);
+CREATE TABLE IF NOT EXISTS workers (
+    id TEXT PRIMARY KEY,
+    expires REAL NOT NULL
+);
+"""
+
+def default_queue_path(photo_dir):
+    """Return the work queue path used for a photo directory."""
+    return Path(photo_dir) / QUEUE_NAME
+
+def network_filesystem(path):
+    """Return the filesystem type if path is on a network filesystem, or None (also where it can't tell).
+
+    Reads /proc/mounts, so it only detects network shares on Linux.
+    """
+    try:
+        with open('/proc/mounts') as f:
+            mounts = [line.split()[1:3] for line in f]
+    except OSError:
+        return None
+    path = os.path.realpath(path)
+    best, fs_type = '', None
+    for mount_point, mount_type in mounts:
+        mount_point = mount_point.replace('\\040', ' ')
+        inside = path == mount_point or path.startswith(mount_point.rstrip('/') + '/')
+        if inside and len(mount_point) > len(best):
+            best, fs_type = mount_point, mount_type
+    return fs_type if fs_type in NETWORK_FILESYSTEMS else None
+
+def default_worker_id():
+    return f"{socket.gethostname()}-{os.getpid()}"
+
+class WorkQueue:
+    """SQLite work queue shared by a coordinator and workers on other machines.
+
+    The queue file lives next to the photos on a shared drive. Image paths
+    are stored relative to the photo directory so each host can mount the
+    library wherever it likes. Workers lease items for lease_seconds; an
+    item whose worker crashed or lost its connection becomes claimable again
+    once the lease expires, and an item that has been claimed max_attempts
+    times without success is marked failed.
+
+    The rollback journal is used instead of WAL because WAL's shared memory
+    index only works when every process is on the same host. Even so, the
+    queue relies on SQLite's file locks, which many SMB and NFS setups don't
+    implement reliably; there two workers can claim the same image or the
+    file can be corrupted. Keep the queue on a local disk, or on a share
+    whose byte-range locking is known to work (see network_filesystem).
+    """
+
+    def __init__(self, path, max_attempts=None, timeout=60):
+        self.path = Path(path)
+        self.conn = sqlite3.connect(str(self.path), timeout=timeout, isolation_level=None, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=DELETE")
+        self.conn.executescript(SCHEMA)
+        self.lock = threading.Lock()
+        # Workers use the coordinator's retry limit unless told otherwise
+        self.max_attempts = max_attempts or int(self.get_meta('max_attempts', 3))
+
+    def _transaction(self, sql_steps):
+        """Run sql_steps(conn) inside BEGIN IMMEDIATE so claims never race."""
+        with self.lock:
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                result = sql_steps(self.conn)
+                self.conn.execute("COMMIT")
+                return result
+            except Exception:
+                self.conn.execute("ROLLBACK")
+                raise
+
+    def publish(self, photo_dir, image_paths, settings, model=None):
+        """Store the run settings and add images that are not queued yet; returns the number added.
+
+        Results finished earlier are handed to the new coordinator again, so a
+        restarted coordinator picks up where the previous one stopped without
+        any image being analyzed twice.
+        """
+        photo_dir = Path(photo_dir)
+        meta = {
+            'settings': json.dumps({key: value for key, value in settings.items() if not callable(value)}, default=str),
+            'model': model or '',
+            'photo_dir': str(photo_dir),
+            'max_attempts': str(self.max_attempts)
+        }
+        rows = [(PurePosixPath(Path(path).relative_to(photo_dir)).as_posix(), time.time()) for path in image_paths]
+
+        def steps(conn):
+            conn.executemany("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", meta.items())
+            conn.execute("UPDATE items SET collected = 0")
+            before = conn.total_changes
+            conn.executemany("INSERT OR IGNORE INTO items (path, updated_at) VALUES (?, ?)", rows)
+            return conn.total_changes - before
+
+        return self._transaction(steps)
+
+    def get_meta(self, key, default=None):
+        with self.lock:
+            row = self.conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row and row[0] != '' else default
+
+    def settings(self):
+        return json.loads(self.get_meta('settings', '{}'))
+
+    def claim(self, worker_id, count=1, lease_seconds=300):
+        """Lease up to count items to worker_id and return them as (item_id, relative_path)."""
+        def steps(conn):
+            now = time.time()
+            rows = conn.execute(
+                "SELECT id, path FROM items WHERE (status = 'pending' OR (status = 'leased' AND lease_expires < ?)) "
+                "AND attempts < ? ORDER BY id LIMIT ?",
+                (now, self.max_attempts, count)
+            ).fetchall()
+            conn.executemany(
+                "UPDATE items SET status = 'leased', worker = ?, lease_expires = ?, attempts = attempts + 1, "
+                "updated_at = ? WHERE id = ?",
+                [(worker_id, now + lease_seconds, now, item_id) for item_id, _ in rows]
+            )
+            self._expire(conn, now)
+            return rows
+
+        return self._transaction(steps)
+
+    def _expire(self, conn, now):
+        """Give up on items whose lease expired on their last attempt."""
+        conn.execute(
+            "UPDATE items SET status = 'failed', error = COALESCE(error, 'Lease expired too many times'), "
+            "updated_at = ? WHERE status = 'leased' AND lease_expires < ? AND attempts >= ?",
+            (now, now, self.max_attempts)
+        )
+
+    def renew(self, item_ids, worker_id, lease_seconds=300):
+        """Extend the leases worker_id holds on item_ids."""
+        now = time.time()
+        self._transaction(lambda conn: conn.executemany(
+            "UPDATE items SET lease_expires = ?, updated_at = ? WHERE id = ? AND worker = ? AND status = 'leased'",
+            [(now + lease_seconds, now, item_id, worker_id) for item_id in item_ids]
+        ))
+
+    def complete(self, item_id, worker_id, result):
+        """Store a result; a late result for an item another worker already finished is dropped."""
+        self._transaction(lambda conn: conn.execute(
+            "UPDATE items SET status = 'done', result = ?, error = NULL, worker = ?, updated_at = ? "
+            "WHERE id = ? AND status != 'done' AND collected = 0",
+            (result, worker_id, time.time(), item_id)
+        ))
+
+    def fail(self, item_id, worker_id, error):
+        """Record a failed attempt; the item is retried until it reaches max_attempts."""
+        self._transaction(lambda conn: conn.execute(
+            "UPDATE items SET status = CASE WHEN attempts >= ? THEN 'failed' ELSE 'pending' END, "
+            "error = ?, lease_expires = NULL, updated_at = ? WHERE id = ? AND worker = ? AND status = 'leased'",
+            (self.max_attempts, str(error), time.time(), item_id, worker_id)
+        ))
+
+    def collect(self, limit=1000):
+        """Return finished items not yet collected as (relative_path, result, error) and mark them collected."""
+        def steps(conn):
+            self._expire(conn, time.time())
+            rows = conn.execute(
+                "SELECT id, path, result, error, status FROM items "
+                "WHERE collected = 0 AND status IN ('done', 'failed') LIMIT ?",
+                (limit,)
+            ).fetchall()
+            conn.executemany("UPDATE items SET collected = 1 WHERE id = ?", [(row[0],) for row in rows])
+            return [(path, result if status == 'done' else None, error if status == 'failed' else None)
+                    for _, path, result, error, status in rows]
+
+        return self._transaction(steps)
+
+    def counts(self):
+        """Return the number of items in each status."""
+        with self.lock:
+            rows = self.conn.execute("SELECT status, COUNT(*) FROM items GROUP BY status").fetchall()
+        counts = {'pending': 0, 'leased': 0, 'done': 0, 'failed': 0}
+        counts.update(dict(rows))
+        return counts
+
+    def finished(self):
+        counts = self.counts()
+        return counts['pending'] == 0 and counts['leased'] == 0
+
+    def heartbeat(self, worker_id, seconds):
+        """Record that worker_id is attached to the queue for at least the next seconds."""
+        self._transaction(lambda conn: conn.execute(
+            "INSERT OR REPLACE INTO workers (id, expires) VALUES (?, ?)", (worker_id, time.time() + seconds)
+        ))
+
+    def leave(self, worker_id):
+        """Record that worker_id has stopped using the queue."""
+        self._transaction(lambda conn: conn.execute("DELETE FROM workers WHERE id = ?", (worker_id,)))
+
+    def attached_workers(self):
+        """Return the ids of workers whose last heartbeat hasn't expired."""
+        with self.lock:
+            rows = self.conn.execute("SELECT id FROM workers WHERE expires >= ?", (time.time(),)).fetchall()
+        return [row[0] for row in rows]
+
+    def close(self):
+        with self.lock:
+            self.conn.close()